@@ -0,0 +1,178 @@
+"""
+Compare the vectorized ticker normalization of binance_top10 / bybit_top10
+with per-item loops, on synthetic payloads of realistic size.
+
+The loops are not the code that was replaced: they apply the current rules
+(multi-hop UsdConverter rates, 1000/10000 denomination) one ticker at a time,
+so the results must match exactly and the timings only measure the cost of
+the per-item loop.
+
+    python benchmarks/ranking_normalization.py [--spot 3000] [--repeat 20]
+"""
+import os
+import sys
+import random
+import timeit
+import argparse
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import binance_top10
+import bybit_top10
+from usd_conversion import UsdConverter, split_symbol
+from volume_ranking import rank_by_volume
+
+QUOTES = ['USDT', 'BTC', 'ETH', 'BNB', 'FDUSD', 'TRY', 'EUR']
+
+# 1件ずつ処理するループ実装（比較用。現在の換算ルールをそのまま適用）
+
+def converter_from_symbols(tickers, quotes, anchors=None, price_key='lastPrice'):
+    # 通貨ペアを末尾の決済通貨（長いもの優先）で分割してUsdConverterを作る
+    quotes = sorted(quotes, key=len, reverse=True)
+    pairs = []
+    for ticker in tickers:
+        split = split_symbol(ticker['symbol'], quotes)
+        if split is not None:
+            pairs.append((*split, float(ticker[price_key] or 0)))
+    return UsdConverter(pairs, anchors)
+
+def loop_binance_spot(data, exchange_info, converter, top_n=10):
+    symbols_info = {s['symbol']: s for s in exchange_info['symbols']}
+    for item in data:
+        symbol = item['symbol']
+        item['volumeUSD'] = 0
+        if symbol in symbols_info:
+            quote_rate = converter.rate(symbols_info[symbol]['quoteAsset'])
+            base_rate = converter.rate(symbols_info[symbol]['baseAsset'])
+            if quote_rate is not None:
+                item['volumeUSD'] = float(item['quoteVolume']) * quote_rate
+            elif base_rate is not None:
+                item['volumeUSD'] = float(item['volume']) * base_rate
+    return rank_by_volume(((item['symbol'], 'spot', item['volumeUSD'], item) for item in data), top_n)
+
+def loop_binance_futures(usdt_data, coin_data, top_n=10):
+    data = []
+    for item in usdt_data:
+        if binance_top10.is_perpetual(item['symbol']):
+            item['volumeUSD'] = float(item['quoteVolume'])
+            item['type'] = 'USDT-Margined'
+            data.append(item)
+    for item in coin_data:
+        if binance_top10.is_perpetual(item['symbol']):
+            contract_size = 100 if item['symbol'].startswith('BTCUSD') else 10
+            item['volumeUSD'] = float(item['volume']) * contract_size
+            item['type'] = 'COIN-Margined'
+            data.append(item)
+    return rank_by_volume(((item['symbol'], item['type'], item['volumeUSD'], item) for item in data), top_n)
+
+def denominate(symbol, volume, last_price):
+    # 1000/10000単位で表示される銘柄を1単位あたりの数量・価格に直す
+    if symbol.startswith(('1000', '10000')):
+        denominator = 10000 if symbol.startswith('10000') else 1000
+        return volume / denominator, last_price * denominator
+    return volume, last_price
+
+def loop_bybit(tickers_by_category, category='spot', top_n=10):
+    all_tickers = [(cat, t) for cat in bybit_top10.categories_for(category) for t in tickers_by_category[cat]]
+    converter = converter_from_symbols((t for _, t in all_tickers), bybit_top10.BYBIT_QUOTES,
+                                       anchors=bybit_top10.USD_ANCHORS)
+    usd_volumes = []
+    for _, ticker in all_tickers:
+        symbol = ticker['symbol']
+        volume = Decimal(ticker['volume24h'])
+        last_price = Decimal(ticker['lastPrice'])
+        if category == 'perp' and symbol.endswith('USD') and bybit_top10.is_perpetual(symbol):
+            usd_volume = volume
+        else:
+            volume, last_price = denominate(symbol, volume, last_price)
+            if symbol.endswith(('USDT', 'USDC', 'USD')):
+                usd_volume = volume * last_price
+            else:
+                split = split_symbol(symbol, bybit_top10.BYBIT_QUOTES)
+                quote_rate = converter.rate(split[1]) if split else None
+                usd_volume = volume * last_price * (Decimal(str(quote_rate)) if quote_rate is not None else 1)
+        usd_volumes.append(usd_volume)
+    items = ((t['symbol'], cat, v, t) for (cat, t), v in zip(all_tickers, usd_volumes))
+    if category == 'perp':
+        items = (item for item in items if bybit_top10.is_perpetual(item[0]))
+    return rank_by_volume(items, top_n)
+
+def make_binance_payloads(n_spot, rng):
+    assets = [f"A{i}" for i in range(n_spot // 3)] + ['BTC', 'ETH', 'BNB']
+    symbols, prices, tickers = [], [], []
+    for i in range(n_spot):
+        base, quote = rng.choice(assets), QUOTES[i % len(QUOTES)]
+        if base == quote:
+            continue
+        symbol = f"{base}{quote}{i}"
+        price = rng.uniform(0.001, 1000)
+        symbols.append({'symbol': symbol, 'baseAsset': base, 'quoteAsset': quote})
+        prices.append({'symbol': symbol, 'price': f"{price:.8f}"})
+        volume = rng.uniform(0, 1e7)
+        tickers.append({'symbol': symbol, 'volume': f"{volume:.4f}", 'quoteVolume': f"{volume * price:.4f}"})
+    for base, price in (('BTC', 50000), ('ETH', 3000), ('BNB', 500)):
+        symbols.append({'symbol': f"{base}USDT", 'baseAsset': base, 'quoteAsset': 'USDT'})
+        prices.append({'symbol': f"{base}USDT", 'price': str(price)})
+    usdt = [{'symbol': f"A{i}USDT" + ('' if i % 5 else '_240628'), 'quoteVolume': f"{rng.uniform(0, 1e9):.2f}"}
+            for i in range(n_spot // 10)]
+    coin = [{'symbol': f"A{i}USD_PERP" if i else 'BTCUSD_PERP', 'volume': str(rng.randint(0, 10 ** 6))}
+            for i in range(n_spot // 60)]
+    return {'symbols': symbols}, prices, tickers, usdt, coin
+
+def make_bybit_payloads(n_spot, rng):
+    def ticker(symbol):
+        return {'symbol': symbol, 'volume24h': f"{rng.uniform(0, 1e7):.4f}", 'lastPrice': f"{rng.uniform(0.001, 1000):.6f}"}
+    quotes = ['USDT', 'USDC', 'BTC', 'ETH', 'EUR']
+    def prefix(i):
+        # 1000/10000単位で表示される銘柄も混ぜる
+        return '10000' if i % 23 == 0 else '1000' if i % 17 == 0 else ''
+    spot = [ticker(f"{prefix(i)}B{i}{quotes[i % len(quotes)]}") for i in range(n_spot)]
+    spot.append({'symbol': 'BTCUSDT', 'volume24h': '1000', 'lastPrice': '50000'})
+    spot.append({'symbol': 'ETHUSDT', 'volume24h': '1000', 'lastPrice': '3000'})
+    spot.append({'symbol': 'EURUSDT', 'volume24h': '1000', 'lastPrice': '1.08'})
+    linear = [ticker(f"{prefix(i)}B{i}USDT" if i % 4 else f"B{i}-28JUN24") for i in range(n_spot // 2)]
+    inverse = [ticker(f"B{i}USD") for i in range(n_spot // 20)]
+    return {'spot': spot, 'linear': linear, 'inverse': inverse}
+
+def assert_same(loop_rankings, vector_rankings):
+    assert [r.symbol for r in loop_rankings] == [r.symbol for r in vector_rankings]
+    for a, b in zip(loop_rankings, vector_rankings):
+        assert abs(a.volume_usd - b.volume_usd) <= 1e-9 * max(abs(a.volume_usd), 1.0), (a, b)
+
+def assert_same_denomination(tickers_by_category, category):
+    # USD建て取引量はデノミネーションで変わらないため、1単位あたりの価格も比較する
+    tickers = [t for cat in bybit_top10.categories_for(category) for t in tickers_by_category[cat]]
+    expected = [float(denominate(t['symbol'], Decimal(1), Decimal(t['lastPrice']))[1]) for t in tickers]
+    price = bybit_top10.normalize_bybit_tickers(tickers_by_category, category)['price']
+    assert all(abs(a - b) <= 1e-9 * abs(a) for a, b in zip(expected, price.tolist()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--spot', type=int, default=3000, help="Number of spot symbols per exchange")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    exchange_info, prices, spot, usdt, coin = make_binance_payloads(args.spot, rng)
+    converter = UsdConverter.from_binance(exchange_info, prices)
+    bybit = make_bybit_payloads(args.spot, rng)
+
+    cases = [
+        ("binance spot", lambda: loop_binance_spot(spot, exchange_info, converter),
+         lambda: binance_top10.rank_binance_spot(spot, exchange_info, converter)),
+        ("binance futures", lambda: loop_binance_futures(usdt, coin),
+         lambda: binance_top10.rank_binance_futures(usdt, coin)),
+        ("bybit spot", lambda: loop_bybit(bybit, 'spot'), lambda: bybit_top10.rank_bybit(bybit, 'spot')),
+        ("bybit perp", lambda: loop_bybit(bybit, 'perp'), lambda: bybit_top10.rank_bybit(bybit, 'perp')),
+    ]
+    for category in ('spot', 'perp'):
+        assert_same_denomination(bybit, category)
+    print(f"{'case':<16} {'loop ms':>10} {'numpy ms':>10} {'speedup':>8}")
+    for name, loop, vector in cases:
+        assert_same(loop(), vector())
+        loop_ms = min(timeit.repeat(loop, number=1, repeat=args.repeat)) * 1000
+        vector_ms = min(timeit.repeat(vector, number=1, repeat=args.repeat)) * 1000
+        print(f"{name:<16} {loop_ms:>10.2f} {vector_ms:>10.2f} {loop_ms / vector_ms:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -6,16 +6,18 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 src_dir = os.path.join(project_root, 'src')
 sys.path.insert(0, src_dir)
 
-from get_binance_orderbook_data import get_historical_data_link, download_file, get_close_prices
+from get_binance_orderbook_data import get_historical_data_link, download_file_ranged, open_download_stream
 from calculate_depth import process_large_file
+from depth_cache import DepthCache
+from download_cache import DownloadCache
 from visualizer import create_combined_chart
+from kline_resampler import shared_resampler
 
 import logging
 import traceback
 from datetime import datetime, timedelta
 import time
 import pytz
-import pandas as pd
 from binance.client import Client
 
 # 新しくインポートする部分
@@ -37,6 +39,15 @@ BASE_URL = 'https://api.binance.com'
 # Binanceクライアントの初期化
 client = Client(API_KEY, SECRET_KEY)
 
+# 解析済み板データのキャッシュ（容量を超えると古い日から削除）
+depth_cache = DepthCache(os.path.join(project_root, 'depth_cache'), max_bytes=20 * 1024 ** 3)
+
+# ダウンロード済みアーカイブのキャッシュ（容量を超えると古いものから削除）
+download_cache = DownloadCache(os.path.join(project_root, 'downloads'), max_bytes=20 * 1024 ** 3)
+
+# 1分足を基準に各時間足を生成（ページ間で共有）
+kline_resampler = shared_resampler(os.path.join(project_root, 'data', 'klines.sqlite'))
+
 # ログの設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -48,7 +59,17 @@ def get_latest_available_date_utc():
     latest_date = (utc_now - timedelta(days=2)).date() if is_before_8am else (utc_now - timedelta(days=1)).date()
     return latest_date
 
-def run_data_processing():
+def process_depth_source(source, symbol, start_time, end_time, cache_key):
+    return process_large_file(
+        source,
+        start_time=start_time,
+        end_time=end_time,
+        get_close_prices_func=lambda timestamps: kline_resampler.get_close_prices(symbol, timestamps),
+        cache=depth_cache,
+        cache_key=cache_key
+    )
+
+def run_data_processing(stream=False, progress_callback=None):
     symbol = "BTCUSDT"
     data_type = "S_DEPTH"
 
@@ -66,22 +87,42 @@ def run_data_processing():
     retry_count = 0
 
     while retry_count < max_retries:
-        data_link_response = get_historical_data_link(API_KEY, SECRET_KEY, BASE_URL, symbol, start_time, end_time, data_type)
-        
-        if data_link_response and 'data' in data_link_response and data_link_response['data']:
-            download_link = data_link_response['data'][0]['url']
-            
+        cache_key = (symbol, start_time.date(), data_type)
+        cached = depth_cache.exists(*cache_key)
+        archive_path = None if cached else download_cache.get(symbol, data_type, start_time, end_time)
+        download_link = None
+        if cached:
+            print(f"Using cached depth data for {start_time.date()}")
+        elif archive_path:
+            print(f"Using cached archive: {archive_path}")
+        else:
+            data_link_response = get_historical_data_link(API_KEY, SECRET_KEY, BASE_URL, symbol, start_time, end_time, data_type)
+            if data_link_response and 'data' in data_link_response and data_link_response['data']:
+                download_link = data_link_response['data'][0]['url']
+            else:
+                print(f"Failed to obtain download link for date {end_time.date()}")
+
+        if cached or archive_path or download_link:
             try:
-                file_path = download_file(download_link)
-                print(f"File downloaded to: {file_path}")
                 # データ処理
                 start_processing_time = time.time()
-                results_df = process_large_file(
-                    file_path, 
-                    start_time=start_time, 
-                    end_time=end_time, 
-                    get_close_prices_func=lambda timestamps: get_close_prices(client, symbol, timestamps)
-                )
+                if cached:
+                    results_df = process_depth_source(None, symbol, start_time, end_time, cache_key)
+                elif archive_path:
+                    results_df = process_depth_source(archive_path, symbol, start_time, end_time, cache_key)
+                elif stream:
+                    # ダウンロードしながら展開・集計する（アーカイブは保存せず、集計と同じパスで板データをキャッシュに書き込む）
+                    with open_download_stream(download_link, progress_callback=progress_callback) as source:
+                        results_df = process_depth_source(source, symbol, start_time, end_time, cache_key)
+                else:
+                    file_path = download_file_ranged(
+                        download_link,
+                        directory=os.path.join(download_cache.directory, 'incoming'),
+                        progress_callback=progress_callback
+                    )
+                    file_path = download_cache.put(symbol, data_type, start_time, end_time, file_path)
+                    print(f"File downloaded to: {file_path}")
+                    results_df = process_depth_source(file_path, symbol, start_time, end_time, cache_key)
                 processing_time = time.time() - start_processing_time
                 print(f"Data processing completed in {processing_time:.2f} seconds")
                 
@@ -106,8 +147,6 @@ def run_data_processing():
                 print(f"An error occurred: {str(e)}")
                 print("Traceback:")
                 traceback.print_exc()
-        else:
-            print(f"Failed to obtain download link for date {end_time.date()}")
         
         retry_count += 1
         if retry_count < max_retries:
@@ -120,27 +159,27 @@ def run_data_processing():
     return None
 
 def get_btcusdt_price_data(start_time, end_time):
-    klines = client.get_historical_klines(
-        "BTCUSDT", 
-        Client.KLINE_INTERVAL_5MINUTE, 
-        start_time.strftime("%d %b %Y %H:%M:%S"), 
-        end_time.strftime("%d %b %Y %H:%M:%S")
-    )
-    df = pd.DataFrame(klines, columns=[
-        'timestamp', 'open', 'high', 'low', 'close', 'volume', 
-        'close_time', 'quote_asset_volume', 'number_of_trades', 
-        'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-    ])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    df['close'] = df['close'].astype(float)
-    return df[['timestamp', 'close']]
+    ohlcv = kline_resampler.get_ohlcv("BTCUSDT", Client.KLINE_INTERVAL_5MINUTE, start_time, end_time)
+    return ohlcv[['close']].reset_index()
 
 def main():
     st.header("Binance Depth Ratio and BTCUSDT Price")
+
+    stream = st.checkbox("ダウンロードしながら処理する（アーカイブは保存しない。解析済みの板データはキャッシュに保存）", value=True)
     
     if st.button("Run Data Processing"):
+        progress_bar = st.progress(0.0)
+
+        def show_download_progress(done, total):
+            if total:
+                progress_bar.progress(min(done / total, 1.0), text=f"Downloading... {done / 1e6:,.1f} / {total / 1e6:,.1f} MB")
+            else:
+                # Content-Lengthがない場合はサイズだけ表示する
+                progress_bar.progress(0.0, text=f"Downloading... {done / 1e6:,.1f} MB")
+
         with st.spinner('Processing data... This may take a few minutes.'):
-            results_df = run_data_processing()
+            results_df = run_data_processing(stream=stream, progress_callback=show_download_progress)
+        progress_bar.empty()
         
         if results_df is not None:
             # BTCUSDTの価格データを取得
@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 import streamlit as st
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -7,13 +8,17 @@ src_dir = os.path.join(project_root, 'src')
 sys.path.insert(0, src_dir)
 
 from datetime import datetime, timedelta
-import time
 from binance.client import Client
 
-from calculate_heatmap import process_data
-from fetch_Kline_data import get_binance_data
+from calculate_heatmap import IncrementalSeasonality, process_data_extended, HEATMAP_STATS
+from heatmap_bootstrap import bootstrap_heatmap
+from kline_resampler import shared_resampler
+from kline_stream import shared_stream
 from src.visualizer import create_weekday_plot, create_hourly_plot, create_heatmap
 
+HEATMAP_DAYS = 90
+CLOSE_WAIT_MARGIN = 15  # 足の確定を待つ余裕（秒）
+
 def main():
     st.title('BINANCE BTCUSDT SPOT ANALYSIS')
 
@@ -22,6 +27,11 @@ def main():
     SECRET_KEY = os.getenv("BINANCE_SECRET_KEY")
     client = Client(API_KEY, SECRET_KEY)
 
+    # 1分足を基準に各時間足を生成（ローカルストアにない分だけをAPIから取得）
+    kline_resampler = shared_resampler(os.path.join(project_root, 'data', 'klines.sqlite'))
+    # WebSocketで最新のローソク足を受信し、直近90日分をメモリ上に保持
+    kline_stream = shared_stream([('BTCUSDT', Client.KLINE_INTERVAL_1HOUR)], capacity=HEATMAP_DAYS * 24)
+
     # セッション状態の初期化
     if 'auto_update' not in st.session_state:
         st.session_state.auto_update = True  # デフォルトでオン
@@ -30,16 +40,28 @@ def main():
 
     # データ取得と表示関数
     def fetch_and_display_data():
-        end_time = datetime.now()
-        start_time = end_time - timedelta(days=90)
-        data = get_binance_data(client, 'BTCUSDT', Client.KLINE_INTERVAL_1HOUR, start_time, end_time)
+        st.session_state.closed_count = kline_stream.closed_count('BTCUSDT', Client.KLINE_INTERVAL_1HOUR)
+        if len(kline_stream.snapshot('BTCUSDT', Client.KLINE_INTERVAL_1HOUR)) < HEATMAP_DAYS * 24:
+            # バッファが埋まっていなければ過去データで補完
+            end_time = datetime.utcnow()
+            start_time = end_time - timedelta(days=HEATMAP_DAYS)
+            history = kline_resampler.get_ohlcv('BTCUSDT', Client.KLINE_INTERVAL_1HOUR, start_time, end_time)
+            kline_stream.seed('BTCUSDT', Client.KLINE_INTERVAL_1HOUR, history)
+        data = kline_stream.snapshot('BTCUSDT', Client.KLINE_INTERVAL_1HOUR)
 
         if data.empty:
             st.warning("データが取得できませんでした。")
             return
 
-        # データ処理
-        weekday_return, hour_return, heatmap_data = process_data(data)
+        # データ処理（前回以降の足だけを集計に反映）
+        seasonality = st.session_state.get('seasonality')
+        if seasonality is None:
+            seasonality = IncrementalSeasonality.from_frame(data, timedelta(days=HEATMAP_DAYS))
+            st.session_state.seasonality = seasonality
+        else:
+            for timestamp, close in data.loc[data.index >= seasonality.last_timestamp, 'close'].items():
+                seasonality.add(timestamp, close)
+        weekday_return, hour_return, heatmap_data = seasonality.result()
 
         # グラフを横に並べて表示
         col1, col2 = st.columns(2)
@@ -49,7 +71,16 @@ def main():
             st.plotly_chart(create_hourly_plot(hour_return), use_container_width=True)
 
         # ヒートマップの表示
-        st.plotly_chart(create_heatmap(heatmap_data), use_container_width=True)
+        stat = st.selectbox("ヒートマップの統計量", HEATMAP_STATS, index=HEATMAP_STATS.index('mean'))
+        if stat != 'mean':
+            heatmap_data = process_data_extended(data).heatmap(stat)
+        st.plotly_chart(create_heatmap(heatmap_data, stat=stat), use_container_width=True)
+
+        # 平均変化率の有意性（ブロックブートストラップによるp値）
+        if st.checkbox("有意性検定を表示"):
+            # 1時間足数千本なら1コアで0.2秒程度のため、プロセスプールは使わない（起動の方が遅い）
+            significance = bootstrap_heatmap(data, n_resamples=2000, workers=1)
+            st.plotly_chart(create_heatmap(significance['p_value'], stat='p_value'), use_container_width=True)
 
         st.session_state.last_update = datetime.now()
 
@@ -65,14 +96,16 @@ def main():
         if st.session_state.last_update:
             st.text(f"最終更新: {st.session_state.last_update.strftime('%Y-%m-%d %H:%M:%S')}")
 
-    # 次の更新時刻を計算
-    now = datetime.now()
-    next_update = (now + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
-    time_to_next_update = (next_update - now).total_seconds()
-
-    # 自動更新ロジック
+    # 自動更新ロジック（ローソク足の確定を待ってから再描画）
     if st.session_state.auto_update:
-        time.sleep(time_to_next_update)
+        time_to_next_close = 3600 - time.time() % 3600
+        closed_count = kline_stream.wait_for_close('BTCUSDT', Client.KLINE_INTERVAL_1HOUR, st.session_state.closed_count,
+                                                   timeout=time_to_next_close + CLOSE_WAIT_MARGIN)
+        if closed_count <= st.session_state.closed_count:
+            # WebSocketから確定足を受信できなかった場合はREST APIで最新の足を取得
+            end_time = datetime.utcnow()
+            recent = kline_resampler.get_ohlcv('BTCUSDT', Client.KLINE_INTERVAL_1HOUR, end_time - timedelta(hours=3), end_time)
+            kline_stream.catch_up('BTCUSDT', Client.KLINE_INTERVAL_1HOUR, recent)
         st.experimental_rerun()
 
 if __name__ == "__main__":
@@ -11,10 +11,9 @@ sys.path.insert(0, src_dir)
 
 import binance_top10
 import bybit_top10
+from volume_ranking import rankings_to_records
+from ranking_collector import collect_rankings
 
-# 以降、binance_top10 や bybit_top10 の関数を使用します
-binance_spot = binance_top10.get_binance_volume_top10('spot')
-bybit_spot = bybit_top10.get_bybit_volume_top10('spot')
 # 他の必要なインポート
 from datetime import datetime, timedelta
 import pytz
@@ -22,7 +21,6 @@ import json
 import asyncio
 import pandas as pd
 import discord
-from io import StringIO
 
 # Discord設定
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
@@ -76,37 +74,9 @@ st.markdown("""
 # キャッシュファイルのパス
 CACHE_FILE = "volume_data_cache.json"
 
-def capture_output(func, *args, **kwargs):
-    old_stdout = sys.stdout
-    result = StringIO()
-    sys.stdout = result
-    try:
-        func(*args, **kwargs)
-    except Exception as e:
-        error_message = f"APIリクエストエラー: {str(e)}"
-        print(error_message)
-        st.error(error_message)  # Streamlitのログにエラーメッセージを表示
-    sys.stdout = old_stdout
-    return result.getvalue()
-
-def parse_volume_data(data):
-    lines = data.strip().split('\n')
-    parsed_data = []
-    for line in lines:
-        if line.startswith(tuple(str(i) for i in range(1, 11))):
-            parts = line.split('-')
-            rank_symbol = parts[0].strip()
-            volume = parts[1].strip().split(':')[1].strip()
-            rank = rank_symbol.split('.')[0]
-            symbol = rank_symbol.split('.')[1].strip()
-            parsed_data.append({'Rank': rank, 'Symbol': symbol, 'Volume': volume})
-    return pd.DataFrame(parsed_data)
-
 def display_volume_data(data, title):
     st.subheader(title)
-    parsed_data = parse_volume_data(data)
-    parsed_data.reset_index(drop=True, inplace=True)  # インデックスをリセット
-    st.dataframe(parsed_data, use_container_width=True)
+    st.dataframe(pd.DataFrame(data, columns=['Rank', 'Symbol', 'Volume']), use_container_width=True)
 
 def save_data_to_cache(data):
     with open(CACHE_FILE, 'w') as f:
@@ -133,34 +103,19 @@ async def send_discord_message(message):
     else:
         print("Error: Discord client is not ready.")
 
-def clean_output(output):
-    # 先頭と末尾の空白行を削除し、各行の余分な空白を削除
-    return "\n".join(line.strip() for line in output.strip().split("\n") if line.strip())
-
 async def update_data():
     try:
-        # データ取得と整形
-        st.write("Fetching Binance spot data...")
-        binance_spot = clean_output(capture_output(binance_top10.get_binance_volume_top10, 'spot'))
-        st.write(f"Binance spot data: {binance_spot}")
-
-        st.write("Fetching Binance futures data...")
-        binance_futures = clean_output(capture_output(binance_top10.get_binance_volume_top10, 'futures'))
-        st.write(f"Binance futures data: {binance_futures}")
-
-        st.write("Fetching Bybit spot data...")
-        bybit_spot = clean_output(capture_output(bybit_top10.get_bybit_volume_top10, 'spot'))
-        st.write(f"Bybit spot data: {bybit_spot}")
-
-        st.write("Fetching Bybit perpetual data...")
-        bybit_perp = clean_output(capture_output(bybit_top10.get_bybit_volume_top10, 'perp'))
-        st.write(f"Bybit perpetual data: {bybit_perp}")
+        # 全取引所のデータを並行して取得
+        st.write("Fetching Binance and Bybit data...")
+        rankings = await collect_rankings()
+        binance_spot, binance_futures = rankings['binance_spot'], rankings['binance_futures']
+        bybit_spot, bybit_perp = rankings['bybit_spot'], rankings['bybit_perp']
 
         data = {
-            'binance_spot': binance_spot,
-            'binance_futures': binance_futures,
-            'bybit_spot': bybit_spot,
-            'bybit_perp': bybit_perp,  # ここを変更
+            'binance_spot': rankings_to_records(binance_spot),
+            'binance_futures': rankings_to_records(binance_futures),
+            'bybit_spot': rankings_to_records(bybit_spot),
+            'bybit_perp': rankings_to_records(bybit_perp),
             'last_updated': datetime.now(pytz.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
         }
         
@@ -173,22 +128,22 @@ Volume top 10 更新
 
 Binance spot:
 ```
-{binance_spot}
+{binance_top10.format_binance_ranking(binance_spot, 'spot')}
 ```
 
 Binance perp:
 ```
-{binance_futures}
+{binance_top10.format_binance_ranking(binance_futures, 'futures')}
 ```
 
 Bybit spot:
 ```
-{bybit_spot}
+{bybit_top10.format_bybit_ranking(bybit_spot, 'spot')}
 ```
 
 Bybit perp:
 ```
-{bybit_perp}
+{bybit_top10.format_bybit_ranking(bybit_perp, 'perp')}
 ```"""
 
         await send_discord_message(message)
@@ -215,7 +170,8 @@ async def run_app():
         data = load_data_from_cache()
         current_time = datetime.now(pytz.utc)
         
-        if data is None or (current_time - datetime.strptime(data['last_updated'], "%Y-%m-%d %H:%M:%S %Z").replace(tzinfo=pytz.UTC)) > timedelta(hours=4):
+        # 旧形式（テキスト）のキャッシュは再取得する
+        if data is None or isinstance(data['binance_spot'], str) or (current_time - datetime.strptime(data['last_updated'], "%Y-%m-%d %H:%M:%S %Z").replace(tzinfo=pytz.UTC)) > timedelta(hours=4):
             data = await update_data()
 
     if data is not None:
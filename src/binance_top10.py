@@ -1,21 +1,20 @@
 import requests
+import logging
 from operator import itemgetter
+from functools import lru_cache
+import numpy as np
 
-def get_exchange_rates():
-    # BinanceからUSDTと各通貨の価格を取得
-    ticker_url = "https://api.binance.com/api/v3/ticker/price"
-    response = requests.get(ticker_url)
-    response.raise_for_status()
-    data = response.json()
-
-    exchange_rates = {}
-    for item in data:
-        symbol = item['symbol']
-        price = float(item['price'])
-        if symbol.endswith('USDT'):
-            currency = symbol[:-4]
-            exchange_rates[currency] = price
-    return exchange_rates
+from volume_ranking import rank_volume_arrays, format_rankings
+from ticker_arrays import symbol_key, numeric_column, rates_for
+import metadata_cache
+from metadata_cache import EXCHANGE_INFO_TTL, PRICE_TTL
+from usd_conversion import UsdConverter
+
+SPOT_PRICE_URL = "https://api.binance.com/api/v3/ticker/price"
+SPOT_TICKER_URL = "https://api.binance.com/api/v3/ticker/24hr"
+SPOT_EXCHANGE_INFO_URL = "https://api.binance.com/api/v3/exchangeInfo"
+USDT_FUTURES_TICKER_URL = "https://fapi.binance.com/fapi/v1/ticker/24hr"
+COIN_FUTURES_TICKER_URL = "https://dapi.binance.com/dapi/v1/ticker/24hr"
 
 def get_binance_futures_data(url):
     try:
@@ -32,91 +31,127 @@ def get_binance_futures_data(url):
 def is_perpetual(symbol):
     return symbol.endswith('PERP') or (not any(char.isdigit() for char in symbol))
 
-def get_binance_volume_top10(trade_type='spot'):
-    if trade_type == 'spot':
-        ticker_url = "https://api.binance.com/api/v3/ticker/24hr"
-        exchange_info_url = "https://api.binance.com/api/v3/exchangeInfo"
-    elif trade_type == 'futures':
-        usdt_ticker_url = "https://fapi.binance.com/fapi/v1/ticker/24hr"
-        coin_ticker_url = "https://dapi.binance.com/dapi/v1/ticker/24hr"
-    else:
+def get_binance_volume_ranking(trade_type='spot', top_n=10, cache=None):
+    """
+    Binance trading volume ranking converted to USD.
+
+    :param trade_type: 'spot' or 'futures' (perpetual USDT- and COIN-margined contracts)
+    :param top_n: Number of rankings to return
+    :param cache: MetadataCache for exchangeInfo and prices (default: metadata_cache.default_cache)
+    :return: List of VolumeRanking (market_type is 'spot', 'USDT-Margined' or 'COIN-Margined')
+    """
+    if trade_type not in ('spot', 'futures'):
         raise ValueError("Invalid trade type. Choose 'spot' or 'futures'.")
 
-    try:
-        exchange_rates = get_exchange_rates()
-        
-        if trade_type == 'spot':
-            exchange_info_response = requests.get(exchange_info_url)
-            exchange_info_response.raise_for_status()
-            exchange_info = exchange_info_response.json()
-            symbols_info = {s['symbol']: s for s in exchange_info['symbols']}
-
-            response = requests.get(ticker_url)
-            response.raise_for_status()
-            data = response.json()
-
-            for item in data:
-                symbol = item['symbol']
-                if symbol in symbols_info:
-                    base_asset = symbols_info[symbol]['baseAsset']
-                    quote_asset = symbols_info[symbol]['quoteAsset']
-
-                    try:
-                        if quote_asset == 'USDT':
-                            item['volumeUSD'] = float(item['quoteVolume'])
-                        elif base_asset == 'USDT':
-                            item['volumeUSD'] = float(item['volume'])
-                        elif quote_asset in exchange_rates:
-                            volume_in_quote = float(item['quoteVolume'])
-                            item['volumeUSD'] = volume_in_quote * exchange_rates[quote_asset]
-                        elif base_asset in exchange_rates:
-                            item['volumeUSD'] = float(item['volume']) * exchange_rates[base_asset]
-                        else:
-                            item['volumeUSD'] = 0
-                    except (ZeroDivisionError, ValueError):
-                        item['volumeUSD'] = 0
-                else:
-                    item['volumeUSD'] = 0
-            sorted_data = sorted(data, key=lambda x: float(x.get('volumeUSD', 0)), reverse=True)
-            print(f"Binance Spot 取引量トップ10 (USD換算):")
-            for i, pair in enumerate(sorted_data[:10], 1):
-                symbol = pair['symbol']
-                volume_usd = pair.get('volumeUSD', 0)
-                print(f"{i}. {symbol:<10} - 取引量: ${volume_usd:,.2f}")
-        else:  # futures
-            usdt_data = get_binance_futures_data(usdt_ticker_url)
-            coin_data = get_binance_futures_data(coin_ticker_url)
-
-            data = []
-            # USDT建て先物の処理
-            for item in usdt_data:
-                if is_perpetual(item['symbol']):
-                    item['volumeUSD'] = float(item['quoteVolume'])
-                    item['type'] = 'USDT-Margined'
-                    data.append(item)
-
-            # コイン建て先物の処理
-            for item in coin_data:
-                if is_perpetual(item['symbol']):
-                    # 契約サイズを決定
-                    if item['symbol'].startswith('BTCUSD'):
-                        contract_size = 100  # BTCUSDの契約サイズは100 USD
-                    else:
-                        contract_size = 10   # 他の通貨ペアは10 USD
-
-                    # 取引量を計算
-                    item['volumeUSD'] = float(item['volume']) * contract_size
-                    item['type'] = 'COIN-Margined'
-                    data.append(item)
-
-            sorted_data = sorted(data, key=lambda x: float(x.get('volumeUSD', 0)), reverse=True)
-            print(f"Binance Futures 取引量トップ10 (USD換算):")
-            for i, pair in enumerate(sorted_data[:10], 1):
-                symbol = pair['symbol']
-                volume_usd = float(pair.get('volumeUSD', 0))
-                contract_type = pair['type']
-                print(f"{i}. {symbol:<15} - 取引量: ${volume_usd:,.2f} ({contract_type})")
+    if trade_type == 'spot':
+        cache = cache or metadata_cache.default_cache
+        prices = cache.get_json(SPOT_PRICE_URL, ttl=PRICE_TTL)
+        exchange_info = cache.get_json(SPOT_EXCHANGE_INFO_URL, ttl=EXCHANGE_INFO_TTL, persist=True)
+
+        response = requests.get(SPOT_TICKER_URL)
+        response.raise_for_status()
+        return rank_binance_spot(response.json(), exchange_info, UsdConverter.from_binance(exchange_info, prices), top_n)
+
+    usdt_data = get_binance_futures_data(USDT_FUTURES_TICKER_URL)
+    coin_data = get_binance_futures_data(COIN_FUTURES_TICKER_URL)
+    return rank_binance_futures(usdt_data, coin_data, top_n)
+
+# 直近のexchangeInfoとシンボル一覧に対する通貨の対応表（どちらかが変わったときだけ作り直す）
+_spot_layout_memo = None
+
+def _spot_layout(symbols, exchange_info):
+    """
+    (listed, base_index, quote_index, assets) for the ticker symbols: whether each
+    symbol is in exchangeInfo and the index of its base/quote asset in assets (-1 if unlisted).
+    """
+    global _spot_layout_memo
+    memo = _spot_layout_memo
+    if memo is not None and memo[0] is exchange_info and memo[1] == symbols:
+        return memo[2]
+
+    symbols_info = {s['symbol']: (s['baseAsset'], s['quoteAsset']) for s in exchange_info['symbols']}
+    assets = {}
+    base_index, quote_index = [], []
+    for symbol in symbols:
+        base, quote = symbols_info.get(symbol, (None, None))
+        base_index.append(-1 if base is None else assets.setdefault(base, len(assets)))
+        quote_index.append(-1 if quote is None else assets.setdefault(quote, len(assets)))
+    base_index = np.array(base_index, dtype=np.intp)
+    layout = (base_index >= 0, base_index, np.array(quote_index, dtype=np.intp), list(assets))
+    # exchangeInfoへの参照を保持するので、同一性の比較が別のオブジェクトに一致することはない
+    _spot_layout_memo = (exchange_info, symbols, layout)
+    return layout
 
+def rank_binance_spot(data, exchange_info, converter, top_n=10):
+    """
+    Spot ranking from already fetched payloads.
+
+    :param data: /api/v3/ticker/24hr payload
+    :param exchange_info: /api/v3/exchangeInfo payload
+    :param converter: UsdConverter (e.g. UsdConverter.from_binance(exchange_info, prices))
+    """
+    symbols = symbol_key(data)
+    listed, base_index, quote_index, assets = _spot_layout(symbols, exchange_info)
+    asset_rates = rates_for(converter, assets)
+    quote_rate, base_rate = asset_rates[quote_index], asset_rates[base_index]
+
+    # 建値通貨、なければ基軸通貨のUSDレートで換算（複数の通貨ペアを経由する場合も含む）
+    volumes_usd = np.where(~np.isnan(quote_rate), numeric_column(data, 'quoteVolume') * quote_rate,
+                           numeric_column(data, 'volume') * base_rate)
+    missing = np.isnan(volumes_usd)
+    volumes_usd[missing] = 0
+    if (listed & missing).any():
+        unresolved = [symbols[i] for i in np.flatnonzero(listed & missing)]
+        logging.warning(f"No USD rate for {len(unresolved)} Binance spot symbols: {', '.join(unresolved[:20])}")
+    return rank_volume_arrays(symbols, 'spot', volumes_usd, data, top_n)
+
+@lru_cache(maxsize=8)
+def _futures_layout(symbols):
+    """
+    (perpetual, contract_size) arrays for a futures symbol list.
+    """
+    perpetual = np.array([is_perpetual(symbol) for symbol in symbols], dtype=bool)
+    # コイン建て先物の契約サイズ: BTCUSDは100 USD、他の通貨ペアは10 USD
+    contract_size = np.array([100 if symbol.startswith('BTCUSD') else 10 for symbol in symbols], dtype=np.float64)
+    return perpetual, contract_size
+
+def rank_binance_futures(usdt_data, coin_data, top_n=10):
+    """
+    Perpetual futures ranking from already fetched fapi (USDT-margined) and
+    dapi (COIN-margined) 24hr ticker payloads.
+    """
+    usdt_symbols, coin_symbols = symbol_key(usdt_data), symbol_key(coin_data)
+    usdt_perpetual, _ = _futures_layout(usdt_symbols)
+    coin_perpetual, contract_size = _futures_layout(coin_symbols)
+
+    # USDT建て先物は建値通貨の取引量、コイン建て先物は契約数×契約サイズ
+    volumes_usd = np.concatenate([numeric_column(usdt_data, 'quoteVolume'),
+                                  numeric_column(coin_data, 'volume') * contract_size])
+    market_types = ['USDT-Margined'] * len(usdt_data) + ['COIN-Margined'] * len(coin_data)
+    return rank_volume_arrays(usdt_symbols + coin_symbols, market_types, np.nan_to_num(volumes_usd, nan=0.0),
+                              usdt_data + coin_data, top_n, mask=np.concatenate([usdt_perpetual, coin_perpetual]))
+
+def format_binance_ranking(rankings, trade_type='spot'):
+    """
+    Text of a Binance ranking as printed by get_binance_volume_top10.
+    """
+    if trade_type == 'spot':
+        return format_rankings(f"Binance Spot 取引量トップ{len(rankings)} (USD換算):", rankings, symbol_width=10)
+    return format_rankings(f"Binance Futures 取引量トップ{len(rankings)} (USD換算):", rankings,
+                           symbol_width=15, show_market_type=True)
+
+def get_binance_volume_top10(trade_type='spot', top_n=10):
+    """
+    Print the Binance volume ranking.
+
+    :return: List of VolumeRanking, or None if the request failed
+    """
+    if trade_type not in ('spot', 'futures'):
+        raise ValueError("Invalid trade type. Choose 'spot' or 'futures'.")
+    try:
+        rankings = get_binance_volume_ranking(trade_type, top_n)
+        print(format_binance_ranking(rankings, trade_type))
+        return rankings
     except requests.RequestException as e:
         print(f"APIリクエストエラー: {e}")
         if e.response is not None:
@@ -1,75 +1,157 @@
 import requests
-from decimal import Decimal
+import logging
+from functools import lru_cache
+import numpy as np
+
+from volume_ranking import rank_volume_arrays, format_rankings
+from ticker_arrays import symbol_key, numeric_column, rates_for
+import metadata_cache
+from metadata_cache import PRICE_TTL
+from usd_conversion import UsdConverter, split_symbol
 
 def is_perpetual(symbol):
     return not any(char.isdigit() for char in symbol)
 
-def get_bybit_volume_top10(category='spot'):
-    base_url = "https://api.bybit.com"
-    endpoint = "/v5/market/tickers"
-    
+BASE_URL = "https://api.bybit.com"
+TICKERS_ENDPOINT = "/v5/market/tickers"
+
+# シンボルを基軸通貨と建値通貨に分けるための建値通貨一覧
+BYBIT_QUOTES = ('USDT', 'USDC', 'USDE', 'USD', 'BTC', 'ETH', 'EUR', 'BRL', 'DAI', 'MNT', 'PLN', 'TRY')
+USD_ANCHORS = {'USDT': 1.0, 'USDC': 1.0, 'USD': 1.0}
+
+def categories_for(category):
+    """
+    Bybit API categories requested for a ranking category ('spot' or 'perp').
+    """
     if category not in ['spot', 'perp']:
         raise ValueError("Invalid category. Choose 'spot' or 'perp'")
+    return ['linear', 'inverse'] if category == 'perp' else [category]
 
-    try:
-        categories = ['linear', 'inverse'] if category == 'perp' else [category]
-        all_tickers = []
-
-        for cat in categories:
-            params = {'category': cat}
-            response = requests.get(f"{base_url}{endpoint}", params=params)
-            data = response.json()
-
-            if data['retCode'] != 0:
-                raise Exception(f"API error: {data['retMsg']}")
-
-            tickers = data['result']['list']
-            all_tickers.extend(tickers)
-
-        # 取引量をUSD価値に変換
-        for ticker in all_tickers:
-            symbol = ticker['symbol']
-            volume = Decimal(ticker['volume24h'])
-            last_price = Decimal(ticker['lastPrice'])
-
-            # インバース無期限契約の処理
-            if category == 'perp' and symbol.endswith('USD') and is_perpetual(symbol):
-                usd_volume = volume
-            else:
-                # デノミネーションの修正
-                if symbol.startswith(('1000', '10000')):
-                    denominator = 1000 if symbol.startswith('1000') else 10000
-                    volume = volume / denominator
-                    last_price = last_price * denominator
-
-                # USD価値の計算
-                if symbol.endswith(('USDT', 'USDC', 'USD')):
-                    usd_volume = volume * last_price
-                elif symbol.endswith('BTC'):
-                    btc_price = next((Decimal(t['lastPrice']) for t in all_tickers if t['symbol'] == 'BTCUSDT'), None)
-                    if btc_price:
-                        usd_volume = volume * btc_price * last_price
-                    else:
-                        usd_volume = volume * last_price  # Fallback if BTCUSDT pair is not found
-                else:
-                    usd_volume = volume * last_price
-
-            ticker['usd_volume'] = usd_volume
-
-        # 無期限取引のみをフィルタリング（perp カテゴリーの場合）
-        if category == 'perp':
-            all_tickers = [t for t in all_tickers if is_perpetual(t['symbol'])]
-
-        # USD取引量でソート
-        sorted_tickers = sorted(all_tickers, key=lambda x: x['usd_volume'], reverse=True)
-
-        print(f"Bybit {category.capitalize()} 取引量トップ10 (USD換算):")
-        for i, ticker in enumerate(sorted_tickers[:10], 1):
-            symbol = ticker['symbol']
-            usd_volume = ticker['usd_volume']
-            
-            print(f"{i}. {symbol:<12} - 取引量: ${usd_volume:,.2f}")
+def parse_tickers_response(data):
+    """
+    Ticker list from a /v5/market/tickers payload.
+    """
+    if data['retCode'] != 0:
+        raise Exception(f"API error: {data['retMsg']}")
+    return data['result']['list']
+
+def get_bybit_volume_ranking(category='spot', top_n=10, cache=None):
+    """
+    Bybit trading volume ranking converted to USD.
+
+    :param category: 'spot' or 'perp' (perpetual linear and inverse contracts)
+    :param top_n: Number of rankings to return
+    :param cache: MetadataCache for the ticker lists (default: metadata_cache.default_cache)
+    :return: List of VolumeRanking (market_type is the Bybit category: 'spot', 'linear' or 'inverse')
+    """
+    cache = cache or metadata_cache.default_cache
+    tickers_by_category = {}
+    for cat in categories_for(category):
+        params = {'category': cat}
+        data = cache.get_json(f"{BASE_URL}{TICKERS_ENDPOINT}", params=params, ttl=PRICE_TTL)
+        tickers_by_category[cat] = parse_tickers_response(data)
+    return rank_bybit(tickers_by_category, category, top_n)
+
+@lru_cache(maxsize=8)
+def _symbol_layout(symbols):
+    """
+    Per-symbol parsing that only depends on the symbol list, so it is done once
+    per listing rather than on every refresh.
+
+    :return: Dict of arrays 'quote_index' (into BYBIT_QUOTES, -1 if unknown), 'denominator',
+        'usd_quoted', 'perpetual', 'inverse' and 'pair_index'/'pair_base'/'pair_quote'
+        (symbols with a known quote, for the currency graph)
+    """
+    quote_index, denominator, usd_quoted, perpetual, ends_usd = [], [], [], [], []
+    pair_index, pair_base, pair_quote = [], [], []
+    for i, symbol in enumerate(symbols):
+        split = split_symbol(symbol, BYBIT_QUOTES)
+        if split is None:
+            quote_index.append(-1)
+        else:
+            quote_index.append(BYBIT_QUOTES.index(split[1]))
+            pair_index.append(i)
+            pair_base.append(split[0])
+            pair_quote.append(split[1])
+        denominator.append(10000 if symbol.startswith('10000') else 1000 if symbol.startswith('1000') else 1)
+        usd_quoted.append(symbol.endswith(('USDT', 'USDC', 'USD')))
+        perpetual.append(is_perpetual(symbol))
+        ends_usd.append(symbol.endswith('USD'))
+    perpetual = np.array(perpetual, dtype=bool)
+    return {'quote_index': np.array(quote_index, dtype=np.intp),
+            'denominator': np.array(denominator, dtype=np.float64),
+            'usd_quoted': np.array(usd_quoted, dtype=bool),
+            'perpetual': perpetual,
+            'inverse': perpetual & np.array(ends_usd, dtype=bool),
+            'pair_index': np.array(pair_index, dtype=np.intp), 'pair_base': pair_base, 'pair_quote': pair_quote}
+
+def normalize_bybit_tickers(tickers_by_category, category='spot'):
+    """
+    Columnar USD volumes of the tickers for a ranking category.
+
+    :param tickers_by_category: {Bybit category: ticker list} for categories_for(category)
+    :return: Dict with 'raw' (ticker dicts), 'symbol', 'category' and arrays 'volume',
+        'price' (per unit after the 1000/10000 denomination fix), 'volume_usd', 'perpetual'
+    """
+    categories = categories_for(category)
+    raws = [ticker for cat in categories for ticker in tickers_by_category[cat]]
+    market_types = [cat for cat in categories for _ in tickers_by_category[cat]]
+    symbols = symbol_key(raws)
+    layout = _symbol_layout(symbols)
 
+    last_price = numeric_column(raws, 'lastPrice')
+    converter = UsdConverter(zip(layout['pair_base'], layout['pair_quote'], last_price[layout['pair_index']].tolist()),
+                             anchors=USD_ANCHORS)
+
+    # デノミネーションの修正
+    volume = numeric_column(raws, 'volume24h') / layout['denominator']
+    price = last_price * layout['denominator']
+
+    # インバース無期限契約の取引量はUSD建て
+    inverse = layout['inverse'] if category == 'perp' else np.zeros(len(raws), dtype=bool)
+    # USD建て以外の建値通貨（BTC・ETH・EURなど）はティッカー全体から作った通貨グラフでUSDに換算
+    rates = np.where(layout['usd_quoted'], 1.0, rates_for(converter, BYBIT_QUOTES)[layout['quote_index']])
+    unresolved = ~inverse & np.isnan(rates)
+    volume_usd = np.where(inverse, volume, volume * price * np.where(unresolved, 1.0, rates))
+
+    ranked = layout['perpetual'] if category == 'perp' else True
+    if (unresolved & ranked).any():
+        names = [symbols[i] for i in np.flatnonzero(unresolved & ranked)]
+        logging.warning(f"No USD rate for {len(names)} Bybit symbols, ranked by quote volume: "
+                        f"{', '.join(names[:20])}")
+
+    return {'raw': raws, 'symbol': symbols, 'category': market_types, 'volume': volume, 'price': price,
+            'volume_usd': np.nan_to_num(volume_usd, nan=0.0), 'perpetual': layout['perpetual']}
+
+def rank_bybit(tickers_by_category, category='spot', top_n=10):
+    """
+    Ranking from already fetched ticker lists.
+
+    :param tickers_by_category: {Bybit category: ticker list} for categories_for(category)
+    """
+    columns = normalize_bybit_tickers(tickers_by_category, category)
+    # 無期限取引のみをフィルタリング（perp カテゴリーの場合）
+    mask = columns['perpetual'] if category == 'perp' else None
+    return rank_volume_arrays(columns['symbol'], columns['category'], columns['volume_usd'], columns['raw'],
+                              top_n, mask=mask)
+
+def format_bybit_ranking(rankings, category='spot'):
+    """
+    Text of a Bybit ranking as printed by get_bybit_volume_top10.
+    """
+    return format_rankings(f"Bybit {category.capitalize()} 取引量トップ{len(rankings)} (USD換算):", rankings, symbol_width=12)
+
+def get_bybit_volume_top10(category='spot', top_n=10):
+    """
+    Print the Bybit volume ranking.
+
+    :return: List of VolumeRanking, or None if the request failed
+    """
+    categories_for(category)
+    try:
+        rankings = get_bybit_volume_ranking(category, top_n)
+        print(format_bybit_ranking(rankings, category))
+        return rankings
     except requests.RequestException as e:
         print(f"APIリクエストエラー: {e}")
     except (KeyError, ValueError, Exception) as e:
@@ -4,6 +4,9 @@ from datetime import timedelta
 import tarfile
 import io
 import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from depth_cache import DepthCache, ASK, BID, compact_depth_arrays
 
 def process_5min_intervals(interval_data, start_time, end_time, close_price):
     # 価格範囲の計算
@@ -49,61 +52,436 @@ def process_5min_intervals(interval_data, start_time, end_time, close_price):
 
     return result
 
-def process_large_file(file_path, start_time, end_time, get_close_prices_func):
-    total_rows = 0
-    all_data = pd.DataFrame()
+INTERVAL = timedelta(minutes=5)
 
-    with tarfile.open(file_path, 'r:gz') as tar:
-        for member in tar.getmembers():
-            f = tar.extractfile(member)
-            if f is not None:
-                # 必要なカラムのみを読み込む
-                df = pd.read_csv(
-                    io.TextIOWrapper(f),
-                    dtype={
-                        'timestamp': 'int64',
-                        'price': 'float32',
-                        'qty': 'float32',
-                        'side': 'category'
-                    },
-                    usecols=['timestamp', 'price', 'qty', 'side']
-                )
-                df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
-                total_rows += len(df)
-                all_data = pd.concat([all_data, df], ignore_index=True)
-                break  # 最初のファイルのみを処理
-
-    # 指定された期間のデータのみを残す
-    all_data = all_data[(all_data['timestamp'] >= start_time) & (all_data['timestamp'] < end_time)]
-    if all_data.empty:
-        print("No data in the specified time range.")
+def depth_band(name, lower, upper, side='both'):
+    """
+    Define a price band relative to the interval close price.
+
+    :param name: Output column name
+    :param lower: Lower bound as a fraction of the close price (e.g. -0.01 for -1%)
+    :param upper: Upper bound as a fraction of the close price (e.g. 0.025 for +2.5%)
+    :param side: 'a' (asks only), 'b' (bids only) or 'both'
+    :return: Band definition dict
+    """
+    if side not in ('a', 'b', 'both'):
+        raise ValueError("Invalid side. Choose 'a', 'b' or 'both'.")
+    if lower > upper:
+        raise ValueError(f"Invalid band {name}: lower bound is above upper bound.")
+    return {'name': name, 'lower': lower, 'upper': upper, 'side': side}
+
+# 板の厚み比率に使う価格帯（常に計算する）
+RATIO_BANDS = [
+    depth_band('a_qty_sum', 0.01, 0.025, side='a'),
+    depth_band('b_qty_sum', -0.025, -0.01, side='b'),
+]
+
+# 追加で集計する価格帯（変更可能）
+DEFAULT_BANDS = [
+    depth_band('total_qty_1pct', -0.01, 0.01),
+    depth_band('total_qty_5pct', -0.05, 0.05),
+]
+
+# ティック換算時の浮動小数点誤差の許容幅
+TICK_EPSILON = 1e-6
+
+def _bin_rows(timestamps, starts, interval):
+    """
+    Assign every row to its interval index in a single searchsorted pass.
+
+    All three arguments must use the same integer time unit.
+
+    :param timestamps: int64 array of row timestamps
+    :param starts: Sorted int64 array of interval start times
+    :param interval: Interval length
+    :return: int64 array of interval indices, -1 for rows outside every interval
+    """
+    bins = np.searchsorted(starts, timestamps, side='right') - 1
+    outside = (bins < 0) | (timestamps >= starts[np.clip(bins, 0, None)] + interval)
+    bins[outside] = -1
+    return bins
+
+def _aggregate_arrays(bins, price, qty, is_ask, is_bid, close_by_bin, bands=DEFAULT_BANDS, tick_size=None):
+    """
+    Compute per-interval partial band sums for all intervals at once.
+
+    Rows are sorted once by (interval, side, price) and a cumulative quantity is
+    built over the sorted order. Each (interval, side) segment then answers every
+    band with two binary searches, so adding bands does not add passes over the
+    rows. The returned sums are additive, so results for several chunks of the
+    same interval can simply be added together.
+
+    :param bins: Interval index of each row (-1 rows are ignored)
+    :param price: Price of each row; band thresholds are compared in the dtype of
+        this array (e.g. float32 for parsed archives)
+    :param qty: Quantity of each row
+    :param is_ask: Boolean mask of ask rows
+    :param is_bid: Boolean mask of bid rows
+    :param close_by_bin: Close price of each interval (NaN if unknown)
+    :param bands: Bands evaluated in addition to RATIO_BANDS
+    :param tick_size: If given, price holds integer ticks of this size and band
+        thresholds are converted to ticks once per interval
+    :return: Dict with 'row_count' (n_bins,) and 'band_sums' / 'band_counts' (n_bins, n_bands)
+    """
+    all_bands = RATIO_BANDS + list(bands)
+    n_bins = len(close_by_bin)
+    n_bands = len(all_bands)
+    keep = bins >= 0
+    bins = bins[keep]
+    price = np.asarray(price)[keep]
+    if tick_size is None and price.dtype.kind != 'f':
+        price = price.astype(np.float64)
+    qty = np.asarray(qty, dtype=np.float64)[keep]
+
+    # サイド: 0=bid, 1=ask, 2=その他
+    side = np.full(len(bins), 2, dtype=np.int64)
+    side[np.asarray(is_bid)[keep]] = 0
+    side[np.asarray(is_ask)[keep]] = 1
+
+    # (区間, サイド, 価格) の順に一度だけソートし、数量の累積和を作成
+    segment = bins * 3 + side
+    order = np.lexsort((price, segment))
+    sorted_price = price[order]
+    cum_qty = np.concatenate([[0.0], np.cumsum(qty[order])])
+    segment_bounds = np.searchsorted(segment[order], np.arange(n_bins * 3 + 1))
+
+    lower = 1 + np.array([band['lower'] for band in all_bands])
+    upper = 1 + np.array([band['upper'] for band in all_bands])
+    applies = [
+        np.array([band['side'] in ('b', 'both') for band in all_bands]),
+        np.array([band['side'] in ('a', 'both') for band in all_bands]),
+        np.array([band['side'] == 'both' for band in all_bands]),
+    ]
+
+    row_count = np.bincount(bins, minlength=n_bins)
+    active = np.flatnonzero((row_count > 0) & ~np.isnan(close_by_bin))
+    lower_prices = np.outer(close_by_bin[active], lower)
+    upper_prices = np.outer(close_by_bin[active], upper)
+    if tick_size is not None:
+        # 閾値を一度だけティック単位の整数に変換（以降は整数比較）
+        lower_prices = np.ceil(lower_prices / tick_size - TICK_EPSILON).astype(np.int64)
+        upper_prices = np.floor(upper_prices / tick_size + TICK_EPSILON).astype(np.int64)
+    else:
+        # 閾値を価格列と同じ精度に丸めて比較（float32の価格は従来どおりfloat32で比較し、境界上の価格を含める）
+        lower_prices = lower_prices.astype(price.dtype)
+        upper_prices = upper_prices.astype(price.dtype)
+
+    band_sums = np.zeros((n_bins, n_bands))
+    band_counts = np.zeros((n_bins, n_bands), dtype=np.int64)
+    for b, lower_price, upper_price in zip(active, lower_prices, upper_prices):
+        for s in range(3):
+            seg_start, seg_end = segment_bounds[b * 3 + s], segment_bounds[b * 3 + s + 1]
+            if seg_start == seg_end:
+                continue
+            levels = sorted_price[seg_start:seg_end]
+            left = seg_start + np.searchsorted(levels, lower_price, side='left')
+            right = seg_start + np.searchsorted(levels, upper_price, side='right')
+            band_sums[b] += np.where(applies[s], cum_qty[right] - cum_qty[left], 0.0)
+            band_counts[b] += np.where(applies[s], right - left, 0)
+
+    return {
+        'row_count': row_count,
+        'band_sums': band_sums,
+        'band_counts': band_counts,
+    }
+
+def _build_result(interval_starts, close_by_bin, sums, bands=DEFAULT_BANDS):
+    # データが存在し、終値が取得できた区間のみを出力
+    present = (sums['row_count'] > 0) & ~np.isnan(close_by_bin)
+    if not present.any():
         return pd.DataFrame()
 
-    # 5分間隔の開始時刻リストを生成
-    interval_starts = pd.date_range(start=start_time, end=end_time, freq='5T')
+    band_sums = sums['band_sums'][present]
+    band_counts = sums['band_counts'][present]
+    a_qty_sum = band_sums[:, 0]
+    b_qty_sum = band_sums[:, 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        depth_ratio = np.where(a_qty_sum != 0, b_qty_sum / a_qty_sum, np.inf)
+
+    starts = interval_starts[present]
+    columns = {
+        'interval_start': starts,
+        'interval_end': starts + INTERVAL,
+        'close_price': close_by_bin[present],
+        'a_qty_sum': a_qty_sum,
+        'b_qty_sum': b_qty_sum,
+        'depth_ratio': depth_ratio,
+    }
+    for i, band in enumerate(bands, start=len(RATIO_BANDS)):
+        columns[band['name']] = band_sums[:, i]
+    columns['filtered_count'] = band_counts[:, 0] + band_counts[:, 1]
+
+    result = pd.DataFrame(columns)
+    result['relative_ratio_percent'] = (result['depth_ratio'] - 1) * 100
+    return result
+
+def aggregate_intervals(data, interval_starts, close_prices, bands=DEFAULT_BANDS):
+    """
+    Aggregate order book rows into 5-minute depth metrics for all intervals at once.
+
+    :param data: DataFrame with 'timestamp' (UTC datetime), 'price', 'qty' and 'side' columns
+    :param interval_starts: DatetimeIndex of interval start times
+    :param close_prices: Mapping of interval start time to close price
+    :param bands: Bands reported in addition to the depth ratio bands
+    :return: DataFrame with one row per interval that has data and a close price
+    """
+    interval_starts = pd.DatetimeIndex(interval_starts)
+    close_by_bin = pd.Series(close_prices, dtype='float64').reindex(interval_starts).to_numpy()
+
+    bins = _bin_rows(
+        data['timestamp'].values.view('int64'),
+        interval_starts.asi8,
+        int(INTERVAL.total_seconds() * 1e9)
+    )
+    sums = _aggregate_arrays(
+        bins,
+        data['price'].to_numpy(),
+        data['qty'].to_numpy(),
+        (data['side'] == 'a').to_numpy(),
+        (data['side'] == 'b').to_numpy(),
+        close_by_bin,
+        bands
+    )
+    return _build_result(interval_starts, close_by_bin, sums, bands)
+
+DEPTH_DTYPES = {
+    'timestamp': 'int64',
+    'price': 'float32',
+    'qty': 'float32',
+    'side': 'category'
+}
+DEFAULT_CHUNKSIZE = 1_000_000
+
+class _StreamMemberReader(io.RawIOBase):
+    # ストリームモードのtarメンバーはseekable()に対応していないため、読み込みのみを公開する
+    def __init__(self, f):
+        self._f = f
+
+    def readable(self):
+        return True
 
-    # 必要な終値を取得
+    def readinto(self, buffer):
+        data = self._f.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+def iter_depth_chunks(source, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Stream every CSV member of an S_DEPTH tarball as DataFrame chunks.
+
+    Timestamps are left as int64 milliseconds so that chunks can be binned
+    without converting to datetime.
+
+    :param source: Path to the .tar.gz archive, or a readable binary stream of
+        it (e.g. an HTTP response body), which is decompressed as it is read
+    :param chunksize: Number of rows per chunk
+    :return: Generator of DataFrame chunks
+    """
+    if hasattr(source, 'read'):
+        # ストリームは先頭から順に読むだけ（シーク不要）のモードで開く
+        tar = tarfile.open(fileobj=source, mode='r|gz')
+    else:
+        tar = tarfile.open(source, 'r:gz')
+    with tar:
+        for member in tar:
+            f = tar.extractfile(member)
+            if f is None:
+                continue
+            if hasattr(source, 'read'):
+                f = io.BufferedReader(_StreamMemberReader(f))
+            reader = pd.read_csv(
+                io.TextIOWrapper(f),
+                dtype=DEPTH_DTYPES,
+                usecols=list(DEPTH_DTYPES),
+                chunksize=chunksize
+            )
+            for chunk in reader:
+                yield chunk
+
+class IntervalAccumulator:
+    """
+    Per-interval running sums fed chunk by chunk.
+
+    Memory use depends only on the number of intervals, not on the number of
+    rows that have been added.
+    """
+
+    def __init__(self, start_time, end_time, close_prices, bands=DEFAULT_BANDS):
+        self.bands = list(bands)
+        self.interval_starts = pd.date_range(start=start_time, end=end_time, freq='5T')
+        self.close_by_bin = pd.Series(close_prices, dtype='float64').reindex(self.interval_starts).to_numpy()
+        self.start_ms = int(pd.Timestamp(start_time).timestamp() * 1000)
+        self.end_ms = int(pd.Timestamp(end_time).timestamp() * 1000)
+        self.starts_ms = self.interval_starts.asi8 // 10**6
+        self.total_rows = 0
+        self.rows_in_range = 0
+        self.sums = None
+
+    def add(self, chunk):
+        """
+        Add a chunk with int64 millisecond 'timestamp', 'price', 'qty' and 'side' columns.
+        """
+        self.add_arrays(
+            chunk['timestamp'].to_numpy(dtype='int64'),
+            chunk['price'].to_numpy(),
+            chunk['qty'].to_numpy(),
+            (chunk['side'] == 'a').to_numpy(),
+            (chunk['side'] == 'b').to_numpy()
+        )
+
+    def add_compact(self, compact):
+        """
+        Add rows in the representation returned by compact_depth_arrays (e.g. a
+        partition of a tick-encoded DepthCache).
+        """
+        self.add_arrays(
+            compact['timestamp'],
+            compact['price'],
+            compact['qty'],
+            compact['side'] == ASK,
+            compact['side'] == BID,
+            timestamp_base=compact['base_ms'],
+            tick_size=compact['tick_size']
+        )
+
+    def add_arrays(self, timestamps, price, qty, is_ask, is_bid, timestamp_base=0, tick_size=None):
+        """
+        Add rows given as plain arrays.
+
+        timestamps are millisecond offsets from timestamp_base (plain epoch
+        milliseconds by default). If tick_size is given, price holds integer ticks.
+        """
+        timestamps = np.asarray(timestamps)
+        self.total_rows += len(timestamps)
+
+        # 指定された期間外の行は集計対象から外す
+        bins = _bin_rows(timestamps, self.starts_ms - timestamp_base, int(INTERVAL.total_seconds() * 1000))
+        bins[(timestamps < self.start_ms - timestamp_base) | (timestamps >= self.end_ms - timestamp_base)] = -1
+        self.rows_in_range += int((bins >= 0).sum())
+
+        partial = _aggregate_arrays(bins, price, qty, is_ask, is_bid, self.close_by_bin, self.bands, tick_size)
+        if self.sums is None:
+            self.sums = partial
+        else:
+            for key, values in partial.items():
+                self.sums[key] += values
+
+    def merge(self, other):
+        """
+        Add the running sums of another accumulator over the same intervals.
+        """
+        self.total_rows += other.total_rows
+        self.rows_in_range += other.rows_in_range
+        if other.sums is None:
+            return
+        if self.sums is None:
+            self.sums = {key: values.copy() for key, values in other.sums.items()}
+        else:
+            for key, values in other.sums.items():
+                self.sums[key] += values
+
+    def result(self):
+        if self.sums is None:
+            return pd.DataFrame()
+        return _build_result(self.interval_starts, self.close_by_bin, self.sums, self.bands)
+
+def _add_partition(accumulator, part):
+    # ティック単位で保存されたパーティションは変換せずにそのまま集計
+    if 'tick_size' in part:
+        accumulator.add_compact(part)
+    else:
+        accumulator.add_arrays(part['timestamp'], part['price'], part['qty'], part['side'] == ASK, part['side'] == BID)
+
+def _accumulating(chunks, accumulator, tick_size=None):
+    # キャッシュへ書き込むチャンクを同じパスで集計する（キャッシュ済みの場合と同じ表現で集計）
+    for chunk in chunks:
+        if tick_size is not None and len(chunk):
+            timestamps = chunk['timestamp'].to_numpy(dtype='int64')
+            accumulator.add_compact(compact_depth_arrays(timestamps, chunk['price'].to_numpy(), chunk['qty'].to_numpy(),
+                                                         chunk['side'], tick_size, int(timestamps[0])))
+        else:
+            accumulator.add(chunk)
+        yield chunk
+
+def _aggregate_cached_shard(cache_directory, cache_key, names, start_time, end_time, close_prices, bands):
+    # ワーカープロセス: 割り当てられた時間帯のパーティションだけをメモリマップして集計
+    accumulator = IntervalAccumulator(start_time, end_time, close_prices, bands=bands)
+    cache = DepthCache(cache_directory)
+    for part in cache.partitions(*cache_key, names=names):
+        _add_partition(accumulator, part)
+    return accumulator
+
+def process_large_file(file_path, start_time, end_time, get_close_prices_func, chunksize=DEFAULT_CHUNKSIZE,
+                       cache=None, cache_key=None, bands=DEFAULT_BANDS, tick_size=None, workers=1):
+    """
+    Compute 5-minute depth metrics from an S_DEPTH archive.
+
+    file_path may also be a readable stream of the archive (see
+    get_binance_orderbook_data.open_download_stream), in which case parsing
+    and aggregation run while the archive is still downloading.
+
+    When a DepthCache and a (symbol, date, data_type) cache_key are given, the
+    first call aggregates the archive and writes it to the cache in the same
+    pass, and every later call memory-maps the cached columns instead of
+    reading the archive. file_path may be None if the key is already cached.
+
+    bands lists the price bands reported next to the depth ratio (see
+    depth_band); the default reproduces total_qty_1pct and total_qty_5pct.
+
+    When tick_size is given, a newly written cache stores the rows in the
+    compact integer-tick layout (see compact_depth_arrays: 13 instead of 17
+    bytes per row), and aggregation runs on the memory-mapped int32 ticks with
+    integer band comparisons. Without a cache tick_size has no effect; a day
+    already cached keeps the layout it was written with.
+
+    With workers > 1 and a day that is already cached, the hourly partitions
+    (which are aligned to 5-minute boundaries) are split into contiguous time
+    shards, each shard is aggregated in a worker process from the memory-mapped
+    columns, and the per-interval sums are merged. Decompressing and parsing an
+    archive is inherently sequential, so a day read from file_path (with or
+    without a cache) is always parsed and aggregated on a single core; workers
+    only speed up later runs over the cache.
+    """
+    # 5分間隔の開始時刻リストを生成し、必要な終値を先に取得
+    interval_starts = pd.date_range(start=start_time, end=end_time, freq='5T')
     close_prices = get_close_prices_func(interval_starts)
 
-    # 各5分間隔での処理
-    results = []
-    for start in interval_starts:
-        end = start + timedelta(minutes=5)
-        interval_data = all_data[(all_data['timestamp'] >= start) & (all_data['timestamp'] < end)]
-        if interval_data.empty:
-            continue
-        close_price = close_prices.get(start)
-        if close_price is None:
-            continue
-        processed_interval = process_5min_intervals(interval_data, start, end, close_price)
-        if not processed_interval.empty:
-            results.append(processed_interval)
-
-    if results:
-        final_result = pd.concat(results, ignore_index=True)
-        final_result['relative_ratio_percent'] = (final_result['depth_ratio'] - 1) * 100
+    accumulator = IntervalAccumulator(start_time, end_time, close_prices, bands=bands)
+
+    if cache is not None and cache_key is not None and cache.exists(*cache_key):
+        names = cache.partition_names(*cache_key, start_time=start_time, end_time=end_time)
+        if workers > 1 and len(names) > 1:
+            shards = [list(shard) for shard in np.array_split(names, min(workers, len(names)))]
+            with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+                futures = [
+                    executor.submit(_aggregate_cached_shard, cache.directory, cache_key, shard,
+                                    start_time, end_time, close_prices, bands)
+                    for shard in shards
+                ]
+                for future in futures:
+                    accumulator.merge(future.result())
+        else:
+            # キャッシュ済みの列をメモリマップして集計
+            for part in cache.partitions(*cache_key, names=names):
+                _add_partition(accumulator, part)
+    elif cache is not None and cache_key is not None:
+        # アーカイブを一度だけ読み、キャッシュへの書き込みと集計を同時に行う
+        chunks = iter_depth_chunks(file_path, chunksize=chunksize)
+        cache.write(*cache_key, _accumulating(chunks, accumulator, tick_size), tick_size=tick_size)
+    else:
+        # アーカイブ内の全ファイルをチャンク単位で読み込み、区間ごとに集計
+        for chunk in iter_depth_chunks(file_path, chunksize=chunksize):
+            accumulator.add(chunk)
+
+    if accumulator.rows_in_range == 0:
+        print("No data in the specified time range.")
+        return pd.DataFrame()
+
+    final_result = accumulator.result()
+
+    if not final_result.empty:
         logging.info(f"Final result shape: {final_result.shape}")
-        logging.info(f"Total rows processed: {total_rows}")
+        logging.info(f"Total rows processed: {accumulator.total_rows}")
         return final_result
     else:
         print("No data processed.")
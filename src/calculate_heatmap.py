@@ -1,5 +1,8 @@
+import os
 import pandas as pd
 import numpy as np
+from collections import deque
+from datetime import timedelta
 
 def process_data(data: pd.DataFrame) -> tuple:
     """
@@ -26,4 +29,406 @@ def process_data(data: pd.DataFrame) -> tuple:
     # ヒートマップデータの作成
     heatmap_data = data.pivot_table(index='weekday', columns='hour', values='return', aggfunc='mean') * 100  # Convert to percentage
     
-    return weekday_return, hour_return, heatmap_data
\ No newline at end of file
+    return weekday_return, hour_return, heatmap_data
+
+class IncrementalSeasonality:
+    """
+    Running weekday/hour return statistics over a sliding time window.
+
+    Per (weekday, hour) cell it keeps the sum, sum of squares and count of
+    returns, so adding a candle or expiring the oldest one is O(1). result()
+    matches process_data applied to the candles currently in the window.
+    """
+
+    def __init__(self, window=timedelta(days=90)):
+        """
+        :param window: Candles with timestamp <= newest - window are expired
+        """
+        self.window = pd.Timedelta(window)
+        self.sum = np.zeros((7, 24))
+        self.sumsq = np.zeros((7, 24))
+        self.count = np.zeros((7, 24), dtype=np.int64)
+        self.candles_per_cell = np.zeros((7, 24), dtype=np.int64)
+        self._candles = deque()  # (timestamp, close, weekday, hour, return)
+
+    @classmethod
+    def from_frame(cls, data, window=timedelta(days=90)):
+        """
+        Build the statistics from a DataFrame indexed by timestamp with a 'close' column.
+        """
+        stats = cls(window)
+        if data.empty:
+            return stats
+        data = data[data.index > data.index[-1] - stats.window]
+        closes = data['close'].to_numpy(np.float64)
+        returns = np.full(len(closes), np.nan)
+        returns[1:] = closes[1:] / closes[:-1] - 1
+        weekdays, hours = data.index.weekday.to_numpy(), data.index.hour.to_numpy()
+        valid = ~np.isnan(returns)
+        np.add.at(stats.sum, (weekdays[valid], hours[valid]), returns[valid])
+        np.add.at(stats.sumsq, (weekdays[valid], hours[valid]), returns[valid] ** 2)
+        np.add.at(stats.count, (weekdays[valid], hours[valid]), 1)
+        np.add.at(stats.candles_per_cell, (weekdays, hours), 1)
+        stats._candles.extend(zip(data.index, closes, weekdays, hours, returns))
+        return stats
+
+    @property
+    def last_timestamp(self):
+        return self._candles[-1][0] if self._candles else None
+
+    def __len__(self):
+        return len(self._candles)
+
+    def _apply(self, weekday, hour, ret, sign):
+        if not np.isnan(ret):
+            self.sum[weekday, hour] += sign * ret
+            self.sumsq[weekday, hour] += sign * ret * ret
+            self.count[weekday, hour] += sign
+            if self.count[weekday, hour] == 0:
+                # 丸め誤差が残らないようにリセット
+                self.sum[weekday, hour] = self.sumsq[weekday, hour] = 0.0
+
+    def add(self, timestamp, close):
+        """
+        Add a candle, replacing the newest one if it has the same timestamp
+        (a candle still forming), then expire candles that left the window.
+        Older timestamps are ignored.
+        """
+        timestamp = pd.Timestamp(timestamp)
+        if self._candles and timestamp <= self._candles[-1][0]:
+            if timestamp < self._candles[-1][0]:
+                return
+            # 形成中の足の更新は直前の値を取り消してから追加
+            _, _, weekday, hour, ret = self._candles.pop()
+            self._apply(weekday, hour, ret, -1)
+            self.candles_per_cell[weekday, hour] -= 1
+
+        ret = close / self._candles[-1][1] - 1 if self._candles else np.nan
+        weekday, hour = timestamp.weekday(), timestamp.hour
+        self._candles.append((timestamp, close, weekday, hour, ret))
+        self._apply(weekday, hour, ret, 1)
+        self.candles_per_cell[weekday, hour] += 1
+        self.expire(timestamp - self.window)
+
+    def expire(self, cutoff):
+        """
+        Remove candles with timestamp <= cutoff.
+        """
+        while self._candles and self._candles[0][0] <= cutoff:
+            _, _, weekday, hour, ret = self._candles.popleft()
+            self._apply(weekday, hour, ret, -1)
+            self.candles_per_cell[weekday, hour] -= 1
+            if self._candles:
+                # 新しい先頭の足は前の足がなくなるため収益率を持たない
+                first = self._candles[0]
+                self._apply(first[2], first[3], first[4], -1)
+                self._candles[0] = first[:4] + (np.nan,)
+
+    def result(self):
+        """
+        :return: Tuple containing weekday_return, hour_return, and heatmap_data (as process_data)
+        """
+        if not self._candles:
+            return pd.Series(dtype=float), pd.Series(dtype=float), pd.DataFrame()
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weekday_present = self.candles_per_cell.sum(axis=1) > 0
+            hour_present = self.candles_per_cell.sum(axis=0) > 0
+            weekday_mean = self.sum.sum(axis=1) / self.count.sum(axis=1) * 100
+            hour_mean = self.sum.sum(axis=0) / self.count.sum(axis=0) * 100
+            cell_mean = self.sum / self.count * 100
+
+        weekdays = np.flatnonzero(weekday_present)
+        hours = np.flatnonzero(hour_present)
+        weekday_return = pd.Series(weekday_mean[weekdays], index=pd.Index(weekdays, name='weekday'), name='return')
+        hour_return = pd.Series(hour_mean[hours], index=pd.Index(hours, name='hour'), name='return')
+
+        # pivot_tableと同様に、収益率のない曜日・時間は除外
+        cells = self.count > 0
+        heat_weekdays = np.flatnonzero(cells.any(axis=1))
+        heat_hours = np.flatnonzero(cells.any(axis=0))
+        heatmap_data = pd.DataFrame(cell_mean[np.ix_(heat_weekdays, heat_hours)],
+                                    index=pd.Index(heat_weekdays, name='weekday'),
+                                    columns=pd.Index(heat_hours, name='hour'))
+        return weekday_return, hour_return, heatmap_data
+
+
+class SeasonalityBatch:
+    """
+    Per-(window, symbol, weekday, hour) return sums from batch_seasonality.
+    """
+
+    def __init__(self, symbols, windows, sums, sumsq, counts):
+        self.symbols = list(symbols)
+        self.windows = list(windows)
+        self.sum = sums
+        self.sumsq = sumsq
+        self.count = counts
+
+    @property
+    def mean(self):
+        """
+        Mean return (%) per cell, shaped (windows, symbols, 7, 24); NaN where there is no data.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sum / self.count * 100
+
+    def result(self, symbol, window):
+        """
+        :return: Tuple containing weekday_return, hour_return, and heatmap_data for one
+            symbol and window, in the same form as process_data
+        """
+        w, s = self.windows.index(window), self.symbols.index(symbol)
+        sums, counts = self.sum[w, s], self.count[w, s]
+        if not counts.any():
+            return pd.Series(dtype=float), pd.Series(dtype=float), pd.DataFrame()
+        weekdays = np.flatnonzero(counts.sum(axis=1))
+        hours = np.flatnonzero(counts.sum(axis=0))
+        weekday_return = pd.Series(sums.sum(axis=1)[weekdays] / counts.sum(axis=1)[weekdays] * 100,
+                                   index=pd.Index(weekdays, name='weekday'), name='return')
+        hour_return = pd.Series(sums.sum(axis=0)[hours] / counts.sum(axis=0)[hours] * 100,
+                                index=pd.Index(hours, name='hour'), name='return')
+        heatmap_data = pd.DataFrame(self.mean[w, s][np.ix_(weekdays, hours)],
+                                    index=pd.Index(weekdays, name='weekday'), columns=pd.Index(hours, name='hour'))
+        return weekday_return, hour_return, heatmap_data
+
+def batch_seasonality(closes: pd.DataFrame, windows=(30, 90, 365)) -> SeasonalityBatch:
+    """
+    Weekday/hour return statistics for many symbols and look-back windows at once.
+
+    Returns and weekday*24+hour cell codes are computed once over the stacked
+    close matrix; all (window, symbol, cell) sums come from np.bincount over
+    the disjoint time segments between window starts, accumulated from the
+    newest segment backwards.
+
+    :param closes: Close prices indexed by timestamp, one column per symbol
+        (missing values are forward-filled, as pct_change does)
+    :param windows: Look-back windows in days, ending at the last timestamp
+    :return: SeasonalityBatch
+    """
+    symbols = list(closes.columns)
+    n_rows, n_symbols = closes.shape
+    values = closes.ffill().to_numpy(np.float64)
+    returns = np.full_like(values, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns[1:] = values[1:] / values[:-1] - 1
+    cells = (closes.index.weekday * 24 + closes.index.hour).to_numpy()
+
+    # 各ウィンドウの先頭の足は収益率を持たないため、その次の行から集計
+    if n_rows:
+        first_rows = [int(np.searchsorted(closes.index, closes.index[-1] - pd.Timedelta(days=d), side='right')) + 1
+                      for d in windows]
+    else:
+        first_rows = [0 for _ in windows]
+    bounds = np.unique(first_rows)
+    segments = np.searchsorted(bounds, np.arange(n_rows), side='right') - 1
+    n_segments = len(bounds)
+
+    valid = ~np.isnan(returns) & (segments >= 0)[:, None]
+    keys = (segments[:, None] * n_symbols + np.arange(n_symbols)) * 168 + cells[:, None]
+    keys, weights = keys[valid], returns[valid]
+    size = n_segments * n_symbols * 168
+    shape = (n_segments, n_symbols, 7, 24)
+    sums = np.bincount(keys, weights=weights, minlength=size).reshape(shape)
+    sumsq = np.bincount(keys, weights=weights * weights, minlength=size).reshape(shape)
+    counts = np.bincount(keys, minlength=size).reshape(shape)
+
+    # 新しい区間から累積し、各ウィンドウの開始区間の値を取り出す
+    sums, sumsq, counts = (np.cumsum(a[::-1], axis=0)[::-1] for a in (sums, sumsq, counts))
+    take = np.searchsorted(bounds, first_rows)
+    return SeasonalityBatch(symbols, windows, sums[take], sumsq[take], counts[take])
+
+
+HEATMAP_STATS = ('count', 'mean', 'std', 'win_rate', 't_stat', 'median')
+
+class SeasonalityStats:
+    """
+    Extended per-(weekday, hour) return statistics gathered in one pass.
+
+    Besides count, sum, sum of squares and wins, each cell keeps a fixed-bin
+    histogram of returns over [-quantile_range, quantile_range] (returns outside
+    are clamped to the edge bins), from which medians and other quantiles are
+    interpolated with an error of at most one bin width. All parts are additive,
+    so partial results over separate chunks can be merged.
+    """
+
+    def __init__(self, quantile_range=0.05, quantile_bins=2000):
+        """
+        :param quantile_range: Absolute return covered by the quantile histogram (0.05 = ±5%)
+        :param quantile_bins: Number of histogram bins per cell
+        """
+        self.quantile_range = quantile_range
+        self.quantile_bins = quantile_bins
+        self.count = np.zeros((7, 24), dtype=np.int64)
+        self.sum = np.zeros((7, 24))
+        self.sumsq = np.zeros((7, 24))
+        self.wins = np.zeros((7, 24), dtype=np.int64)
+        self.histogram = np.zeros((7 * 24, quantile_bins), dtype=np.int64)
+
+    def add_returns(self, index: pd.DatetimeIndex, returns):
+        """
+        Accumulate returns attributed to the (weekday, hour) of their timestamps; NaNs are skipped.
+        """
+        returns = np.asarray(returns, dtype=np.float64)
+        valid = ~np.isnan(returns)
+        cells = (index.weekday * 24 + index.hour).to_numpy()[valid]
+        returns = returns[valid]
+        self.count += np.bincount(cells, minlength=168).reshape(7, 24)
+        self.sum += np.bincount(cells, weights=returns, minlength=168).reshape(7, 24)
+        self.sumsq += np.bincount(cells, weights=returns * returns, minlength=168).reshape(7, 24)
+        self.wins += np.bincount(cells[returns > 0], minlength=168).reshape(7, 24)
+        bins = ((returns + self.quantile_range) / (2 * self.quantile_range) * self.quantile_bins).astype(np.int64)
+        np.clip(bins, 0, self.quantile_bins - 1, out=bins)
+        self.histogram += np.bincount(cells * self.quantile_bins + bins,
+                                      minlength=168 * self.quantile_bins).reshape(168, self.quantile_bins)
+        return self
+
+    def add(self, data: pd.DataFrame):
+        """
+        Accumulate the close-to-close returns of a DataFrame indexed by timestamp.
+        """
+        if not data.empty and 'close' in data.columns:
+            self.add_returns(data.index, data['close'].pct_change().to_numpy())
+        return self
+
+    def merge(self, other):
+        """
+        Add the statistics of another SeasonalityStats with the same histogram settings.
+        """
+        if (other.quantile_range, other.quantile_bins) != (self.quantile_range, self.quantile_bins):
+            raise ValueError("Cannot merge SeasonalityStats with different histogram settings")
+        for name in ('count', 'sum', 'sumsq', 'wins', 'histogram'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    def quantile(self, q):
+        """
+        Approximate q-quantile of returns (%) per cell; NaN for empty cells.
+        """
+        cdf = np.cumsum(self.histogram, axis=1)
+        target = q * self.count.reshape(-1)
+        # 累積度数が目標値に達するビンを探し、ビン内で線形補間
+        bins = np.minimum((cdf < target[:, None]).sum(axis=1), self.quantile_bins - 1)
+        rows = np.arange(168)
+        below = np.where(bins > 0, cdf[rows, np.maximum(bins - 1, 0)], 0)
+        in_bin = self.histogram[rows, bins]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.clip(np.where(in_bin > 0, (target - below) / in_bin, 0.5), 0, 1)
+        width = 2 * self.quantile_range / self.quantile_bins
+        values = (-self.quantile_range + (bins + fraction) * width) * 100
+        return np.where(self.count.reshape(-1) > 0, values, np.nan).reshape(7, 24)
+
+    def stat(self, name):
+        """
+        One statistic per cell as a (7, 24) array: 'count', 'mean' (%), 'std' (%),
+        'win_rate' (%), 't_stat', 'median' (%) or 'qNN' for the NN-th percentile (e.g. 'q90').
+        """
+        n = self.count.astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.sum / n
+            variance = np.maximum(self.sumsq - n * mean * mean, 0) / (n - 1)
+            variance[n < 2] = np.nan
+            std = np.sqrt(variance)
+            if name == 'count':
+                return n
+            if name == 'mean':
+                return mean * 100
+            if name == 'std':
+                return std * 100
+            if name == 'win_rate':
+                return self.wins / n * 100
+            if name == 't_stat':
+                return mean / (std / np.sqrt(n))
+        if name == 'median':
+            return self.quantile(0.5)
+        if name.startswith('q') and name[1:].isdigit():
+            return self.quantile(int(name[1:]) / 100)
+        raise ValueError(f"Unknown statistic: {name}")
+
+    def heatmap(self, name='mean'):
+        """
+        :return: 7x24 DataFrame (weekday x hour) of one statistic, for visualizer.create_heatmap
+        """
+        return pd.DataFrame(self.stat(name), index=pd.Index(range(7), name='weekday'),
+                            columns=pd.Index(range(24), name='hour'))
+
+    def table(self, stats=HEATMAP_STATS):
+        """
+        :return: DataFrame with one row per (weekday, hour) and one column per statistic
+        """
+        index = pd.MultiIndex.from_product([range(7), range(24)], names=['weekday', 'hour'])
+        return pd.DataFrame({name: self.stat(name).reshape(-1) for name in stats}, index=index)
+
+def process_data_extended(data: pd.DataFrame, quantile_range=0.05, quantile_bins=2000) -> SeasonalityStats:
+    """
+    Extended counterpart of process_data: per-cell count, mean, std, win rate,
+    t-statistic and approximate quantiles in one pass over the returns.
+
+    :param data: Raw DataFrame containing price data
+    :return: SeasonalityStats
+    """
+    return SeasonalityStats(quantile_range, quantile_bins).add(data)
+
+
+class ChunkedSeasonality:
+    """
+    Out-of-core SeasonalityStats over the klines of a KlineStore.
+
+    The stored candles are read in bounded chunks and folded into per-cell
+    partial statistics; the last open time and close are kept so a later
+    update() continues with the returns of newly stored candles only. The
+    state can be saved and loaded to resume across runs.
+    """
+
+    def __init__(self, symbol, interval, quantile_range=0.05, quantile_bins=2000):
+        self.symbol = symbol
+        self.interval = interval
+        self.stats = SeasonalityStats(quantile_range, quantile_bins)
+        self.last_open_time = None
+        self.last_close = np.nan
+
+    def update(self, store, start_ms=None, end_ms=None, chunk_rows=100_000):
+        """
+        Add the candles stored after the last processed one (from start_ms on the first run).
+
+        :param store: KlineStore
+        :param end_ms: Last open time to include (None = all stored candles)
+        :return: Number of candles processed
+        """
+        if self.last_open_time is not None:
+            start_ms = self.last_open_time + 1
+        processed = 0
+        for chunk in store.iter_columns(self.symbol, self.interval, start_ms, end_ms, ('close',), chunk_rows):
+            closes = chunk['close']
+            # チャンクの境界をまたぐ収益率は前回の終値から計算
+            previous = np.concatenate(([self.last_close], closes[:-1]))
+            index = pd.to_datetime(chunk['open_time'], unit='ms')
+            self.stats.add_returns(index, closes / previous - 1)
+            self.last_open_time = int(chunk['open_time'][-1])
+            self.last_close = closes[-1]
+            processed += len(closes)
+        return processed
+
+    def save(self, path):
+        """
+        Write the state to a .npz file (replaced atomically).
+        """
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, symbol=self.symbol, interval=self.interval,
+                 last_open_time=-1 if self.last_open_time is None else self.last_open_time,
+                 last_close=self.last_close, quantile_range=self.stats.quantile_range,
+                 count=self.stats.count, sum=self.stats.sum, sumsq=self.stats.sumsq,
+                 wins=self.stats.wins, histogram=self.stats.histogram)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as saved:
+            state = cls(str(saved['symbol']), str(saved['interval']), float(saved['quantile_range']),
+                        saved['histogram'].shape[1])
+            for name in ('count', 'sum', 'sumsq', 'wins', 'histogram'):
+                setattr(state.stats, name, saved[name])
+            last_open_time = int(saved['last_open_time'])
+            state.last_open_time = None if last_open_time < 0 else last_open_time
+            state.last_close = float(saved['last_close'])
+        return state
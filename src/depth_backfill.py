@@ -0,0 +1,148 @@
+import os
+import json
+import argparse
+import logging
+import traceback
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+import pytz
+
+from get_binance_orderbook_data import get_historical_data_link, download_file, get_close_prices_concurrent
+from calculate_depth import process_large_file
+
+BASE_URL = 'https://api.binance.com'
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def day_key(symbol, date):
+    return f"{symbol}/{date}"
+
+def load_manifest(path):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_manifest(path, manifest):
+    # 途中で落ちても壊れないよう、一時ファイルに書いてから置き換える
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def process_day(symbol, date, data_type, output_dir, api_key, secret_key, base_url=BASE_URL, keep_archive=False):
+    """
+    Download and process one day of depth data, writing the result as CSV.
+
+    Runs inside a worker process; close prices are fetched with concurrent
+    kline requests, so no Binance client is needed.
+
+    :return: Dict with the result path and row count
+    """
+    start_time = datetime.combine(date, datetime.min.time()).replace(tzinfo=pytz.UTC)
+    end_time = start_time + timedelta(days=1)
+
+    data_link_response = get_historical_data_link(api_key, secret_key, base_url, symbol, start_time, end_time, data_type)
+    if not (data_link_response and 'data' in data_link_response and data_link_response['data']):
+        raise RuntimeError(f"Failed to obtain download link for {symbol} {date}")
+
+    download_dir = os.path.join(output_dir, 'downloads', symbol)
+    file_path = download_file(data_link_response['data'][0]['url'], directory=download_dir)
+    try:
+        results_df = process_large_file(
+            file_path,
+            start_time=start_time,
+            end_time=end_time,
+            get_close_prices_func=lambda timestamps: get_close_prices_concurrent(symbol, timestamps)
+        )
+    finally:
+        if not keep_archive and os.path.exists(file_path):
+            os.remove(file_path)
+
+    if results_df.empty:
+        raise RuntimeError(f"No data processed for {symbol} {date}")
+    results_df = results_df[results_df['interval_end'] <= end_time]
+
+    result_dir = os.path.join(output_dir, symbol)
+    os.makedirs(result_dir, exist_ok=True)
+    result_path = os.path.join(result_dir, f"{date}.csv")
+    results_df.to_csv(result_path, index=False)
+    return {'path': result_path, 'rows': len(results_df)}
+
+def backfill_depth(symbols, start_date, end_date, output_dir="depth_backfill", data_type="S_DEPTH",
+                   max_workers=4, api_key=None, secret_key=None, base_url=BASE_URL, process_day_func=process_day):
+    """
+    Backfill daily depth metrics for several symbols and days in parallel.
+
+    Days are fanned out over a process pool, so one worker's download overlaps
+    with another worker's parsing. Progress is recorded in
+    output_dir/manifest.json after every finished day; days already marked
+    'done' are skipped, so an interrupted backfill resumes where it stopped.
+
+    :param symbols: List of symbols (e.g. ['BTCUSDT'])
+    :param start_date: First day (date), inclusive
+    :param end_date: Last day (date), inclusive
+    :param output_dir: Directory for per-day CSV results and the manifest
+    :param data_type: histDataLink data type
+    :param max_workers: Number of worker processes
+    :param process_day_func: Picklable function processing one day (see process_day)
+    :return: Manifest dict keyed by 'SYMBOL/YYYY-MM-DD'
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    manifest = load_manifest(manifest_path)
+
+    days = [d.date() for d in pd.date_range(start=start_date, end=end_date, freq='D')]
+    pending = [
+        (symbol, date) for symbol in symbols for date in days
+        if manifest.get(day_key(symbol, date), {}).get('status') != 'done'
+    ]
+    logging.info(f"Backfill: {len(pending)} of {len(symbols) * len(days)} days pending")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(process_day_func, symbol, date, data_type, output_dir, api_key, secret_key, base_url): (symbol, date)
+            for symbol, date in pending
+        }
+        for future in as_completed(futures):
+            symbol, date = futures[future]
+            key = day_key(symbol, date)
+            try:
+                manifest[key] = dict(status='done', **future.result())
+                logging.info(f"Finished {key}")
+            except Exception as e:
+                manifest[key] = {'status': 'failed', 'error': str(e)}
+                logging.error(f"Failed {key}: {e}")
+                traceback.print_exc()
+            save_manifest(manifest_path, manifest)
+
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill Binance depth metrics for a date range.")
+    parser.add_argument('--symbols', nargs='+', default=['BTCUSDT'])
+    parser.add_argument('--start', required=True, help="First day (YYYY-MM-DD)")
+    parser.add_argument('--end', required=True, help="Last day (YYYY-MM-DD)")
+    parser.add_argument('--output-dir', default='depth_backfill')
+    parser.add_argument('--data-type', default='S_DEPTH')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    manifest = backfill_depth(
+        args.symbols,
+        datetime.strptime(args.start, '%Y-%m-%d').date(),
+        datetime.strptime(args.end, '%Y-%m-%d').date(),
+        output_dir=args.output_dir,
+        data_type=args.data_type,
+        max_workers=args.workers,
+        api_key=os.getenv("BINANCE_API_KEY"),
+        secret_key=os.getenv("BINANCE_SECRET_KEY"),
+    )
+    failed = [key for key, entry in manifest.items() if entry['status'] != 'done']
+    print(f"Done: {len(manifest) - len(failed)}, Failed: {len(failed)}")
+    for key in failed:
+        print(f"  {key}: {manifest[key]['error']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import shutil
+import threading
+import logging
+import numpy as np
+import pandas as pd
+
+SIDE_CODES = {'b': 0, 'a': 1}
+BID = SIDE_CODES['b']
+ASK = SIDE_CODES['a']
+
+HOUR_MS = 3600 * 1000
+
+def compact_depth_arrays(timestamps, price, qty, side, tick_size, base_ms):
+    """
+    Convert order book rows to the compact integer-tick representation.
+
+    Prices become int32 ticks of tick_size, side becomes int8 (ASK/BID codes)
+    and timestamps become int32 millisecond offsets from base_ms, which takes
+    13 bytes per row instead of 17 (and integer instead of float price
+    comparisons during aggregation).
+
+    :param timestamps: int64 millisecond timestamps
+    :param price: Prices
+    :param qty: Quantities
+    :param side: 'a'/'b' labels or int8 side codes
+    :param tick_size: Price tick size of the symbol (e.g. 0.1 for BTCUSDT futures)
+    :param base_ms: Millisecond timestamp the offsets are taken from
+    :return: Dict with 'timestamp', 'price', 'qty', 'side', 'base_ms' and 'tick_size'
+    """
+    offsets = np.asarray(timestamps, dtype=np.int64) - base_ms
+    ticks = np.rint(np.asarray(price, dtype=np.float64) / tick_size)
+    int32 = np.iinfo(np.int32)
+    if len(offsets) and (offsets.min() < int32.min or offsets.max() > int32.max):
+        raise ValueError("Timestamp offsets do not fit in int32.")
+    if len(ticks) and (ticks.min() < int32.min or ticks.max() > int32.max):
+        raise ValueError("Price ticks do not fit in int32.")
+
+    side = np.asarray(side)
+    if side.dtype.kind in 'OUS':
+        side = np.where(side == 'a', ASK, np.where(side == 'b', BID, -1))
+    return {
+        'timestamp': offsets.astype(np.int32),
+        'price': ticks.astype(np.int32),
+        'qty': np.asarray(qty, dtype=np.float32),
+        'side': side.astype(np.int8),
+        'base_ms': int(base_ms),
+        'tick_size': tick_size,
+    }
+
+class DepthCache:
+    """
+    Columnar on-disk cache for parsed S_DEPTH archives.
+
+    Each (symbol, date, data_type) is stored as one directory with a sub-directory
+    per UTC hour, holding one raw binary file per column. Columns are read back
+    with np.memmap, so reopening a cached day costs almost nothing.
+
+    A day written with a tick_size uses the compact layout of
+    compact_depth_arrays instead (TICK_COLUMNS, timestamps as offsets from the
+    start of the partition's hour).
+
+    Like DownloadCache, the size and last access time of every day are tracked
+    in index.json, and the least recently used days are deleted once the cache
+    grows beyond max_bytes (None keeps everything).
+    """
+
+    COLUMNS = {
+        'timestamp': np.dtype('int64'),  # ミリ秒
+        'price': np.dtype('float32'),
+        'qty': np.dtype('float32'),
+        'side': np.dtype('int8'),
+    }
+    TICK_COLUMNS = {
+        'timestamp': np.dtype('int32'),  # 時間の開始からのミリ秒
+        'price': np.dtype('int32'),  # ティック数
+        'qty': np.dtype('float32'),
+        'side': np.dtype('int8'),
+    }
+
+    def __init__(self, directory="depth_cache", max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, 'index.json')
+        self._lock = threading.Lock()
+
+    def _key_dir(self, symbol, date, data_type):
+        return os.path.join(self.directory, symbol, data_type, str(pd.Timestamp(date).date()))
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def _save_index(self, index):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _touch(self, key_dir, evict=False):
+        # 最後に使われた時刻を記録（索引にない日はサイズを数えて追加）
+        key = os.path.relpath(key_dir, self.directory)
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(key)
+            if entry is None or evict:
+                size = sum(os.path.getsize(os.path.join(root, name))
+                           for root, _, files in os.walk(key_dir) for name in files)
+                entry = index[key] = {'size': size}
+            entry['last_access'] = time.time()
+            if evict:
+                self._evict(index, keep=key)
+            self._save_index(index)
+
+    def total_bytes(self):
+        return sum(entry['size'] for entry in self._load_index().values())
+
+    def _evict(self, index, keep=None):
+        # 容量を超えた分を、最後に使われた時刻が古い順に削除
+        if self.max_bytes is None:
+            return
+        total = sum(entry['size'] for entry in index.values())
+        for key, entry in sorted(index.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+            total -= entry['size']
+            del index[key]
+            logging.info(f"Evicted {key} from depth cache")
+
+    def _load_meta(self, key_dir):
+        with open(os.path.join(key_dir, 'meta.json'), 'r') as f:
+            return json.load(f)
+
+    def exists(self, symbol, date, data_type):
+        return os.path.exists(os.path.join(self._key_dir(symbol, date, data_type), 'meta.json'))
+
+    def write(self, symbol, date, data_type, chunks, tick_size=None):
+        """
+        Persist DataFrame chunks (as produced by calculate_depth.iter_depth_chunks).
+
+        Rows are appended to per-hour column files as they arrive, so memory use
+        is bounded by the chunk size.
+
+        :param tick_size: If given, store the rows in the compact integer-tick layout
+
+        :return: Total number of rows written
+        """
+        key_dir = self._key_dir(symbol, date, data_type)
+        tmp_dir = key_dir + '.tmp'
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+
+        partitions = {}
+        for chunk in chunks:
+            timestamps = chunk['timestamp'].to_numpy(dtype='int64')
+            columns = {
+                'timestamp': timestamps,
+                'price': chunk['price'].to_numpy(dtype='float32'),
+                'qty': chunk['qty'].to_numpy(dtype='float32'),
+                'side': chunk['side'].map(SIDE_CODES).fillna(-1).to_numpy(dtype='int8'),
+            }
+            # ティックへの変換は元の精度の価格から行う
+            raw_price = chunk['price'].to_numpy() if tick_size is not None else None
+            hours = timestamps // HOUR_MS
+            order = np.argsort(hours, kind='stable')
+            hours = hours[order]
+            unique_hours, first_rows = np.unique(hours, return_index=True)
+            bounds = list(first_rows) + [len(hours)]
+            for hour, lo, hi in zip(unique_hours, bounds[:-1], bounds[1:]):
+                name = pd.Timestamp(int(hour) * HOUR_MS, unit='ms').strftime('%Y-%m-%dT%H')
+                part_dir = os.path.join(tmp_dir, name)
+                os.makedirs(part_dir, exist_ok=True)
+                rows = order[lo:hi]
+                part = {column: values[rows] for column, values in columns.items()}
+                if tick_size is not None:
+                    part = compact_depth_arrays(part['timestamp'], raw_price[rows], part['qty'],
+                                                part['side'], tick_size, int(hour) * HOUR_MS)
+                for column in self.COLUMNS:
+                    with open(os.path.join(part_dir, f"{column}.bin"), 'ab') as f:
+                        part[column].tofile(f)
+                partitions[name] = partitions.get(name, 0) + int(hi - lo)
+
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump({
+                'columns': {column: dtype.str
+                            for column, dtype in (self.COLUMNS if tick_size is None else self.TICK_COLUMNS).items()},
+                'tick_size': tick_size,
+                'partitions': partitions,
+                'rows': sum(partitions.values()),
+            }, f)
+
+        if os.path.exists(key_dir):
+            shutil.rmtree(key_dir)
+        os.replace(tmp_dir, key_dir)
+        self._touch(key_dir, evict=True)
+        logging.info(f"Cached {sum(partitions.values())} rows to {key_dir}")
+        return sum(partitions.values())
+
+    def partition_names(self, symbol, date, data_type, start_time=None, end_time=None):
+        """
+        List the hourly partitions overlapping [start_time, end_time) in time order.
+        """
+        key_dir = self._key_dir(symbol, date, data_type)
+        meta = self._load_meta(key_dir)
+        self._touch(key_dir)
+        start_ms = None if start_time is None else int(pd.Timestamp(start_time).timestamp() * 1000)
+        end_ms = None if end_time is None else int(pd.Timestamp(end_time).timestamp() * 1000)
+
+        names = []
+        for name in sorted(meta['partitions']):
+            hour_ms = int(pd.Timestamp(name, tz='UTC').timestamp() * 1000)
+            if start_ms is not None and hour_ms + HOUR_MS <= start_ms:
+                continue
+            if end_ms is not None and hour_ms >= end_ms:
+                continue
+            names.append(name)
+        return names
+
+    def partitions(self, symbol, date, data_type, start_time=None, end_time=None, names=None):
+        """
+        Memory-map the hourly partitions overlapping [start_time, end_time).
+
+        :param names: Explicit partition names to load instead of a time range
+        :return: Generator of dicts mapping column name to a read-only np.memmap
+            (tick-encoded days also carry 'base_ms' and 'tick_size', as compact_depth_arrays)
+        """
+        key_dir = self._key_dir(symbol, date, data_type)
+        meta = self._load_meta(key_dir)
+        if names is None:
+            names = self.partition_names(symbol, date, data_type, start_time, end_time)
+
+        for name in names:
+            rows = meta['partitions'][name]
+            part = {
+                column: np.memmap(
+                    os.path.join(key_dir, name, f"{column}.bin"),
+                    dtype=np.dtype(dtype),
+                    mode='r',
+                    shape=(rows,)
+                )
+                for column, dtype in meta['columns'].items()
+            }
+            if meta.get('tick_size') is not None:
+                part['base_ms'] = int(pd.Timestamp(str(name), tz='UTC').timestamp() * 1000)
+                part['tick_size'] = meta['tick_size']
+            yield part
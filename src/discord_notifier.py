@@ -7,14 +7,14 @@ from datetime import datetime, timedelta
 import pytz
 import sys
 
-# 親ディレクトリをPythonパスに追加
+# srcディレクトリをPythonパスに追加
 current_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(current_dir)
-sys.path.append(parent_dir)
+sys.path.insert(0, current_dir)
 
-from src.binance_top10 import get_binance_volume_top10
-from src.bybit_top10 import get_bybit_volume_top10
-from io import StringIO
+from binance_top10 import format_binance_ranking
+from bybit_top10 import format_bybit_ranking
+from ranking_collector import collect_rankings
+from volume_ranking import rankings_to_records
 
 # .envファイルを読み込む
 load_dotenv()
@@ -28,14 +28,6 @@ class DiscordNotifier:
         self.client = discord.Client(intents=intents)
         self.cache_file = "volume_data_cache.json"
 
-    def capture_output(self, func, *args, **kwargs):
-        old_stdout = sys.stdout
-        result = StringIO()
-        sys.stdout = result
-        func(*args, **kwargs)
-        sys.stdout = old_stdout
-        return result.getvalue()
-
     async def send_message(self, message):
         channel = self.client.get_channel(self.channel_id)
         if channel:
@@ -45,30 +37,26 @@ class DiscordNotifier:
 
     async def update_data(self):
         try:
-            print("Fetching Binance spot data...")
-            binance_spot = self.capture_output(get_binance_volume_top10, 'spot')
-            print("Fetching Binance futures data...")
-            binance_futures = self.capture_output(get_binance_volume_top10, 'futures')
-            print("Fetching Bybit spot data...")
-            bybit_spot = self.capture_output(get_bybit_volume_top10, 'spot')
-            print("Fetching Bybit linear data...")
-            bybit_futures = self.capture_output(get_bybit_volume_top10, 'linear')
+            print("Fetching Binance and Bybit data...")
+            rankings = await collect_rankings()
+            binance_spot, binance_futures = rankings['binance_spot'], rankings['binance_futures']
+            bybit_spot, bybit_futures = rankings['bybit_spot'], rankings['bybit_perp']
 
             data = {
-                'binance_spot': binance_spot,
-                'binance_futures': binance_futures,
-                'bybit_spot': bybit_spot,
-                'bybit_futures': bybit_futures,
+                'binance_spot': rankings_to_records(binance_spot),
+                'binance_futures': rankings_to_records(binance_futures),
+                'bybit_spot': rankings_to_records(bybit_spot),
+                'bybit_futures': rankings_to_records(bybit_futures),
                 'last_updated': datetime.now(pytz.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
             }
             
             self.save_data_to_cache(data)
 
             message = "取引量トップ10更新\n\n"
-            message += f"Binance スポット取引:\n```\n{binance_spot}```\n"
-            message += f"Binance 先物取引:\n```\n{binance_futures}```\n"
-            message += f"Bybit スポット取引:\n```\n{bybit_spot}```\n"
-            message += f"Bybit 永続先物取引:\n```\n{bybit_futures}```\n"
+            message += f"Binance スポット取引:\n```\n{format_binance_ranking(binance_spot, 'spot')}\n```\n"
+            message += f"Binance 先物取引:\n```\n{format_binance_ranking(binance_futures, 'futures')}\n```\n"
+            message += f"Bybit スポット取引:\n```\n{format_bybit_ranking(bybit_spot, 'spot')}\n```\n"
+            message += f"Bybit 永続先物取引:\n```\n{format_bybit_ranking(bybit_futures, 'perp')}\n```\n"
 
             await self.send_message(message)
             print("Discord message sent successfully!")
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+import pandas as pd
+
+class DownloadCache:
+    """
+    Disk cache for downloaded histDataLink archives with LRU eviction.
+
+    Archives are stored under a name derived from a hash of
+    (symbol, dataType, startTime, endTime), so the same request is served from
+    disk instead of the network. Access times are tracked in index.json, and
+    the least recently used archives are deleted once the cache grows beyond
+    max_bytes.
+    """
+
+    def __init__(self, directory="download_cache", max_bytes=20 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, 'index.json')
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key_id(symbol, data_type, start_time, end_time):
+        start_ms = int(pd.Timestamp(start_time).timestamp() * 1000)
+        end_ms = int(pd.Timestamp(end_time).timestamp() * 1000)
+        return hashlib.sha256(f"{symbol}|{data_type}|{start_ms}|{end_ms}".encode('utf-8')).hexdigest()
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def _save_index(self, index):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _entry_path(self, entry):
+        return os.path.join(self.directory, entry['file'])
+
+    def get(self, symbol, data_type, start_time, end_time):
+        """
+        Return the cached archive path, or None if it is missing or invalid.
+        """
+        key = self.key_id(symbol, data_type, start_time, end_time)
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(key)
+            if entry is None:
+                return None
+            path = self._entry_path(entry)
+            if not os.path.exists(path) or os.path.getsize(path) != entry['size']:
+                # 壊れたエントリは削除
+                if os.path.exists(path):
+                    os.remove(path)
+                del index[key]
+                self._save_index(index)
+                return None
+            entry['last_access'] = time.time()
+            self._save_index(index)
+            return path
+
+    def put(self, symbol, data_type, start_time, end_time, file_path):
+        """
+        Move a downloaded archive into the cache and evict old entries if needed.
+
+        :return: Path of the archive inside the cache
+        """
+        key = self.key_id(symbol, data_type, start_time, end_time)
+        file_name = key + ''.join(os.path.basename(file_path).partition('.')[1:])
+        with self._lock:
+            index = self._load_index()
+            cached_path = os.path.join(self.directory, file_name)
+            os.replace(file_path, cached_path)
+            index[key] = {
+                'file': file_name,
+                'symbol': symbol,
+                'data_type': data_type,
+                'start_time': str(pd.Timestamp(start_time)),
+                'end_time': str(pd.Timestamp(end_time)),
+                'size': os.path.getsize(cached_path),
+                'last_access': time.time(),
+            }
+            self._evict(index, keep=key)
+            self._save_index(index)
+            return cached_path
+
+    def fetch(self, symbol, data_type, start_time, end_time, get_url_func, downloader):
+        """
+        Return the cached archive, downloading it only on a cache miss.
+
+        :param get_url_func: Called without arguments to obtain the download URL
+        :param downloader: Called as downloader(url, directory) and returns the file path
+        """
+        path = self.get(symbol, data_type, start_time, end_time)
+        if path is not None:
+            return path
+        file_path = downloader(get_url_func(), os.path.join(self.directory, 'incoming'))
+        return self.put(symbol, data_type, start_time, end_time, file_path)
+
+    def total_bytes(self):
+        return sum(entry['size'] for entry in self._load_index().values())
+
+    def _evict(self, index, keep=None):
+        # 容量を超えた分を、最後に使われた時刻が古い順に削除
+        total = sum(entry['size'] for entry in index.values())
+        for key, entry in sorted(index.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            path = self._entry_path(entry)
+            if os.path.exists(path):
+                os.remove(path)
+            total -= entry['size']
+            del index[key]
+            logging.info(f"Evicted {entry['symbol']} {entry['data_type']} {entry['start_time']} from download cache")
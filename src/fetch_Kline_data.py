@@ -2,11 +2,16 @@ from binance.client import Client
 import pandas as pd
 from datetime import datetime, timedelta
 import logging
-import time
+
+from kline_store import to_milliseconds
+from kline_decoder import klines_to_frame
+
+DEFAULT_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def get_binance_data(client: Client, symbol: str, interval: str, start_time: datetime, end_time: datetime) -> pd.DataFrame:
+def get_binance_data(client: Client, symbol: str, interval: str, start_time: datetime, end_time: datetime, store=None,
+                     columns=DEFAULT_COLUMNS) -> pd.DataFrame:
     """
     Fetch historical klines data from Binance API.
     
@@ -15,15 +20,19 @@ def get_binance_data(client: Client, symbol: str, interval: str, start_time: dat
     :param interval: Kline interval (e.g., Client.KLINE_INTERVAL_1HOUR)
     :param start_time: Start time for data fetch
     :param end_time: End time for data fetch
+    :param store: Optional KlineStore; stored candles are read locally and only missing ranges are requested
+    :param columns: Kline fields to decode (see kline_decoder.KLINE_FIELDS)
     :return: DataFrame containing the fetched data
     """
     try:
-        klines = client.get_historical_klines(symbol, interval, start_time.strftime('%d %b %Y %H:%M:%S'), end_time.strftime('%d %b %Y %H:%M:%S'))
-        data = pd.DataFrame(klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'])
-        data['timestamp'] = pd.to_datetime(data['timestamp'], unit='ms')
-        data.set_index('timestamp', inplace=True)
-        data['close'] = data['close'].astype(float)
-        return data
+        if store is not None:
+            klines = store.get_or_fetch(
+                symbol, interval, to_milliseconds(start_time), to_milliseconds(end_time),
+                lambda range_start, range_end: client.get_historical_klines(symbol, interval, range_start, range_end)
+            )
+        else:
+            klines = client.get_historical_klines(symbol, interval, start_time.strftime('%d %b %Y %H:%M:%S'), end_time.strftime('%d %b %Y %H:%M:%S'))
+        return klines_to_frame(klines, columns=columns)
     except Exception as e:
         logging.error(f"Error fetching data from Binance API: {e}")
         return pd.DataFrame()
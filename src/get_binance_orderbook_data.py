@@ -1,3 +1,4 @@
+import io
 import time
 import hmac
 import hashlib
@@ -5,8 +6,14 @@ import requests
 from urllib.parse import urlencode
 from datetime import datetime
 import os
+import re
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
 from binance.client import Client
-import pandas as pd
+
+from kline_fetcher import fetch_klines_concurrent
+from kline_decoder import klines_to_close_series
 
 def get_signed_params(secret_key, params):
     query_string = urlencode(params)
@@ -48,6 +55,191 @@ def download_file(url, directory="downloads"):
                 f.write(chunk)
     return file_path
 
+def _probe_download(session, url):
+    # HEADは署名付きURLで拒否されることがあるため、1バイトだけGETしてサイズを調べる
+    with session.get(url, headers={'Range': 'bytes=0-0'}, stream=True) as r:
+        r.raise_for_status()
+        etag = r.headers.get('ETag', '').strip('"')
+        match = re.match(r'bytes 0-0/(\d+)', r.headers.get('Content-Range', ''))
+        if r.status_code == 206 and match:
+            return int(match.group(1)), True, etag
+        size = r.headers.get('Content-Length')
+        return (int(size) if size is not None else None), False, etag
+
+def _download_segment(session, url, part_path, start, end, progress, chunk_size):
+    # 途中まで保存されている場合は続きからダウンロード
+    done = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    progress(done)
+    if start + done > end:
+        return
+    headers = {'Range': f"bytes={start + done}-{end}"}
+    with session.get(url, headers=headers, stream=True) as r:
+        r.raise_for_status()
+        if r.status_code != 206:
+            raise IOError(f"Server ignored range request for {part_path}")
+        with open(part_path, 'ab') as f:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                progress(len(chunk))
+    if os.path.getsize(part_path) != end - start + 1:
+        raise IOError(f"Incomplete segment: {part_path}")
+
+def _file_digest(file_path, algorithm):
+    digest = hashlib.new(algorithm)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _verify_download(file_path, total, etag, sha256):
+    # サイズ・ETag(MD5)・SHA-256を確認し、一致しなければファイルを削除して例外を送出
+    if total is not None and os.path.getsize(file_path) != total:
+        os.remove(file_path)
+        raise IOError(f"Size mismatch for {file_path}: expected {total} bytes")
+    if re.fullmatch(r'[0-9a-f]{32}', etag) and _file_digest(file_path, 'md5') != etag:
+        os.remove(file_path)
+        raise IOError(f"ETag checksum mismatch for {file_path}")
+    if sha256 is not None and _file_digest(file_path, 'sha256') != sha256:
+        os.remove(file_path)
+        raise IOError(f"SHA-256 checksum mismatch for {file_path}")
+
+def download_file_ranged(url, directory="downloads", segments=4, session=None, progress_callback=None,
+                         sha256=None, chunk_size=1024 * 1024):
+    """
+    Download a large archive in parallel byte ranges, resuming partial downloads.
+
+    Each segment is written to '<file>.part<i>'; if the download is interrupted,
+    calling this again only fetches the missing bytes of every segment. The
+    assembled file is checked against the size reported by the server, the
+    server's MD5 ETag when it has one, and sha256 if given; a complete file
+    already in directory is checked the same way and downloaded again if it
+    does not match.
+
+    :param url: Download URL (e.g. from get_historical_data_link)
+    :param directory: Directory to save the file into
+    :param segments: Number of parallel range requests
+    :param session: Optional requests.Session (a pooled one is created otherwise)
+    :param progress_callback: Called as progress_callback(bytes_done, total_bytes)
+        from the calling thread, so it may update Streamlit elements
+    :param sha256: Expected SHA-256 hex digest of the file
+    :return: Path of the downloaded file
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    local_filename = url.split('/')[-1].split('?')[0]
+    file_path = os.path.join(directory, local_filename)
+
+    if session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=segments)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+    total, supports_range, etag = _probe_download(session, url)
+    if os.path.exists(file_path) and total is not None and os.path.getsize(file_path) == total:
+        # 既存のファイルも同じ検証を行い、壊れていれば取り直す
+        try:
+            _verify_download(file_path, total, etag, sha256)
+        except IOError as e:
+            print(f"Downloading again: {e}")
+        else:
+            if progress_callback:
+                progress_callback(total, total)
+            return file_path
+
+    if not supports_range or total is None or total == 0:
+        # Rangeに対応していないサーバーは通常のダウンロードにフォールバック
+        file_path = download_file(url, directory)
+    else:
+        bounds = [total * i // segments for i in range(segments + 1)]
+        ranges = [(start, end - 1) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+        part_paths = [f"{file_path}.part{i}" for i in range(len(ranges))]
+
+        lock = threading.Lock()
+        downloaded = [0]
+
+        def progress(n):
+            with lock:
+                downloaded[0] += n
+
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [
+                executor.submit(_download_segment, session, url, part_path, start, end, progress, chunk_size)
+                for part_path, (start, end) in zip(part_paths, ranges)
+            ]
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_EXCEPTION)
+                if progress_callback:
+                    progress_callback(downloaded[0], total)
+                for future in done:
+                    future.result()
+
+        with open(file_path, 'wb') as f:
+            for part_path in part_paths:
+                with open(part_path, 'rb') as part:
+                    for block in iter(lambda: part.read(chunk_size), b''):
+                        f.write(block)
+        for part_path in part_paths:
+            os.remove(part_path)
+
+    _verify_download(file_path, total, etag, sha256)
+    return file_path
+
+class _ProgressReader(io.RawIOBase):
+    # 読み込んだバイト数を通知する（通知はinterval秒ごとに間引き、最後に必ず1回通知）
+    def __init__(self, raw, total, callback, interval=0.5):
+        self._raw = raw
+        self._total = total
+        self._callback = callback
+        self._interval = interval
+        self._last_report = 0.0
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._raw.read(len(buffer))
+        buffer[:len(data)] = data
+        self.bytes_read += len(data)
+        now = time.monotonic()
+        if not data or self.bytes_read == self._total or now - self._last_report >= self._interval:
+            self.report()
+        return len(data)
+
+    def report(self):
+        self._last_report = time.monotonic()
+        self._callback(self.bytes_read, self._total)
+
+@contextmanager
+def open_download_stream(url, session=None, progress_callback=None):
+    """
+    Open the archive at url as a raw binary stream without saving it to disk.
+
+    Pass the stream to calculate_depth.process_large_file to decompress and
+    aggregate the archive while it downloads.
+
+    :param url: Download URL (e.g. from get_historical_data_link)
+    :param session: Optional requests.Session to reuse connections
+    :param progress_callback: Optional callable(bytes_read, total_bytes) called as the
+        stream is consumed (total_bytes is None without a Content-Length)
+    :return: Context manager yielding a file-like object
+    """
+    http = session or requests
+    with http.get(url, stream=True) as r:
+        r.raise_for_status()
+        # gzipの展開はtarfile側で行う
+        r.raw.decode_content = False
+        if progress_callback is None:
+            yield r.raw
+        else:
+            length = r.headers.get('Content-Length')
+            reader = _ProgressReader(r.raw, int(length) if length else None, progress_callback)
+            yield reader
+            # 間引かれた分も含めて最終的な読み込み量を通知する
+            reader.report()
+
 def get_close_prices(client, symbol, timestamps):
     klines = client.get_historical_klines(
         symbol,
@@ -55,9 +247,19 @@ def get_close_prices(client, symbol, timestamps):
         start_str=timestamps.min().strftime("%d %b %Y %H:%M:%S"),
         end_str=timestamps.max().strftime("%d %b %Y %H:%M:%S")
     )
-    price_dict = {}
-    for kline in klines:
-        timestamp = pd.to_datetime(kline[0], unit='ms', utc=True)
-        close_price = float(kline[4])
-        price_dict[timestamp] = close_price
-    return price_dict
+    return klines_to_close_series(klines)
+
+def get_close_prices_concurrent(symbol, timestamps, **kwargs):
+    """
+    Same result as get_close_prices, but fetched with concurrent page requests
+    (see kline_fetcher.fetch_klines_concurrent). No API client is needed, which
+    suits worker processes of a multi-day backfill.
+    """
+    klines = fetch_klines_concurrent(
+        symbol,
+        Client.KLINE_INTERVAL_5MINUTE,
+        int(timestamps.min().timestamp() * 1000),
+        int(timestamps.max().timestamp() * 1000),
+        **kwargs
+    )
+    return klines_to_close_series(klines)
@@ -0,0 +1,104 @@
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+N_CELLS = 7 * 24
+
+def _block_indices(rng, n, size, block_length):
+    # 円環状のブロックブートストラップ: ランダムな開始位置から連続したブロックをつなげる
+    n_blocks = -(-n // block_length)
+    starts = rng.integers(0, n, size=(size, n_blocks))
+    indices = (starts[:, :, None] + np.arange(block_length)) % n
+    return indices.reshape(size, -1)[:, :n]
+
+def _cell_means(values, cells):
+    # 各リサンプル（行）ごとのセル平均を1回のbincountで計算
+    size, n = values.shape
+    keys = (np.arange(size)[:, None] * N_CELLS + cells).reshape(-1)
+    sums = np.bincount(keys, weights=values.reshape(-1), minlength=size * N_CELLS).reshape(size, N_CELLS)
+    counts = np.bincount(keys, minlength=size * N_CELLS).reshape(size, N_CELLS)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+def _bootstrap_batch(returns, cells, size, block_length, seed):
+    """
+    One batch of resamples.
+
+    :return: (null deviations of cell means from the overall mean with cell labels
+        kept in place, cell means with (return, cell) pairs resampled together),
+        both shaped (size, 168)
+    """
+    rng = np.random.default_rng(seed)
+    indices = _block_indices(rng, len(returns), size, block_length)
+    resampled = returns[indices]
+    null = _cell_means(resampled, np.broadcast_to(cells, indices.shape)) - resampled.mean(axis=1, keepdims=True)
+    paired = _cell_means(resampled, cells[indices])
+    return null, paired
+
+def bootstrap_heatmap(data: pd.DataFrame, n_resamples=2000, block_length=24, confidence=0.95, batch_size=250,
+                      workers=1, seed=None) -> dict:
+    """
+    Block-bootstrap significance of the weekday/hour mean returns from process_data.
+
+    Returns are resampled in circular blocks of `block_length` candles to keep
+    their autocorrelation. For p-values the cell labels stay in place, so the
+    resamples follow the null hypothesis of no weekday/hour effect; a cell's
+    p-value is the share of resamples whose deviation from the overall mean is
+    at least as large as observed (two-sided). Confidence intervals resample
+    (return, cell) pairs together and take percentiles of the cell means.
+    Resamples are drawn in vectorized batches, spread over a process pool when
+    workers > 1; results depend only on `seed`, not on the number of workers.
+
+    :param data: Raw DataFrame containing price data (as for process_data)
+    :param n_resamples: Number of bootstrap resamples
+    :param block_length: Block length in candles (24 = one day of hourly candles)
+    :param confidence: Confidence level of the intervals
+    :param batch_size: Resamples per batch
+    :param workers: Number of worker processes
+    :param seed: Random seed
+    :return: Dict of 7x24 DataFrames (weekday x hour): 'mean', 'p_value', 'ci_lower', 'ci_upper' (in %)
+    """
+    returns = data['close'].pct_change().to_numpy(np.float64)
+    valid = ~np.isnan(returns)
+    cells = (data.index.weekday * 24 + data.index.hour).to_numpy()[valid]
+    returns = returns[valid]
+
+    index = pd.Index(range(7), name='weekday')
+    columns = pd.Index(range(24), name='hour')
+    if len(returns) == 0:
+        empty_frame = pd.DataFrame(np.nan, index=index, columns=columns)
+        return {name: empty_frame.copy() for name in ('mean', 'p_value', 'ci_lower', 'ci_upper')}
+
+    observed = _cell_means(returns[None, :], cells[None, :])[0]
+    observed_deviation = np.abs(observed - returns.mean())
+
+    sizes = [batch_size] * (n_resamples // batch_size) + ([n_resamples % batch_size] if n_resamples % batch_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(returns, cells, size, block_length, s) for size, s in zip(sizes, seeds)]
+    if workers > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batches = list(executor.map(_bootstrap_batch, *zip(*args)))
+    else:
+        batches = [_bootstrap_batch(*a) for a in args]
+    null = np.concatenate([b[0] for b in batches])
+    paired = np.concatenate([b[1] for b in batches])
+
+    p_value = ((np.abs(null) >= observed_deviation).sum(axis=0) + 1) / (len(null) + 1)
+    alpha = (1 - confidence) / 2
+    with warnings.catch_warnings():
+        # データのないセルはすべてNaNになる
+        warnings.simplefilter('ignore', RuntimeWarning)
+        lower, upper = np.nanquantile(paired, [alpha, 1 - alpha], axis=0)
+
+    empty = np.isnan(observed)
+
+    def as_frame(values):
+        return pd.DataFrame(np.where(empty, np.nan, values).reshape(7, 24), index=index, columns=columns)
+
+    return {
+        'mean': as_frame(observed * 100),
+        'p_value': as_frame(p_value),
+        'ci_lower': as_frame(lower * 100),
+        'ci_upper': as_frame(upper * 100),
+    }
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+# ローソク足の各フィールドの位置と型
+KLINE_FIELDS = {
+    'timestamp': (0, np.int64),
+    'open': (1, np.float64),
+    'high': (2, np.float64),
+    'low': (3, np.float64),
+    'close': (4, np.float64),
+    'volume': (5, np.float64),
+    'close_time': (6, np.int64),
+    'quote_asset_volume': (7, np.float64),
+    'number_of_trades': (8, np.int64),
+    'taker_buy_base_asset_volume': (9, np.float64),
+    'taker_buy_quote_asset_volume': (10, np.float64),
+}
+
+def decode_klines(klines, columns=('timestamp', 'close')):
+    """
+    Decode raw klines into typed NumPy columns.
+
+    Each requested field is read straight into an int64/float64 array, without
+    building an intermediate DataFrame of strings.
+
+    :param klines: List of raw klines as returned by the Binance API
+    :param columns: Fields to decode (keys of KLINE_FIELDS)
+    :return: Dict mapping field name to a NumPy array
+    """
+    n = len(klines)
+    arrays = {}
+    for column in columns:
+        index, dtype = KLINE_FIELDS[column]
+        arrays[column] = np.fromiter((kline[index] for kline in klines), dtype=dtype, count=n)
+    return arrays
+
+def klines_to_frame(klines, columns=('timestamp', 'close'), utc=False, set_index=True):
+    """
+    Decode raw klines into a DataFrame with a datetime 'timestamp'.
+
+    :param klines: List of raw klines
+    :param columns: Fields to include besides 'timestamp'
+    :param utc: Whether timestamps are tz-aware UTC
+    :param set_index: Use 'timestamp' as the index instead of a column
+    :return: DataFrame
+    """
+    columns = ['timestamp'] + [c for c in columns if c != 'timestamp']
+    arrays = decode_klines(klines, columns)
+    timestamps = pd.to_datetime(arrays.pop('timestamp'), unit='ms', utc=utc)
+    frame = pd.DataFrame(arrays, index=pd.Index(timestamps, name='timestamp'))
+    return frame if set_index else frame.reset_index()
+
+def klines_to_close_series(klines):
+    """
+    Close prices indexed by UTC open time (usable wherever a {time: price} dict is).
+    """
+    frame = klines_to_frame(klines, columns=('close',), utc=True)
+    return frame['close']
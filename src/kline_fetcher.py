@@ -0,0 +1,119 @@
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from binance.helpers import interval_to_milliseconds
+
+BASE_URL = 'https://api.binance.com'
+KLINES_ENDPOINT = '/api/v3/klines'
+KLINE_LIMIT = 1000
+# /api/v3/klines のリクエストウェイト
+KLINE_REQUEST_WEIGHT = 2
+
+class WeightThrottle:
+    """
+    Keep requests within Binance's per-minute request weight budget.
+
+    Weight is counted locally per calendar minute (as Binance does) and
+    corrected with the X-MBX-USED-WEIGHT-1M header of every response, so
+    other users of the same IP are taken into account.
+    """
+
+    def __init__(self, weight_limit=1200, clock=time.time, sleep=time.sleep):
+        self.weight_limit = weight_limit
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._minute = None
+        self._used = 0
+
+    def _roll(self, now):
+        minute = int(now // 60)
+        if minute != self._minute:
+            self._minute = minute
+            self._used = 0
+
+    def acquire(self, weight):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._roll(now)
+                if self._used + weight <= self.weight_limit:
+                    self._used += weight
+                    return
+                wait = (self._minute + 1) * 60 - now
+            logging.info(f"Request weight budget exhausted, waiting {wait:.1f}s")
+            self._sleep(wait)
+
+    def update(self, used_weight):
+        with self._lock:
+            self._roll(self._clock())
+            self._used = max(self._used, used_weight)
+
+def kline_windows(start_ms, end_ms, interval_ms, limit=KLINE_LIMIT):
+    """
+    Split [start_ms, end_ms] into windows of at most `limit` candles each.
+    """
+    span = interval_ms * limit
+    return [(start, min(start + span - 1, end_ms)) for start in range(start_ms, end_ms + 1, span)]
+
+def _fetch_window(session, url, params, throttle, max_retries):
+    for attempt in range(max_retries + 1):
+        throttle.acquire(KLINE_REQUEST_WEIGHT)
+        response = session.get(url, params=params, timeout=30)
+        used = response.headers.get('X-MBX-USED-WEIGHT-1M')
+        if used is not None:
+            throttle.update(int(used))
+        if response.status_code in (418, 429) and attempt < max_retries:
+            # レート制限時はRetry-Afterの秒数だけ待って再試行
+            retry_after = float(response.headers.get('Retry-After', 1))
+            logging.warning(f"Rate limited ({response.status_code}), retrying in {retry_after}s")
+            time.sleep(retry_after)
+            continue
+        response.raise_for_status()
+        return response.json()
+
+def fetch_klines_concurrent(symbol, interval, start_ms, end_ms, base_url=BASE_URL, max_workers=8,
+                            session=None, throttle=None, limit=KLINE_LIMIT, max_retries=3):
+    """
+    Fetch klines for a long range with concurrent page requests.
+
+    The range is split into page-sized windows that are fetched by a bounded
+    thread pool over one pooled session, within the request-weight budget of
+    `throttle`. Pages are reassembled in order with duplicates removed.
+
+    :param symbol: Trading symbol (e.g. 'BTCUSDT')
+    :param interval: Kline interval (e.g. Client.KLINE_INTERVAL_5MINUTE)
+    :param start_ms: Range start (epoch milliseconds, inclusive)
+    :param end_ms: Range end (epoch milliseconds, inclusive)
+    :param base_url: REST base URL
+    :param max_workers: Maximum number of concurrent requests
+    :param session: Optional requests.Session
+    :param throttle: Optional WeightThrottle shared between calls
+    :return: List of raw klines ordered by open time
+    """
+    windows = kline_windows(start_ms, end_ms, interval_to_milliseconds(interval), limit)
+    if not windows:
+        return []
+    if session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+    if throttle is None:
+        throttle = WeightThrottle()
+
+    url = f"{base_url}{KLINES_ENDPOINT}"
+    params = [
+        {'symbol': symbol, 'interval': interval, 'startTime': start, 'endTime': end, 'limit': limit}
+        for start, end in windows
+    ]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(params))) as executor:
+        pages = list(executor.map(lambda p: _fetch_window(session, url, p, throttle, max_retries), params))
+
+    klines = {}
+    for page in pages:
+        for kline in page:
+            klines[kline[0]] = kline
+    return [klines[open_time] for open_time in sorted(klines)]
@@ -0,0 +1,202 @@
+import time
+import threading
+import numpy as np
+import pandas as pd
+from binance.helpers import interval_to_milliseconds
+
+from kline_decoder import decode_klines
+from kline_fetcher import fetch_klines_concurrent
+from kline_store import KlineStore, to_milliseconds
+
+BASE_INTERVAL = '1m'
+BASE_INTERVAL_MS = 60 * 1000
+OHLCV_COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+MEMO_SIZE = 64
+# これより長い期間の終値行列は1分足を経由せず、目的の時間足を直接取得する
+DIRECT_FETCH_MS = 7 * 24 * 60 * 60 * 1000
+
+def resample_ohlcv(base, interval_ms):
+    """
+    Aggregate sorted 1m OHLCV arrays into coarser candles with reduceat.
+
+    Buckets are aligned to multiples of interval_ms since the epoch, which
+    matches Binance for intervals up to 1d.
+
+    :param base: Dict of 'timestamp' (ms), 'open', 'high', 'low', 'close', 'volume' arrays
+    :param interval_ms: Target interval in milliseconds
+    :return: Dict of arrays with the same keys
+    """
+    if len(base['timestamp']) == 0:
+        return {column: base[column][:0] for column in OHLCV_COLUMNS}
+    buckets = base['timestamp'] // interval_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    return {
+        'timestamp': buckets[starts] * interval_ms,
+        'open': base['open'][starts],
+        'high': np.maximum.reduceat(base['high'], starts),
+        'low': np.minimum.reduceat(base['low'], starts),
+        'close': base['close'][ends],
+        'volume': np.add.reduceat(base['volume'], starts),
+    }
+
+class KlineResampler:
+    """
+    Serve klines of any interval from a single 1m base series per symbol.
+
+    The base series is kept in memory (and in an optional KlineStore), extended
+    only at the head or tail when a request falls outside it, and every coarser
+    interval is derived locally. Results are memoized per
+    (symbol, interval, range) until the base series changes.
+    """
+
+    def __init__(self, store=None, fetch_func=None, clock=time.time, interval_fetch_func=None):
+        """
+        :param store: Optional KlineStore persisting the 1m base series
+        :param fetch_func: Called as fetch_func(symbol, start_ms, end_ms) and returns raw
+            1m klines; defaults to kline_fetcher.fetch_klines_concurrent
+        :param clock: Current time in seconds (candles after the last closed minute are refetched)
+        :param interval_fetch_func: Called as interval_fetch_func(symbol, interval, start_ms, end_ms)
+            for long close matrices (see get_close_matrix); defaults to
+            kline_fetcher.fetch_klines_concurrent
+        """
+        self.store = store
+        self.clock = clock
+        self.fetch_func = fetch_func or (
+            lambda symbol, start_ms, end_ms: fetch_klines_concurrent(symbol, BASE_INTERVAL, start_ms, end_ms)
+        )
+        self.interval_fetch_func = interval_fetch_func or fetch_klines_concurrent
+        self._lock = threading.RLock()
+        self._base = {}
+        self._covered = {}
+        self._version = {}
+        self._memo = {}
+
+    def _fetch_base(self, symbol, start_ms, end_ms):
+        if self.store is not None:
+            klines = self.store.get_or_fetch(
+                symbol, BASE_INTERVAL, start_ms, end_ms,
+                lambda range_start, range_end: self.fetch_func(symbol, range_start, range_end)
+            )
+        else:
+            klines = self.fetch_func(symbol, start_ms, end_ms)
+        return decode_klines(klines, OHLCV_COLUMNS)
+
+    def _ensure_base(self, symbol, start_ms, end_ms):
+        # 取得済みとみなすのは確定した最後の1分足まで（形成中の足は次回取り直す）
+        closed_end = int(self.clock() * 1000) // BASE_INTERVAL_MS * BASE_INTERVAL_MS - 1
+        # メモリ上の1分足が要求範囲を覆っていない場合、先頭・末尾だけを追加取得
+        covered = self._covered.get(symbol)
+        if covered is None:
+            parts = [self._fetch_base(symbol, start_ms, end_ms)]
+            covered = (start_ms, min(end_ms, closed_end))
+        else:
+            parts = [self._base[symbol]]
+            if start_ms < covered[0]:
+                parts.insert(0, self._fetch_base(symbol, start_ms, covered[0] - 1))
+            if end_ms > covered[1]:
+                # 最後の足は形成中だった可能性があるため取り直す
+                last = self._base[symbol]['timestamp']
+                tail_start = int(last[-1]) if len(last) else covered[1] + 1
+                parts.append(self._fetch_base(symbol, min(tail_start, covered[1] + 1), end_ms))
+            if len(parts) == 1:
+                return
+            covered = (min(start_ms, covered[0]), max(min(end_ms, closed_end), covered[1]))
+
+        merged = {column: np.concatenate([part[column] for part in parts]) for column in OHLCV_COLUMNS}
+        # 同じ時刻の足は後から取得したものを優先
+        reversed_ts = merged['timestamp'][::-1]
+        _, last_index = np.unique(reversed_ts, return_index=True)
+        keep = len(reversed_ts) - 1 - last_index
+        self._base[symbol] = {column: values[keep] for column, values in merged.items()}
+        self._covered[symbol] = covered
+        self._version[symbol] = self._version.get(symbol, 0) + 1
+
+    def get_ohlcv(self, symbol, interval, start_time, end_time, utc=False):
+        """
+        OHLCV candles whose open time lies in [start_time, end_time].
+
+        :param symbol: Trading symbol (e.g. 'BTCUSDT')
+        :param interval: Kline interval up to '1d' (e.g. Client.KLINE_INTERVAL_5MINUTE)
+        :param utc: Whether the returned timestamps are tz-aware UTC
+        :return: DataFrame indexed by 'timestamp' with open, high, low, close, volume
+        """
+        start_ms, end_ms = to_milliseconds(start_time), to_milliseconds(end_time)
+        interval_ms = interval_to_milliseconds(interval)
+        with self._lock:
+            # 末尾の足を完全に含めるため、区間の終わりまで1分足を取得
+            base_end = end_ms // interval_ms * interval_ms + interval_ms - 1
+            self._ensure_base(symbol, start_ms, base_end)
+            version = self._version[symbol]
+            key = (symbol, interval, start_ms, end_ms)
+            cached = self._memo.get(key)
+            if cached is not None and cached[0] == version:
+                arrays = cached[1]
+            else:
+                base = self._base[symbol]
+                lo = np.searchsorted(base['timestamp'], start_ms, side='left')
+                hi = np.searchsorted(base['timestamp'], base_end, side='right')
+                arrays = {column: values[lo:hi] for column, values in base.items()}
+                if interval_ms != BASE_INTERVAL_MS:
+                    arrays = resample_ohlcv(arrays, interval_ms)
+                    # 開始時刻が区間の途中にある場合、欠けた先頭の足は除外
+                    in_range = (arrays['timestamp'] >= start_ms) & (arrays['timestamp'] <= end_ms)
+                    arrays = {column: values[in_range] for column, values in arrays.items()}
+                self._memo[key] = (version, arrays)
+                # 古い結果から削除
+                while len(self._memo) > MEMO_SIZE:
+                    self._memo.pop(next(iter(self._memo)))
+
+        values = dict(arrays)
+        timestamps = pd.to_datetime(values.pop('timestamp'), unit='ms', utc=utc)
+        return pd.DataFrame(values, index=pd.Index(timestamps, name='timestamp'))
+
+    def get_close_prices(self, symbol, timestamps, interval='5m'):
+        """
+        Close prices of the candles opening at `timestamps`, keyed by UTC open time
+        (drop-in for get_binance_orderbook_data.get_close_prices).
+        """
+        ohlcv = self.get_ohlcv(symbol, interval, timestamps.min(), timestamps.max(), utc=True)
+        return ohlcv['close']
+
+    def _fetch_closes(self, symbol, interval, start_ms, end_ms):
+        # 目的の時間足を直接取得する（1分足のベース系列には追加しない）
+        fetch = lambda range_start, range_end: self.interval_fetch_func(symbol, interval, range_start, range_end)
+        if self.store is not None:
+            klines = self.store.get_or_fetch(symbol, interval, start_ms, end_ms, fetch)
+        else:
+            klines = fetch(start_ms, end_ms)
+        arrays = decode_klines(klines, ('timestamp', 'close'))
+        in_range = (arrays['timestamp'] >= start_ms) & (arrays['timestamp'] <= end_ms)
+        timestamps = pd.to_datetime(arrays['timestamp'][in_range], unit='ms')
+        return pd.Series(arrays['close'][in_range], index=pd.Index(timestamps, name='timestamp'), name='close')
+
+    def get_close_matrix(self, symbols, interval, start_time, end_time):
+        """
+        Close prices of several symbols on one time index, one column per symbol
+        (e.g. the input of calculate_heatmap.batch_seasonality).
+
+        Windows longer than DIRECT_FETCH_MS are fetched (and stored) at the target
+        interval directly instead of through the in-memory 1m base series, which
+        would otherwise cost 1440 rows per symbol and day in memory and API weight.
+        """
+        start_ms, end_ms = to_milliseconds(start_time), to_milliseconds(end_time)
+        interval_ms = interval_to_milliseconds(interval)
+        if interval_ms > BASE_INTERVAL_MS and end_ms - start_ms > DIRECT_FETCH_MS:
+            closes = {symbol: self._fetch_closes(symbol, interval, start_ms, end_ms) for symbol in symbols}
+        else:
+            closes = {symbol: self.get_ohlcv(symbol, interval, start_time, end_time)['close'] for symbol in symbols}
+        return pd.concat(closes, axis=1)
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def shared_resampler(store_path):
+    """
+    Process-wide KlineResampler backed by the KlineStore at store_path, so every
+    page shares one base series per symbol.
+    """
+    with _shared_lock:
+        if store_path not in _shared:
+            _shared[store_path] = KlineResampler(store=KlineStore(store_path))
+        return _shared[store_path]
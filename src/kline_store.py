@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import time
+import threading
+import logging
+import numpy as np
+import pandas as pd
+from binance.helpers import interval_to_milliseconds
+
+STORED_COLUMNS = ('open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume',
+                  'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume')
+INTEGER_COLUMNS = ('open_time', 'close_time', 'number_of_trades')
+
+def to_milliseconds(t):
+    """
+    Convert a datetime to epoch milliseconds (naive datetimes are treated as UTC,
+    as python-binance does).
+    """
+    t = pd.Timestamp(t)
+    if t.tzinfo is None:
+        t = t.tz_localize('UTC')
+    return int(t.timestamp() * 1000)
+
+class KlineStore:
+    """
+    Persistent local store of closed klines, one SQLite table keyed by
+    (symbol, interval, open time).
+
+    Rows are only ever inserted, so reading a range is a single indexed query
+    and new candles are appended at the tail.
+    """
+
+    def __init__(self, path="klines.sqlite"):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS klines (
+                symbol TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                open_time INTEGER NOT NULL,
+                open REAL, high REAL, low REAL, close REAL, volume REAL,
+                close_time INTEGER,
+                quote_asset_volume REAL,
+                number_of_trades INTEGER,
+                taker_buy_base_asset_volume REAL,
+                taker_buy_quote_asset_volume REAL,
+                PRIMARY KEY (symbol, interval, open_time)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def append(self, symbol, interval, klines):
+        """
+        Insert raw klines (lists as returned by the Binance API). Existing rows are kept.
+
+        :return: Number of klines given
+        """
+        rows = [
+            (symbol, interval, int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]),
+             int(k[6]), float(k[7]), int(k[8]), float(k[9]), float(k[10]))
+            for k in klines
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO klines VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)", rows)
+            self._conn.commit()
+        return len(rows)
+
+    def time_range(self, symbol, interval):
+        """
+        :return: (first_open_time_ms, last_open_time_ms), or None if nothing is stored
+        """
+        with self._lock:
+            first, last = self._conn.execute(
+                "SELECT MIN(open_time), MAX(open_time) FROM klines WHERE symbol = ? AND interval = ?",
+                (symbol, interval)
+            ).fetchone()
+        return None if first is None else (first, last)
+
+    def load(self, symbol, interval, start_ms, end_ms):
+        """
+        Load stored klines with start_ms <= open time <= end_ms as raw kline lists.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT open_time, open, high, low, close, volume, close_time, quote_asset_volume, "
+                "number_of_trades, taker_buy_base_asset_volume, taker_buy_quote_asset_volume "
+                "FROM klines WHERE symbol = ? AND interval = ? AND open_time BETWEEN ? AND ? ORDER BY open_time",
+                (symbol, interval, start_ms, end_ms)
+            ).fetchall()
+        return [list(row) + ['0'] for row in rows]
+
+    def iter_columns(self, symbol, interval, start_ms=None, end_ms=None, columns=('open_time', 'close'), chunk_rows=100_000):
+        """
+        Iterate over stored klines in open-time order as NumPy column chunks of at
+        most chunk_rows rows, so long histories are read with bounded memory.
+
+        :param columns: Stored column names to read besides open_time
+        :return: Generator of dicts {column: ndarray}, always including 'open_time'
+        """
+        unknown = set(columns) - set(STORED_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown kline columns: {sorted(unknown)}")
+        after = -1 if start_ms is None else start_ms - 1
+        end_ms = 2 ** 62 if end_ms is None else end_ms
+        query = (f"SELECT open_time, {', '.join(columns)} FROM klines WHERE symbol = ? AND interval = ? "
+                 f"AND open_time > ? AND open_time <= ? ORDER BY open_time LIMIT ?")
+        while True:
+            # 読み込みごとにロックを解放できるよう、前回の最終時刻から続きを取得
+            with self._lock:
+                rows = self._conn.execute(query, (symbol, interval, after, end_ms, chunk_rows)).fetchall()
+            if not rows:
+                return
+            after = rows[-1][0]
+            values = list(zip(*rows))
+            chunk = {'open_time': np.fromiter(values[0], dtype=np.int64, count=len(rows))}
+            for i, column in enumerate(columns, start=1):
+                chunk[column] = np.fromiter(values[i], dtype=np.int64 if column in INTEGER_COLUMNS else np.float64,
+                                            count=len(rows))
+            yield chunk
+            if len(rows) < chunk_rows:
+                return
+
+    def get_or_fetch(self, symbol, interval, start_ms, end_ms, fetch_func):
+        """
+        Load klines for a range, fetching only the head/tail ranges not stored yet.
+
+        Closed candles that were fetched are appended to the store; the candle
+        still forming is returned but not stored.
+
+        :param fetch_func: Called as fetch_func(range_start_ms, range_end_ms) and
+            returns raw klines from the API
+        :return: List of raw klines ordered by open time
+        """
+        # ローカルに保存済みの範囲を除き、先頭・末尾の不足分だけをAPIから取得
+        interval_ms = interval_to_milliseconds(interval)
+        stored = self.time_range(symbol, interval)
+        if stored is None:
+            missing = [(start_ms, end_ms)]
+        else:
+            missing = []
+            first_open = -(-start_ms // interval_ms) * interval_ms
+            if first_open < stored[0]:
+                missing.append((start_ms, stored[0] - 1))
+            if stored[1] + interval_ms <= end_ms:
+                missing.append((stored[1] + interval_ms, end_ms))
+
+        now_ms = int(time.time() * 1000)
+        open_klines = []
+        for range_start, range_end in missing:
+            klines = fetch_func(range_start, range_end)
+            # 確定済みのローソク足のみを保存し、形成中の足は今回の結果にだけ含める
+            self.append(symbol, interval, [k for k in klines if k[6] < now_ms])
+            open_klines.extend(k for k in klines if k[6] >= now_ms)
+            logging.info(f"Fetched {len(klines)} klines for {symbol} {interval} from API")
+
+        return self.load(symbol, interval, start_ms, end_ms) + open_klines
+
+    def close(self):
+        self._conn.close()
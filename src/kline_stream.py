@@ -0,0 +1,278 @@
+import asyncio
+import threading
+import time
+import json
+import logging
+import numpy as np
+import pandas as pd
+import aiohttp
+from binance.helpers import interval_to_milliseconds
+
+STREAM_URL = "wss://stream.binance.com:9443"
+BUFFER_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+class KlineBuffer:
+    """
+    Fixed-size rolling buffer of the latest candles, backed by NumPy ring arrays.
+
+    Updates for the candle still forming overwrite the newest slot; a new open
+    time advances the ring, dropping the oldest candle once full.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._open_time = np.zeros(capacity, dtype=np.int64)
+        self._values = np.zeros((capacity, len(BUFFER_COLUMNS)), dtype=np.float64)
+        self._closed = np.zeros(capacity, dtype=bool)
+        self._head = 0  # 次に書き込む位置
+        self._size = 0
+        self.closed_count = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def last_open_time(self):
+        return int(self._open_time[(self._head - 1) % self.capacity]) if self._size else None
+
+    def update(self, open_time, values, closed):
+        """
+        Insert or overwrite one candle.
+
+        :param open_time: Candle open time (ms)
+        :param values: (open, high, low, close, volume)
+        :param closed: Whether the candle is final
+        :return: True if this update closed a candle
+        """
+        last = self.last_open_time
+        if last is not None and open_time < last:
+            return False  # 古いメッセージは無視
+        if last is None or open_time > last:
+            self._head = (self._head + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+        i = (self._head - 1) % self.capacity
+        newly_closed = closed and not (open_time == last and self._closed[i])
+        self._open_time[i] = open_time
+        self._values[i] = values
+        self._closed[i] = closed
+        if newly_closed:
+            self.closed_count += 1
+        return newly_closed
+
+    def extend(self, open_times, values):
+        """
+        Seed the buffer with history (e.g. from REST) ordered by open time.
+
+        Candles already received from the stream take precedence, and seeding
+        does not count as closing candles.
+        """
+        current_times, current_values, current_closed = self.snapshot()
+        if len(current_times):
+            keep = np.asarray(open_times) < current_times[0]
+            open_times, values = np.asarray(open_times)[keep], np.asarray(values)[keep]
+        closed_count = self.closed_count
+        self._head = self._size = 0
+        for open_time, row in zip(open_times[-self.capacity:], values[-self.capacity:]):
+            self.update(int(open_time), row, True)
+        for open_time, row, closed in zip(current_times, current_values, current_closed):
+            self.update(int(open_time), row, closed)
+        self.closed_count = closed_count
+
+    def snapshot(self):
+        """
+        :return: (open_times, values, closed) copies ordered oldest to newest
+        """
+        order = (np.arange(self._head - self._size, self._head)) % self.capacity
+        return self._open_time[order], self._values[order], self._closed[order]
+
+def parse_kline_message(message):
+    """
+    Parse a kline event from a raw or combined stream message.
+
+    :return: (symbol, interval, open_time, values, closed), or None for other events
+    """
+    data = message.get('data', message)
+    if data.get('e') != 'kline':
+        return None
+    k = data['k']
+    values = (float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v']))
+    return k['s'], k['i'], int(k['t']), values, bool(k['x'])
+
+class KlineStream:
+    """
+    Websocket consumer keeping a KlineBuffer per (symbol, interval) up to date.
+
+    The stream runs on its own event loop in a background thread; readers take
+    snapshots or wait for the next closed candle from any thread.
+    """
+
+    def __init__(self, subscriptions, capacity=1000, base_url=STREAM_URL, reconnect_delay=1.0, max_reconnect_delay=60.0):
+        """
+        :param subscriptions: Iterable of (symbol, interval) pairs (e.g. [('BTCUSDT', '1h')])
+        :param capacity: Number of candles kept per buffer
+        :param base_url: Websocket base URL (combined stream endpoint is base_url + '/stream')
+        """
+        self.subscriptions = [(symbol.upper(), interval) for symbol, interval in subscriptions]
+        self.base_url = base_url.rstrip('/')
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._buffers = {key: KlineBuffer(capacity) for key in self.subscriptions}
+        self._condition = threading.Condition()
+        self._loop = None
+        self._thread = None
+        self._task = None
+        self._stopping = False
+        self.connected = threading.Event()
+
+    @property
+    def url(self):
+        streams = '/'.join(f"{symbol.lower()}@kline_{interval}" for symbol, interval in self.subscriptions)
+        return f"{self.base_url}/stream?streams={streams}"
+
+    def seed(self, symbol, interval, frame):
+        """
+        Prefill a buffer from a DataFrame indexed by open time with BUFFER_COLUMNS
+        (e.g. KlineResampler.get_ohlcv), so snapshots have full history right away.
+        """
+        open_times = pd.DatetimeIndex(frame.index).asi8 // 10 ** 6
+        with self._condition:
+            self._buffers[(symbol.upper(), interval)].extend(open_times, frame[list(BUFFER_COLUMNS)].to_numpy(np.float64))
+
+    def catch_up(self, symbol, interval, frame, now_ms=None):
+        """
+        Apply recent candles fetched over REST as stream updates, e.g. when the
+        websocket did not deliver a close in time. Candles whose interval has
+        ended count as closed; candles older than the buffer's newest are ignored.
+
+        :return: The current closed count
+        """
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        interval_ms = interval_to_milliseconds(interval)
+        open_times = pd.DatetimeIndex(frame.index).asi8 // 10 ** 6
+        values = frame[list(BUFFER_COLUMNS)].to_numpy(np.float64)
+        buffer = self._buffers[(symbol.upper(), interval)]
+        with self._condition:
+            if any([buffer.update(int(t), row, t + interval_ms <= now_ms) for t, row in zip(open_times, values)]):
+                self._condition.notify_all()
+            return buffer.closed_count
+
+    def closed_count(self, symbol, interval):
+        with self._condition:
+            return self._buffers[(symbol.upper(), interval)].closed_count
+
+    def snapshot(self, symbol, interval, utc=False):
+        """
+        Current buffer contents, including the candle still forming.
+
+        :return: DataFrame indexed by 'timestamp' with open, high, low, close, volume and closed
+        """
+        with self._condition:
+            open_times, values, closed = self._buffers[(symbol.upper(), interval)].snapshot()
+        frame = pd.DataFrame(values, columns=BUFFER_COLUMNS,
+                             index=pd.Index(pd.to_datetime(open_times, unit='ms', utc=utc), name='timestamp'))
+        frame['closed'] = closed
+        return frame
+
+    def wait_for_close(self, symbol, interval, after_count, timeout=None):
+        """
+        Block until more than `after_count` candles have closed (or the timeout expires).
+
+        :return: The current closed count
+        """
+        buffer = self._buffers[(symbol.upper(), interval)]
+        with self._condition:
+            self._condition.wait_for(lambda: buffer.closed_count > after_count or self._stopping, timeout)
+            return buffer.closed_count
+
+    def _handle(self, message):
+        parsed = parse_kline_message(message)
+        if parsed is None:
+            return
+        symbol, interval, open_time, values, closed = parsed
+        buffer = self._buffers.get((symbol, interval))
+        if buffer is None:
+            return
+        with self._condition:
+            if buffer.update(open_time, values, closed):
+                self._condition.notify_all()
+
+    async def run(self):
+        """
+        Consume the stream until stop() is called, reconnecting with backoff.
+        """
+        delay = self.reconnect_delay
+        async with aiohttp.ClientSession() as session:
+            while not self._stopping:
+                try:
+                    async with session.ws_connect(self.url, heartbeat=30) as ws:
+                        self.connected.set()
+                        delay = self.reconnect_delay
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                try:
+                                    self._handle(json.loads(msg.data))
+                                except Exception as e:
+                                    # 想定外のメッセージは読み飛ばし、接続は維持する
+                                    logging.warning(f"Skipping malformed kline message: {e!r}: {msg.data[:200]}")
+                            elif msg.type == aiohttp.WSMsgType.ERROR:
+                                break
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logging.warning(f"Kline stream error: {e}")
+                except Exception:
+                    # どんな失敗でもスレッドを終了させず、間隔を空けて再接続する
+                    logging.exception("Unexpected kline stream error")
+                finally:
+                    self.connected.clear()
+                if not self._stopping:
+                    # 切断時は間隔を広げながら再接続
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+
+    def start(self):
+        """
+        Run the stream in a daemon thread with its own event loop.
+        """
+        if self._thread is not None:
+            return self
+        self._stopping = False
+        self._loop = asyncio.new_event_loop()
+
+        def target():
+            asyncio.set_event_loop(self._loop)
+            self._task = self._loop.create_task(self.run())
+            try:
+                self._loop.run_until_complete(self._task)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self._loop.close()
+
+        self._thread = threading.Thread(target=target, name="kline-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            try:
+                self._loop.call_soon_threadsafe(lambda: self._task and self._task.cancel())
+            except RuntimeError:
+                pass  # ループは既に終了している
+            self._thread.join(timeout)
+            self._thread = None
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def shared_stream(subscriptions, capacity=1000):
+    """
+    Process-wide started KlineStream for the given subscriptions, so Streamlit
+    reruns reuse one connection and buffer.
+    """
+    key = (tuple(subscriptions), capacity)
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = KlineStream(subscriptions, capacity=capacity).start()
+        return _shared[key]
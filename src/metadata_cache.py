@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import logging
+import requests
+import aiohttp
+
+EXCHANGE_INFO_TTL = 6 * 3600  # シンボル情報はほとんど変わらない
+PRICE_TTL = 10
+# 作業ディレクトリに依存しないよう、プロジェクトルートに保存する
+DEFAULT_CACHE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'metadata_cache.json'))
+
+class MetadataCache:
+    """
+    TTL cache for exchange metadata and reference prices fetched as JSON.
+
+    Entries are refreshed only after their TTL expires, with a conditional
+    request (If-None-Match / If-Modified-Since) when the previous response had
+    an ETag or Last-Modified header; a 304 keeps the cached value. If a refresh
+    fails, an expired value is served for up to max_stale seconds. Entries
+    fetched with persist=True are written to `path` for warm starts.
+    """
+
+    def __init__(self, path=None, max_stale=3600, clock=time.time):
+        """
+        :param path: JSON file for persisted entries (None = memory only)
+        :param max_stale: Seconds an expired value may still be served when a refresh fails
+        """
+        self.path = path
+        self.max_stale = max_stale
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._persisted = set()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self._entries = json.load(f)
+                self._persisted = set(self._entries)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable metadata cache {path}: {e}")
+
+    @staticmethod
+    def key(url, params=None):
+        return url if not params else f"{url}?{'&'.join(f'{k}={v}' for k, v in sorted(params.items()))}"
+
+    def _fresh(self, key, ttl):
+        entry = self._entries.get(key)
+        if entry is not None and self.clock() - entry['fetched_at'] < ttl:
+            return entry
+        return None
+
+    def _conditional_headers(self, key):
+        entry = self._entries.get(key)
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def _store(self, key, status, headers, value, persist):
+        with self._lock:
+            entry = self._entries.get(key)
+            if status == 304 and entry is not None:
+                entry['fetched_at'] = self.clock()
+            else:
+                entry = {'value': value, 'fetched_at': self.clock(),
+                         'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+                self._entries[key] = entry
+            if persist:
+                self._persisted.add(key)
+                self._save()
+            return entry['value']
+
+    def _stale(self, key, error):
+        entry = self._entries.get(key)
+        if entry is None or self.clock() - entry['fetched_at'] > self.max_stale:
+            raise error
+        logging.warning(f"Serving stale {key} after refresh failed: {error}")
+        return entry['value']
+
+    def _save(self):
+        if not self.path:
+            return
+        # 一時ファイルに書いてから置き換える
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({k: self._entries[k] for k in self._persisted if k in self._entries}, f)
+        os.replace(tmp_path, self.path)
+
+    def get_json(self, url, params=None, ttl=PRICE_TTL, persist=False, session=None, timeout=10):
+        """
+        JSON body of a GET request, served from the cache while younger than ttl seconds.
+        """
+        key = self.key(url, params)
+        entry = self._fresh(key, ttl)
+        if entry is not None:
+            return entry['value']
+        try:
+            response = (session or requests).get(url, params=params, headers=self._conditional_headers(key),
+                                                 timeout=timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+            value = None if response.status_code == 304 else response.json()
+            return self._store(key, response.status_code, response.headers, value, persist)
+        except requests.RequestException as e:
+            return self._stale(key, e)
+
+    async def get_json_async(self, session, url, params=None, ttl=PRICE_TTL, persist=False):
+        """
+        Same as get_json, over an aiohttp.ClientSession.
+        """
+        key = self.key(url, params)
+        entry = self._fresh(key, ttl)
+        if entry is not None:
+            return entry['value']
+        try:
+            async with session.get(url, params=params, headers=self._conditional_headers(key)) as response:
+                if response.status != 304:
+                    response.raise_for_status()
+                value = None if response.status == 304 else await response.json(content_type=None)
+                return self._store(key, response.status, response.headers, value, persist)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return self._stale(key, e)
+
+# Binance・Bybitのモジュールで共有するキャッシュ
+default_cache = MetadataCache(DEFAULT_CACHE_PATH)
@@ -0,0 +1,130 @@
+import asyncio
+import time
+import logging
+from urllib.parse import urlsplit
+import aiohttp
+
+import binance_top10
+import bybit_top10
+import metadata_cache
+from metadata_cache import EXCHANGE_INFO_TTL, PRICE_TTL
+from usd_conversion import UsdConverter
+
+RANKING_KEYS = ('binance_spot', 'binance_futures', 'bybit_spot', 'bybit_perp')
+
+# メタデータと参照価格はキャッシュ経由で取得: {name: (ttl, persist)}
+CACHED_ENDPOINTS = {
+    'binance_prices': (PRICE_TTL, False),
+    'binance_exchange_info': (EXCHANGE_INFO_TTL, True),
+    'bybit_spot': (PRICE_TTL, False),
+    'bybit_linear': (PRICE_TTL, False),
+    'bybit_inverse': (PRICE_TTL, False),
+}
+
+def ranking_endpoints(hosts=None):
+    """
+    Every endpoint the four rankings need, as {name: (url, params)}.
+
+    :param hosts: Optional {original 'scheme://host': replacement} map (e.g. for a local stand-in)
+    """
+    endpoints = {
+        'binance_prices': (binance_top10.SPOT_PRICE_URL, None),
+        'binance_exchange_info': (binance_top10.SPOT_EXCHANGE_INFO_URL, None),
+        'binance_spot_tickers': (binance_top10.SPOT_TICKER_URL, None),
+        'binance_usdt_futures': (binance_top10.USDT_FUTURES_TICKER_URL, None),
+        'binance_coin_futures': (binance_top10.COIN_FUTURES_TICKER_URL, None),
+    }
+    for cat in ('spot', 'linear', 'inverse'):
+        endpoints[f'bybit_{cat}'] = (f"{bybit_top10.BASE_URL}{bybit_top10.TICKERS_ENDPOINT}", {'category': cat})
+
+    if hosts:
+        for name, (url, params) in endpoints.items():
+            parts = urlsplit(url)
+            origin = f"{parts.scheme}://{parts.netloc}"
+            endpoints[name] = (hosts.get(origin, origin) + url[len(origin):], params)
+    return endpoints
+
+async def _get_json(session, name, url, params):
+    start = time.perf_counter()
+    async with session.get(url, params=params) as response:
+        response.raise_for_status()
+        data = await response.json(content_type=None)
+    logging.info(f"Fetched {name} in {time.perf_counter() - start:.2f}s")
+    return data
+
+async def _get_endpoint(session, cache, name, url, params):
+    if name in CACHED_ENDPOINTS:
+        ttl, persist = CACHED_ENDPOINTS[name]
+        return await cache.get_json_async(session, url, params, ttl=ttl, persist=persist)
+    return await _get_json(session, name, url, params)
+
+async def collect_rankings(top_n=10, session=None, per_host_limit=4, timeout=10, hosts=None, cache=None):
+    """
+    Fetch all exchange ranking endpoints concurrently and build the four rankings.
+
+    All requests share one keep-alive connection pool with at most
+    per_host_limit connections per host, so an update takes about as long as
+    the slowest single request.
+
+    :param top_n: Number of rankings per market
+    :param session: Optional aiohttp.ClientSession to reuse (its own limits apply)
+    :param per_host_limit: Concurrent connections per host
+    :param timeout: Total timeout per request in seconds
+    :param hosts: Optional host replacement map (see ranking_endpoints)
+    :param cache: MetadataCache for exchangeInfo and prices (default: metadata_cache.default_cache)
+    :return: Dict of VolumeRanking lists keyed by RANKING_KEYS; a ranking whose endpoints
+        failed is an empty list (the errors are logged)
+    """
+    endpoints = ranking_endpoints(hosts)
+    cache = cache or metadata_cache.default_cache
+    owns_session = session is None
+    if owns_session:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit_per_host=per_host_limit),
+                                        timeout=aiohttp.ClientTimeout(total=timeout))
+    try:
+        # 1つの取引所が失敗しても他のランキングは作成する
+        results = await asyncio.gather(*(_get_endpoint(session, cache, name, url, params)
+                                         for name, (url, params) in endpoints.items()), return_exceptions=True)
+    finally:
+        if owns_session:
+            await session.close()
+    data, failed = {}, set()
+    for name, result in zip(endpoints, results):
+        if isinstance(result, BaseException):
+            logging.error(f"Failed to fetch {name}: {result!r}")
+            failed.add(name)
+        else:
+            data[name] = result
+
+    def build(key, required, rank, partial=False):
+        # partial=True: 必要なエンドポイントの一部が取得できればランキングを作る
+        missing = [name for name in required if name in failed]
+        if missing and (not partial or len(missing) == len(required)):
+            logging.error(f"Skipping {key} ranking: {', '.join(missing)} unavailable")
+            return []
+        try:
+            return rank()
+        except Exception as e:
+            logging.error(f"Failed to build {key} ranking: {e!r}")
+            return []
+
+    def rank_binance_spot():
+        converter = UsdConverter.from_binance(data['binance_exchange_info'], data['binance_prices'])
+        return binance_top10.rank_binance_spot(data['binance_spot_tickers'], data['binance_exchange_info'],
+                                               converter, top_n)
+
+    return {
+        'binance_spot': build('binance_spot', ('binance_prices', 'binance_exchange_info', 'binance_spot_tickers'),
+                              rank_binance_spot),
+        # 先物はUSDT建て・コイン建てのうち取得できた方だけでもランキングを作る
+        'binance_futures': build('binance_futures', ('binance_usdt_futures', 'binance_coin_futures'),
+                                 lambda: binance_top10.rank_binance_futures(data.get('binance_usdt_futures', []),
+                                                                            data.get('binance_coin_futures', []), top_n),
+                                 partial=True),
+        'bybit_spot': build('bybit_spot', ('bybit_spot',),
+                            lambda: bybit_top10.rank_bybit({'spot': bybit_top10.parse_tickers_response(data['bybit_spot'])},
+                                                           'spot', top_n)),
+        'bybit_perp': build('bybit_perp', ('bybit_linear', 'bybit_inverse'),
+                            lambda: bybit_top10.rank_bybit({cat: bybit_top10.parse_tickers_response(data[f'bybit_{cat}'])
+                                                            for cat in ('linear', 'inverse')}, 'perp', top_n)),
+    }
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+def symbol_key(tickers, key='symbol'):
+    """
+    Tuple of the ticker symbols, usable as a cache key for per-symbol parsing.
+    """
+    return tuple(t[key] for t in tickers)
+
+def numeric_column(tickers, key):
+    """
+    Float array of a ticker field given as strings; empty or malformed values become NaN.
+    """
+    values = [t[key] for t in tickers]
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        # 空文字などが混じる場合だけpandasで変換する
+        return pd.to_numeric(np.array(values, dtype=object), errors='coerce').astype(np.float64)
+
+def rates_for(converter, assets):
+    """
+    USD rates of the assets from a UsdConverter, followed by one NaN so that an
+    index of -1 (no asset) maps to NaN.
+    """
+    return np.array([converter.rate(asset) for asset in assets] + [None], dtype=np.float64)
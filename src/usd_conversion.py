@@ -0,0 +1,108 @@
+from collections import defaultdict
+from functools import lru_cache
+import numpy as np
+
+class _ConversionPlan:
+    """
+    Breadth-first search over a fixed set of pairs, kept as one array group per
+    hop level so that rates for new prices take a few array operations.
+    """
+
+    def __init__(self, bases, quotes, anchors):
+        # neighbors[b] = [(a, pair, inverted)]: 1 a = price b (inverted: 1 a = 1 / price b)
+        neighbors = defaultdict(list)
+        for pair, (base, quote) in enumerate(zip(bases, quotes)):
+            if base != quote:
+                neighbors[quote].append((base, pair, False))
+                neighbors[base].append((quote, pair, True))
+
+        self.assets = list(anchors)
+        self.hops = {asset: 0 for asset in anchors}
+        position = {asset: i for i, asset in enumerate(self.assets)}
+        self.levels = []
+        frontier = list(anchors)
+        while frontier:
+            child, parent, pairs, inverted = [], [], [], []
+            next_frontier = []
+            for asset in frontier:
+                for other, pair, inv in neighbors[asset]:
+                    if other not in self.hops:
+                        self.hops[other] = self.hops[asset] + 1
+                        position[other] = len(self.assets)
+                        child.append(position[other])
+                        parent.append(position[asset])
+                        pairs.append(pair)
+                        inverted.append(inv)
+                        self.assets.append(other)
+                        next_frontier.append(other)
+            if child:
+                self.levels.append((np.array(child, dtype=np.intp), np.array(parent, dtype=np.intp),
+                                    np.array(pairs, dtype=np.intp), np.array(inverted, dtype=bool)))
+            frontier = next_frontier
+
+    def rates(self, prices, anchor_rates):
+        """
+        :param prices: Float array of the pair prices, aligned with the pairs of the plan
+        :param anchor_rates: USD rates of the anchors, in plan order
+        :return: Float array of USD rates aligned with self.assets
+        """
+        rates = np.empty(len(self.assets))
+        rates[:len(anchor_rates)] = anchor_rates
+        for child, parent, pairs, inverted in self.levels:
+            price = prices[pairs]
+            rates[child] = np.where(inverted, 1 / price, price) * rates[parent]
+        return rates
+
+@lru_cache(maxsize=8)
+def _conversion_plan(bases, quotes, anchors):
+    return _ConversionPlan(bases, quotes, anchors)
+
+class UsdConverter:
+    """
+    USD rates of every asset reachable from the anchor currencies through traded pairs.
+
+    Pairs form an undirected currency graph (BTCUSDT links BTC and USDT, ETHBTC
+    links ETH and BTC, ...). One breadth-first search from the anchors resolves
+    each asset over the path with the fewest conversions, so looking up a rate
+    afterwards is a dict access. The search only depends on which pairs exist,
+    so it is reused while the listings stay the same and only prices change.
+    """
+
+    def __init__(self, pairs, anchors=None):
+        """
+        :param pairs: Iterable of (base, quote, price) with 1 base = price quote;
+            pairs with a non-positive price are ignored
+        :param anchors: {asset: USD rate} to start from (default: {'USDT': 1.0})
+        """
+        anchors = {'USDT': 1.0} if anchors is None else anchors
+        pairs = [pair for pair in pairs if pair[2] > 0]
+        bases, quotes, prices = zip(*pairs) if pairs else ((), (), ())
+        plan = _conversion_plan(bases, quotes, tuple(anchors))
+        rates = plan.rates(np.array(prices, dtype=np.float64), np.array(list(anchors.values()), dtype=np.float64))
+        self.rates = dict(zip(plan.assets, rates.tolist()))
+        self.hops = dict(plan.hops)
+
+    def rate(self, asset):
+        """
+        :return: USD value of one unit of asset, or None if it is not connected to an anchor
+        """
+        return self.rates.get(asset)
+
+    @classmethod
+    def from_binance(cls, exchange_info, prices, anchors=None):
+        """
+        Build from the /api/v3/exchangeInfo and /api/v3/ticker/price payloads.
+        """
+        assets = {s['symbol']: (s['baseAsset'], s['quoteAsset']) for s in exchange_info['symbols']}
+        pairs = ((*assets[p['symbol']], float(p['price'])) for p in prices if p['symbol'] in assets)
+        return cls(pairs, anchors)
+
+def split_symbol(symbol, quotes):
+    """
+    :param quotes: Quote currencies in priority order (longest first, so USDT wins over USD)
+    :return: (base, quote) for the first quote that ends the symbol, or None
+    """
+    for quote in quotes:
+        if symbol.endswith(quote) and len(symbol) > len(quote):
+            return symbol[:-len(quote)], quote
+    return None
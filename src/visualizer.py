@@ -89,19 +89,39 @@ def create_hourly_plot(hour_return: pd.Series) -> go.Figure:
 
     return fig
 
-def create_heatmap(heatmap_data: pd.DataFrame) -> go.Figure:
+# ヒートマップで表示できる統計量: (タイトル, カラースケール, カラースケールの中心値)
+HEATMAP_STAT_STYLES = {
+    'mean': ('曜日・時間ごとの価格変化率ヒートマップ', 'RdBu_r', None),
+    'median': ('曜日・時間ごとの価格変化率（中央値）', 'RdBu_r', 0),
+    'std': ('曜日・時間ごとの価格変化率の標準偏差 (%)', 'Viridis', None),
+    'win_rate': ('曜日・時間ごとの勝率 (%)', 'RdBu_r', 50),
+    't_stat': ('曜日・時間ごとのt値', 'RdBu_r', 0),
+    'count': ('曜日・時間ごとのデータ数', 'Viridis', None),
+    'p_value': ('曜日・時間ごとのp値（ブロックブートストラップ）', 'Viridis_r', None),
+}
+
+def create_heatmap(heatmap_data: pd.DataFrame, stat: str = 'mean') -> go.Figure:
+    """
+    :param heatmap_data: Weekday x hour values (process_data output or SeasonalityStats.heatmap(stat))
+    :param stat: Statistic shown, selecting the title and color scale (see HEATMAP_STAT_STYLES;
+        quantiles such as 'q90' use the median style)
+    """
     weekdays = ['月', '火', '水', '木', '金', '土', '日']
     hours = list(range(24))
+    title, colorscale, zmid = HEATMAP_STAT_STYLES.get(stat, HEATMAP_STAT_STYLES['median'])
+    if stat not in HEATMAP_STAT_STYLES:
+        title = f'曜日・時間ごとの価格変化率（{stat[1:]}パーセンタイル）'
 
     fig = go.Figure(data=go.Heatmap(
         z=heatmap_data.values,
         x=hours,
         y=weekdays,
-        colorscale='RdBu_r'
+        colorscale=colorscale,
+        zmid=zmid
     ))
 
     fig.update_layout(
-        title='曜日・時間ごとの価格変化率ヒートマップ'
+        title=title
     )
 
     fig.update_xaxes(
@@ -0,0 +1,71 @@
+import heapq
+from typing import NamedTuple
+import numpy as np
+
+class VolumeRanking(NamedTuple):
+    symbol: str
+    market_type: str
+    volume_usd: float
+    rank: int
+    raw: dict
+
+def rank_by_volume(items, top_n=10):
+    """
+    Select the top_n entries by USD volume without sorting the whole list.
+
+    :param items: Iterable of (symbol, market_type, volume_usd, raw) tuples
+    :param top_n: Number of rankings to return
+    :return: List of VolumeRanking ordered by volume (rank 1 first)
+    """
+    # heapq.nlargestは同順位の元の順序を保つため、sorted(..., reverse=True)[:n]と同じ結果になる
+    top = heapq.nlargest(top_n, items, key=lambda item: item[2])
+    return [VolumeRanking(symbol, market_type, float(volume_usd), rank, raw)
+            for rank, (symbol, market_type, volume_usd, raw) in enumerate(top, 1)]
+
+def rank_volume_arrays(symbols, market_types, volumes_usd, raws, top_n=10, mask=None):
+    """
+    Same as rank_by_volume for columnar input.
+
+    :param symbols: Sequence of symbols
+    :param market_types: One market type for all entries, or a sequence of them
+    :param volumes_usd: Float array of USD volumes (NaN-free)
+    :param raws: Sequence of source ticker dicts
+    :param mask: Optional boolean array of the entries to rank
+    :return: List of VolumeRanking ordered by volume (rank 1 first)
+    """
+    volumes_usd = np.asarray(volumes_usd, dtype=np.float64)
+    positions = np.arange(len(volumes_usd)) if mask is None else np.flatnonzero(mask)
+    values = volumes_usd[positions]
+    n = len(values)
+    if top_n <= 0 or n == 0:
+        return []
+    if top_n < n:
+        # 上位top_n件の境界値以上の候補だけを並べ替える（同順位は元の順序を保つ）
+        threshold = np.partition(values, n - top_n)[n - top_n]
+        candidates = np.flatnonzero(values >= threshold)
+    else:
+        candidates = np.arange(n)
+    top = positions[candidates[np.argsort(-values[candidates], kind='stable')][:top_n]]
+    return [VolumeRanking(symbols[i], market_types if isinstance(market_types, str) else market_types[i],
+                          float(volumes_usd[i]), rank, raws[i])
+            for rank, i in enumerate(top.tolist(), 1)]
+
+def format_rankings(title, rankings, symbol_width=10, show_market_type=False):
+    """
+    Format rankings as the text the top10 scripts print.
+
+    :return: Multi-line string starting with the title line
+    """
+    lines = [title]
+    for r in rankings:
+        line = f"{r.rank}. {r.symbol:<{symbol_width}} - 取引量: ${r.volume_usd:,.2f}"
+        if show_market_type:
+            line += f" ({r.market_type})"
+        lines.append(line)
+    return "\n".join(lines)
+
+def rankings_to_records(rankings):
+    """
+    JSON-serializable rows ({'Rank', 'Symbol', 'Volume'}) for caching and tables.
+    """
+    return [{'Rank': r.rank, 'Symbol': r.symbol, 'Volume': f"${r.volume_usd:,.2f}"} for r in rankings]
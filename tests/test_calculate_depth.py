@@ -0,0 +1,231 @@
+import unittest
+import pandas as pd
+import numpy as np
+from datetime import datetime, timedelta
+import tarfile
+import tempfile
+import io
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from calculate_depth import (
+    process_5min_intervals, aggregate_intervals, process_large_file, iter_depth_chunks, depth_band,
+    compact_depth_arrays, IntervalAccumulator
+)
+from depth_cache import DepthCache
+
+
+def make_depth_data(start_time, hours=2, rows_per_interval=400, seed=0):
+    # テスト用の板データを生成（終値30000付近の価格に分布）
+    rng = np.random.default_rng(seed)
+    n = hours * 12 * rows_per_interval
+    offsets_ms = np.sort(rng.integers(0, hours * 3600 * 1000, n))
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(int(start_time.timestamp() * 1000) + offsets_ms, unit='ms', utc=True),
+        'price': (30000 * (1 + rng.uniform(-0.07, 0.07, n))).astype('float32'),
+        'qty': rng.uniform(0.001, 5, n).astype('float32'),
+        'side': pd.Categorical(rng.choice(['a', 'b'], n)),
+    })
+
+
+def make_close_prices(interval_starts, seed=1):
+    rng = np.random.default_rng(seed)
+    return {ts: 30000 * (1 + rng.uniform(-0.01, 0.01)) for ts in interval_starts}
+
+
+def write_depth_tarball(path, frames):
+    # S_DEPTHアーカイブと同じ形式（tar.gz内のCSV）で書き出す
+    with tarfile.open(path, 'w:gz') as tar:
+        for i, frame in enumerate(frames):
+            csv = frame.assign(timestamp=frame['timestamp'].values.view('int64') // 10**6)
+            payload = csv.to_csv(index=False).encode()
+            info = tarfile.TarInfo(name=f"BTCUSDT_S_DEPTH_{i}.csv")
+            info.size = len(payload)
+            tar.addfile(info, io.BytesIO(payload))
+
+
+class TestCalculateDepth(unittest.TestCase):
+    def setUp(self):
+        self.start_time = pd.Timestamp(datetime(2024, 1, 1), tz='UTC')
+        self.end_time = self.start_time + timedelta(hours=2)
+        self.data = make_depth_data(self.start_time)
+        self.interval_starts = pd.date_range(start=self.start_time, end=self.end_time, freq='5T')
+        self.close_prices = make_close_prices(self.interval_starts)
+
+    def legacy_result(self):
+        # 区間ごとに処理する従来の方法で期待値を作成
+        results = []
+        for start in self.interval_starts:
+            end = start + timedelta(minutes=5)
+            interval_data = self.data[(self.data['timestamp'] >= start) & (self.data['timestamp'] < end)]
+            if interval_data.empty:
+                continue
+            results.append(process_5min_intervals(interval_data, start, end, self.close_prices[start]))
+        return pd.concat(results, ignore_index=True)
+
+    def test_aggregate_intervals_matches_per_interval_processing(self):
+        expected = self.legacy_result()
+        result = aggregate_intervals(self.data, self.interval_starts, self.close_prices)
+
+        self.assertEqual(list(result.columns), list(expected.columns) + ['relative_ratio_percent'])
+        self.assertEqual(len(result), 24)
+        pd.testing.assert_series_equal(result['interval_start'], expected['interval_start'])
+        pd.testing.assert_series_equal(result['filtered_count'], expected['filtered_count'], check_dtype=False)
+        for column in ['close_price', 'a_qty_sum', 'b_qty_sum', 'depth_ratio', 'total_qty_1pct', 'total_qty_5pct']:
+            np.testing.assert_allclose(result[column], expected[column], rtol=1e-5)
+
+    def test_prices_on_band_edges(self):
+        # 閾値ちょうどの価格（+1%, +2.5%, -1%, -2.5%, ±5%）はfloat32で比較して帯に含める
+        close = 60000.0
+        start = self.start_time
+        prices = [60600.0, 61500.0, 59400.0, 58500.0, 63000.0, 57000.0, 61500.1, 58499.9]
+        data = pd.DataFrame({
+            'timestamp': pd.to_datetime([start + timedelta(seconds=i) for i in range(len(prices))], utc=True),
+            'price': np.array(prices, dtype='float32'),
+            'qty': np.arange(1, len(prices) + 1, dtype='float32'),
+            'side': pd.Categorical(['a', 'a', 'b', 'b', 'a', 'b', 'a', 'b']),
+        })
+        expected = process_5min_intervals(data, start, start + timedelta(minutes=5), close)
+        result = aggregate_intervals(data, [start], {start: close})
+        self.assertEqual((result['a_qty_sum'][0], result['b_qty_sum'][0]), (3.0, 7.0))
+        self.assertEqual(result['filtered_count'][0], 4)
+        for column in ['a_qty_sum', 'b_qty_sum', 'total_qty_1pct', 'total_qty_5pct', 'filtered_count']:
+            self.assertEqual(result[column][0], expected[column][0], column)
+
+        # ティック単位で集計しても同じ結果になる
+        timestamps = data['timestamp'].values.view('int64') // 10**6
+        accumulator = IntervalAccumulator(start, start + timedelta(minutes=5), {start: close})
+        accumulator.add_compact(compact_depth_arrays(timestamps, data['price'], data['qty'], data['side'].to_numpy(),
+                                                     tick_size=0.1, base_ms=int(timestamps[0])))
+        ticked = accumulator.result()
+        for column in ['a_qty_sum', 'b_qty_sum', 'total_qty_1pct', 'total_qty_5pct', 'filtered_count']:
+            self.assertEqual(ticked[column][0], result[column][0], column)
+
+    def test_aggregate_intervals_skips_missing_close_prices(self):
+        missing = self.interval_starts[3]
+        close_prices = {k: v for k, v in self.close_prices.items() if k != missing}
+        result = aggregate_intervals(self.data, self.interval_starts, close_prices)
+
+        self.assertEqual(len(result), 23)
+        self.assertNotIn(missing, set(result['interval_start']))
+
+    def test_aggregate_intervals_with_custom_bands(self):
+        bands = [
+            depth_band('total_qty_0_5pct', -0.005, 0.005),
+            depth_band('total_qty_2pct', -0.02, 0.02),
+            depth_band('ask_qty_10pct', 0.0, 0.10, side='a'),
+            depth_band('bid_qty_skewed', -0.03, 0.01, side='b'),
+        ]
+        result = aggregate_intervals(self.data, self.interval_starts, self.close_prices, bands=bands)
+
+        self.assertEqual(
+            list(result.columns),
+            ['interval_start', 'interval_end', 'close_price', 'a_qty_sum', 'b_qty_sum', 'depth_ratio',
+             'total_qty_0_5pct', 'total_qty_2pct', 'ask_qty_10pct', 'bid_qty_skewed',
+             'filtered_count', 'relative_ratio_percent']
+        )
+        # 区間ごとにマスクで計算した値と比較
+        for _, row in result.iterrows():
+            start = row['interval_start']
+            interval_data = self.data[
+                (self.data['timestamp'] >= start) & (self.data['timestamp'] < start + timedelta(minutes=5))
+            ]
+            price = interval_data['price']
+            for band in bands:
+                mask = (price >= row['close_price'] * (1 + band['lower'])) & (price <= row['close_price'] * (1 + band['upper']))
+                if band['side'] != 'both':
+                    mask &= interval_data['side'] == band['side']
+                self.assertAlmostEqual(row[band['name']], interval_data.loc[mask, 'qty'].astype('float64').sum(), places=3)
+
+    def test_depth_band_validation(self):
+        with self.assertRaises(ValueError):
+            depth_band('invalid', 0.02, 0.01)
+        with self.assertRaises(ValueError):
+            depth_band('invalid', -0.01, 0.01, side='x')
+
+    def test_process_large_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'depth.tar.gz')
+            write_depth_tarball(path, [self.data])
+            result = process_large_file(
+                path,
+                start_time=self.start_time,
+                end_time=self.end_time,
+                get_close_prices_func=lambda timestamps: self.close_prices
+            )
+
+        expected = aggregate_intervals(self.data, self.interval_starts, self.close_prices)
+        self.assertEqual(len(result), len(expected))
+        np.testing.assert_allclose(result['depth_ratio'], expected['depth_ratio'], rtol=1e-6)
+
+    def test_process_large_file_streams_all_members_in_chunks(self):
+        # 期間外のデータを含む複数ファイルのアーカイブ
+        outside = make_depth_data(self.end_time, hours=1, rows_per_interval=50, seed=2)
+        members = [self.data.iloc[:5000], self.data.iloc[5000:], outside]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'depth.tar.gz')
+            write_depth_tarball(path, members)
+            chunk_sizes = [len(chunk) for chunk in iter_depth_chunks(path, chunksize=1000)]
+            result = process_large_file(
+                path,
+                start_time=self.start_time,
+                end_time=self.end_time,
+                get_close_prices_func=lambda timestamps: self.close_prices,
+                chunksize=1000
+            )
+
+        self.assertEqual(sum(chunk_sizes), len(self.data) + len(outside))
+        self.assertLessEqual(max(chunk_sizes), 1000)
+        expected = aggregate_intervals(self.data, self.interval_starts, self.close_prices)
+        self.assertEqual(len(result), len(expected))
+        pd.testing.assert_series_equal(result['filtered_count'], expected['filtered_count'])
+        np.testing.assert_allclose(result['total_qty_5pct'], expected['total_qty_5pct'], rtol=1e-9)
+
+    def test_compact_depth_arrays(self):
+        timestamps = self.data['timestamp'].values.view('int64') // 10**6
+        compact = compact_depth_arrays(
+            timestamps, self.data['price'], self.data['qty'], self.data['side'].to_numpy(),
+            tick_size=0.1, base_ms=int(self.start_time.timestamp() * 1000)
+        )
+
+        self.assertEqual(compact['timestamp'].dtype, np.int32)
+        self.assertEqual(compact['price'].dtype, np.int32)
+        self.assertEqual(compact['side'].dtype, np.int8)
+        self.assertEqual(compact['timestamp'][0], timestamps[0] - int(self.start_time.timestamp() * 1000))
+        np.testing.assert_allclose(compact['price'] * 0.1, self.data['price'], atol=0.06)
+        with self.assertRaises(ValueError):
+            compact_depth_arrays(timestamps, self.data['price'], self.data['qty'], self.data['side'].to_numpy(),
+                                 tick_size=0.1, base_ms=0)
+
+    def test_process_large_file_with_tick_size(self):
+        # ティック（0.1）単位の価格と、閾値がティックの境界に重ならない終値を使う
+        data = self.data.assign(price=(np.round(self.data['price'] / 0.1) * 0.1).astype('float32'))
+        close_prices = {ts: 30000.05 for ts in self.interval_starts}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'depth.tar.gz')
+            write_depth_tarball(path, [data])
+            kwargs = dict(
+                start_time=self.start_time,
+                end_time=self.end_time,
+                get_close_prices_func=lambda timestamps: close_prices,
+                chunksize=2000
+            )
+            expected = process_large_file(path, **kwargs)
+            # キャッシュにはティック単位の列として保存し、そのまま集計する
+            cache = DepthCache(os.path.join(tmp, 'cache'))
+            key = ('BTCUSDT', self.start_time.date(), 'S_DEPTH')
+            result = process_large_file(path, tick_size=0.1, cache=cache, cache_key=key, **kwargs)
+            part = next(cache.partitions(*key))
+            self.assertEqual((part['timestamp'].dtype, part['price'].dtype), (np.int32, np.int32))
+            self.assertEqual(part['tick_size'], 0.1)
+            cached = process_large_file(None, cache=cache, cache_key=key, **kwargs)
+            parallel = process_large_file(None, cache=cache, cache_key=key, workers=2, **kwargs)
+
+        pd.testing.assert_frame_equal(cached, result)
+        for frame in (result, parallel):
+            pd.testing.assert_series_equal(frame['filtered_count'], expected['filtered_count'])
+            for column in ['a_qty_sum', 'b_qty_sum', 'total_qty_1pct', 'total_qty_5pct']:
+                np.testing.assert_allclose(frame[column], expected[column], rtol=1e-9)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+import tempfile
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from calculate_heatmap import (process_data, IncrementalSeasonality, batch_seasonality, process_data_extended,
+                               SeasonalityStats, ChunkedSeasonality)
+from kline_store import KlineStore
+
+
+def make_hourly_closes(hours, start='2024-01-01', seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=hours, freq='H', name='timestamp')
+    return pd.DataFrame({'close': 30000 * np.exp(np.cumsum(rng.normal(0, 0.005, hours)))}, index=index)
+
+
+def assert_same_result(test, actual, expected):
+    weekday_return, hour_return, heatmap_data = actual
+    pd.testing.assert_series_equal(weekday_return, expected[0], check_names=False)
+    pd.testing.assert_series_equal(hour_return, expected[1], check_names=False)
+    pd.testing.assert_frame_equal(heatmap_data, expected[2])
+    test.assertEqual(weekday_return.index.name, 'weekday')
+    test.assertEqual(hour_return.index.name, 'hour')
+
+
+class TestIncrementalSeasonality(unittest.TestCase):
+    def test_sliding_window_matches_process_data(self):
+        data = make_hourly_closes(24 * 100)
+        window = timedelta(days=90)
+        stats = IncrementalSeasonality.from_frame(data.iloc[:24 * 30], window)
+        for timestamp, close in data['close'].iloc[24 * 30:].items():
+            stats.add(timestamp, close)
+
+        expected = process_data(data[data.index > data.index[-1] - window].copy())
+        self.assertEqual(len(stats), 24 * 90)
+        assert_same_result(self, stats.result(), expected)
+
+    def test_from_frame_matches_process_data(self):
+        data = make_hourly_closes(24 * 10 + 5, seed=1)
+        stats = IncrementalSeasonality.from_frame(data, timedelta(days=90))
+        assert_same_result(self, stats.result(), process_data(data.copy()))
+
+    def test_forming_candle_is_replaced(self):
+        data = make_hourly_closes(24 * 3)
+        stats = IncrementalSeasonality.from_frame(data, timedelta(days=90))
+        stats.add(data.index[-1], data['close'].iloc[-1] * 1.5)
+        stats.add(data.index[-1], data['close'].iloc[-1])
+        stats.add(data.index[0], 1.0)  # 古い足は無視
+        assert_same_result(self, stats.result(), process_data(data.copy()))
+
+    def test_partial_window_and_empty(self):
+        # 先頭の足だけが属する曜日は、process_dataと同様にNaNとして残る
+        data = make_hourly_closes(30, start='2024-01-07 23:00')
+        stats = IncrementalSeasonality.from_frame(data, timedelta(days=90))
+        assert_same_result(self, stats.result(), process_data(data.copy()))
+
+        weekday_return, hour_return, heatmap_data = IncrementalSeasonality().result()
+        self.assertTrue(weekday_return.empty and hour_return.empty and heatmap_data.empty)
+
+
+class TestBatchSeasonality(unittest.TestCase):
+    def test_matches_process_data_per_symbol_and_window(self):
+        closes = pd.concat([make_hourly_closes(24 * 40, seed=i)['close'].rename(f"SYM{i}") for i in range(3)], axis=1)
+        closes.iloc[:24 * 15, 2] = np.nan  # 途中から上場した銘柄
+        batch = batch_seasonality(closes, windows=(10, 30, 365))
+
+        self.assertEqual(batch.mean.shape, (3, 3, 7, 24))
+        for window in (10, 30, 365):
+            in_window = closes[closes.index > closes.index[-1] - timedelta(days=window)]
+            for symbol in closes.columns:
+                expected = process_data(in_window[[symbol]].rename(columns={symbol: 'close'}).dropna())
+                assert_same_result(self, batch.result(symbol, window), expected)
+
+    def test_empty_input(self):
+        batch = batch_seasonality(pd.DataFrame(columns=['A'], dtype=float, index=pd.DatetimeIndex([])), windows=(30,))
+        self.assertTrue(batch.result('A', 30)[2].empty)
+
+
+class TestSeasonalityStats(unittest.TestCase):
+    def test_statistics_match_pandas(self):
+        data = make_hourly_closes(24 * 7 * 60, seed=2)
+        stats = process_data_extended(data)
+        frame = data.assign(ret=data['close'].pct_change(), weekday=data.index.weekday, hour=data.index.hour)
+        grouped = frame.groupby(['weekday', 'hour'])['ret']
+        table = stats.table(('count', 'mean', 'std', 'win_rate', 't_stat', 'median', 'q90'))
+
+        np.testing.assert_allclose(table['count'], grouped.count())
+        np.testing.assert_allclose(table['mean'], grouped.mean() * 100)
+        np.testing.assert_allclose(table['std'], grouped.std() * 100)
+        np.testing.assert_allclose(table['win_rate'], grouped.apply(lambda r: (r > 0).sum() / r.count()) * 100)
+        np.testing.assert_allclose(table['t_stat'], grouped.mean() / (grouped.std() / np.sqrt(grouped.count())))
+        # 近似分位点の誤差はビン幅と標本1つ分程度に収まる
+        bin_width = 2 * 0.05 / 2000 * 100
+        np.testing.assert_allclose(table['median'], grouped.median() * 100, atol=bin_width + 0.05)
+        np.testing.assert_allclose(table['q90'], grouped.quantile(0.9) * 100, atol=bin_width + 0.1)
+        pd.testing.assert_frame_equal(stats.heatmap('mean').loc[process_data(data.copy())[2].index],
+                                      process_data(data.copy())[2])
+
+    def test_merge_equals_single_pass(self):
+        data = make_hourly_closes(24 * 20, seed=3)
+        returns = data['close'].pct_change()
+        whole = SeasonalityStats().add_returns(data.index, returns)
+        merged = SeasonalityStats().add_returns(data.index[:100], returns[:100])
+        merged.merge(SeasonalityStats().add_returns(data.index[100:], returns[100:]))
+        for name in ('count', 'mean', 'std', 'median'):
+            np.testing.assert_allclose(merged.stat(name), whole.stat(name))
+        with self.assertRaises(ValueError):
+            merged.merge(SeasonalityStats(quantile_bins=10))
+        with self.assertRaises(ValueError):
+            whole.stat('kurtosis')
+
+
+class TestChunkedSeasonality(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = KlineStore(os.path.join(self.tmp.name, 'klines.sqlite'))
+        self.data = make_hourly_closes(24 * 7 * 8, seed=4)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def append(self, frame):
+        open_times = frame.index.asi8 // 10 ** 6
+        self.store.append('BTCUSDT', '1h', [[t, c, c, c, c, 1, t + 3599999, 0, 0, 0, 0, '0']
+                                             for t, c in zip(open_times, frame['close'])])
+
+    def assert_same_stats(self, actual, expected):
+        for name in ('count', 'mean', 'std', 'win_rate', 'median'):
+            np.testing.assert_allclose(actual.stat(name), expected.stat(name))
+
+    def test_chunks_match_single_pass(self):
+        self.append(self.data)
+        seasonality = ChunkedSeasonality('BTCUSDT', '1h')
+        self.assertEqual(seasonality.update(self.store, chunk_rows=100), len(self.data))
+        self.assert_same_stats(seasonality.stats, process_data_extended(self.data))
+
+    def test_resume_after_new_data(self):
+        half = len(self.data) // 2
+        self.append(self.data.iloc[:half])
+        seasonality = ChunkedSeasonality('BTCUSDT', '1h')
+        seasonality.update(self.store, chunk_rows=250)
+        path = os.path.join(self.tmp.name, 'seasonality.npz')
+        seasonality.save(path)
+
+        self.append(self.data.iloc[half:])
+        resumed = ChunkedSeasonality.load(path)
+        self.assertEqual(resumed.update(self.store, chunk_rows=250), len(self.data) - half)
+        self.assertEqual(resumed.update(self.store), 0)
+        self.assert_same_stats(resumed.stats, process_data_extended(self.data))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from datetime import date
+import tempfile
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from depth_backfill import backfill_depth, load_manifest
+
+
+def fake_process_day(symbol, day, data_type, output_dir, api_key, secret_key, base_url):
+    # 呼び出し回数をファイルで記録（ワーカープロセスから親に伝えるため）
+    with open(os.path.join(output_dir, f"calls_{symbol}_{day}"), 'a') as f:
+        f.write('x')
+    if day == date(2024, 1, 2) and not os.path.exists(os.path.join(output_dir, 'recovered')):
+        raise RuntimeError("download failed")
+    path = os.path.join(output_dir, f"{symbol}_{day}.csv")
+    with open(path, 'w') as f:
+        f.write("interval_start,depth_ratio\n")
+    return {'path': path, 'rows': 0}
+
+
+class TestDepthBackfill(unittest.TestCase):
+    def calls(self, output_dir, symbol, day):
+        path = os.path.join(output_dir, f"calls_{symbol}_{day}")
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            return len(f.read())
+
+    def test_backfill_resumes_from_manifest(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            kwargs = dict(output_dir=tmp, max_workers=2, process_day_func=fake_process_day)
+            manifest = backfill_depth(['BTCUSDT', 'ETHUSDT'], date(2024, 1, 1), date(2024, 1, 3), **kwargs)
+
+            self.assertEqual(len(manifest), 6)
+            self.assertEqual(manifest['BTCUSDT/2024-01-02']['status'], 'failed')
+            self.assertEqual(manifest['BTCUSDT/2024-01-01']['status'], 'done')
+            self.assertEqual(load_manifest(os.path.join(tmp, 'manifest.json')), manifest)
+
+            # 再実行では失敗した日だけを処理する
+            open(os.path.join(tmp, 'recovered'), 'w').close()
+            manifest = backfill_depth(['BTCUSDT', 'ETHUSDT'], date(2024, 1, 1), date(2024, 1, 3), **kwargs)
+
+            self.assertTrue(all(entry['status'] == 'done' for entry in manifest.values()))
+            self.assertEqual(self.calls(tmp, 'BTCUSDT', date(2024, 1, 1)), 1)
+            self.assertEqual(self.calls(tmp, 'BTCUSDT', date(2024, 1, 2)), 2)
+            self.assertEqual(self.calls(tmp, 'ETHUSDT', date(2024, 1, 3)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+import pandas as pd
+import numpy as np
+from datetime import datetime, timedelta
+import tempfile
+import time
+from unittest import mock
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from depth_cache import DepthCache, ASK, BID
+from calculate_depth import process_large_file, iter_depth_chunks
+from test_calculate_depth import make_depth_data, make_close_prices, write_depth_tarball
+
+
+class TestDepthCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.start_time = pd.Timestamp(datetime(2024, 1, 1), tz='UTC')
+        self.end_time = self.start_time + timedelta(hours=3)
+        self.data = make_depth_data(self.start_time, hours=3, rows_per_interval=100)
+        self.archive = os.path.join(self.tmp.name, 'depth.tar.gz')
+        write_depth_tarball(self.archive, [self.data])
+        self.cache = DepthCache(os.path.join(self.tmp.name, 'cache'))
+        self.key = ('BTCUSDT', self.start_time.date(), 'S_DEPTH')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_and_memory_map_partitions(self):
+        self.assertFalse(self.cache.exists(*self.key))
+        rows = self.cache.write(*self.key, iter_depth_chunks(self.archive, chunksize=700))
+
+        self.assertEqual(rows, len(self.data))
+        self.assertTrue(self.cache.exists(*self.key))
+        parts = list(self.cache.partitions(*self.key))
+        self.assertEqual(len(parts), 3)  # 3時間分のパーティション
+        self.assertIsInstance(parts[0]['price'], np.memmap)
+        self.assertEqual(parts[0]['price'].dtype, np.float32)
+        self.assertEqual(parts[0]['side'].dtype, np.int8)
+
+        timestamps = np.concatenate([p['timestamp'] for p in parts])
+        sides = np.concatenate([p['side'] for p in parts])
+        np.testing.assert_array_equal(np.sort(timestamps), self.data['timestamp'].values.view('int64') // 10**6)
+        self.assertEqual((sides == ASK).sum(), (self.data['side'] == 'a').sum())
+        self.assertEqual((sides == BID).sum(), (self.data['side'] == 'b').sum())
+
+        # 範囲指定で必要な時間帯だけを読み込む
+        hour = timedelta(hours=1)
+        self.assertEqual(len(list(self.cache.partitions(*self.key, self.start_time + hour, self.end_time))), 2)
+
+    def test_evicts_least_recently_used_days(self):
+        data = make_depth_data(self.start_time, hours=1, rows_per_interval=10)
+        cache = DepthCache(os.path.join(self.tmp.name, 'lru'))
+        days = [('BTCUSDT', self.start_time.date() + timedelta(days=i), 'S_DEPTH') for i in range(3)]
+
+        def write(key):
+            shifted = data.assign(timestamp=data['timestamp'] + (key[1] - self.start_time.date()))
+            archive = os.path.join(self.tmp.name, f"{key[1]}.tar.gz")
+            write_depth_tarball(archive, [shifted])
+            cache.write(*key, iter_depth_chunks(archive))
+
+        write(days[0])
+        day_bytes = cache.total_bytes()
+        cache.max_bytes = int(day_bytes * 2.5)
+        time.sleep(0.01)
+        write(days[1])
+        time.sleep(0.01)
+        cache.partition_names(*days[0])  # day0を最近使ったことにする
+        time.sleep(0.01)
+        write(days[2])  # 容量超過でday1が削除される
+
+        self.assertEqual([cache.exists(*key) for key in days], [True, False, True])
+        self.assertLessEqual(cache.total_bytes(), cache.max_bytes)
+
+    def test_process_large_file_reuses_cache(self):
+        interval_starts = pd.date_range(start=self.start_time, end=self.end_time, freq='5T')
+        close_prices = make_close_prices(interval_starts)
+        kwargs = dict(
+            start_time=self.start_time,
+            end_time=self.end_time,
+            get_close_prices_func=lambda timestamps: close_prices,
+        )
+
+        uncached = process_large_file(self.archive, **kwargs)
+        # 初回はアーカイブを一度だけ読み、キャッシュを読み直さずに集計する
+        with mock.patch.object(self.cache, 'partitions', side_effect=AssertionError):
+            first = process_large_file(self.archive, cache=self.cache, cache_key=self.key, **kwargs)
+        os.remove(self.archive)
+        second = process_large_file(None, cache=self.cache, cache_key=self.key, **kwargs)
+
+        pd.testing.assert_frame_equal(first, second)
+        pd.testing.assert_frame_equal(first, uncached)
+
+    def test_process_large_file_in_parallel_shards(self):
+        interval_starts = pd.date_range(start=self.start_time, end=self.end_time, freq='5T')
+        close_prices = make_close_prices(interval_starts)
+        kwargs = dict(
+            start_time=self.start_time,
+            end_time=self.end_time,
+            get_close_prices_func=lambda timestamps: close_prices,
+        )
+
+        sequential = process_large_file(self.archive, cache=self.cache, cache_key=self.key, **kwargs)
+        parallel = process_large_file(self.archive, cache=self.cache, cache_key=self.key, workers=2, **kwargs)
+        # キャッシュなしではworkersを指定しても1コアで読み込み・集計する
+        uncached = process_large_file(self.archive, workers=3, **kwargs)
+
+        pd.testing.assert_frame_equal(parallel, sequential)
+        pd.testing.assert_frame_equal(uncached, sequential)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from datetime import datetime, timedelta
+import tempfile
+import time
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from download_cache import DownloadCache
+
+
+class TestDownloadCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = DownloadCache(os.path.join(self.tmp.name, 'cache'), max_bytes=2500)
+        self.start_time = datetime(2024, 1, 1)
+        self.downloads = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fake_downloader(self, url, directory):
+        # URLのサイズ分のダミーファイルを書き出す
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, 'BTCUSDT-S_DEPTH.tar.gz')
+        with open(path, 'wb') as f:
+            f.write(b'x' * int(url))
+        self.downloads.append(url)
+        return path
+
+    def fetch(self, day, size=1000):
+        start = self.start_time + timedelta(days=day)
+        return self.cache.fetch('BTCUSDT', 'S_DEPTH', start, start + timedelta(days=1),
+                                lambda: str(size), self.fake_downloader)
+
+    def test_fetch_hits_cache_on_repeat(self):
+        first = self.fetch(0)
+        second = self.fetch(0)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.downloads), 1)
+        self.assertTrue(first.endswith('.tar.gz'))
+        self.assertIsNone(self.cache.get('ETHUSDT', 'S_DEPTH', self.start_time, self.start_time + timedelta(days=1)))
+
+    def test_evicts_least_recently_used(self):
+        day0 = self.fetch(0)
+        time.sleep(0.01)
+        self.fetch(1)
+        time.sleep(0.01)
+        self.fetch(0)  # day0を最近使ったことにする
+        time.sleep(0.01)
+        self.fetch(2)  # 容量超過でday1が削除される
+
+        self.assertTrue(os.path.exists(day0))
+        self.assertLessEqual(self.cache.total_bytes(), 2500)
+        self.fetch(1)
+        self.assertEqual(len(self.downloads), 4)
+
+    def test_invalid_file_is_downloaded_again(self):
+        path = self.fetch(0)
+        with open(path, 'wb') as f:
+            f.write(b'truncated')
+
+        self.assertIsNone(self.cache.get('BTCUSDT', 'S_DEPTH', self.start_time, self.start_time + timedelta(days=1)))
+        self.fetch(0)
+        self.assertEqual(len(self.downloads), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import unittest
+import pandas as pd
+from datetime import datetime, timedelta
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import threading
+import tempfile
+import hashlib
+import re
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from get_binance_orderbook_data import download_file, download_file_ranged, open_download_stream
+from calculate_depth import process_large_file
+from depth_cache import DepthCache
+from test_calculate_depth import make_depth_data, make_close_prices, write_depth_tarball
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class RangeHandler(QuietHandler):
+    # Rangeリクエスト（bytes=a-b）に対応し、送信したバイト数を記録する
+    bytes_sent = 0
+
+    def do_GET(self):
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        path = self.translate_path(self.path)
+        if not match or not os.path.isfile(path):
+            return super().do_GET()
+        with open(path, 'rb') as f:
+            data = f.read()
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(data) - 1
+        body = data[start:end + 1]
+        self.send_response(206)
+        self.send_header('Content-Range', f"bytes {start}-{end}/{len(data)}")
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', f'"{hashlib.md5(data).hexdigest()}"')
+        self.end_headers()
+        self.wfile.write(body)
+        type(self).bytes_sent += len(body)
+
+
+class LocalArchiveServer:
+    # テスト用の合成アーカイブをローカルHTTPサーバーで配信
+    def __init__(self, directory, handler=QuietHandler):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=directory))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/{name}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestOrderbookDownload(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.serve_dir = os.path.join(self.tmp.name, 'serve')
+        os.makedirs(self.serve_dir)
+        self.start_time = pd.Timestamp(datetime(2024, 1, 1), tz='UTC')
+        self.end_time = self.start_time + timedelta(hours=2)
+        self.data = make_depth_data(self.start_time, hours=2, rows_per_interval=200)
+        write_depth_tarball(os.path.join(self.serve_dir, 'depth.tar.gz'), [self.data.iloc[:3000], self.data.iloc[3000:]])
+        interval_starts = pd.date_range(start=self.start_time, end=self.end_time, freq='5T')
+        close_prices = make_close_prices(interval_starts)
+        self.kwargs = dict(
+            start_time=self.start_time,
+            end_time=self.end_time,
+            get_close_prices_func=lambda timestamps: close_prices,
+            chunksize=1000
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_stream_pipeline_matches_downloaded_file(self):
+        with LocalArchiveServer(self.serve_dir) as server:
+            url = server.url('depth.tar.gz?signature=abc')
+            file_path = download_file(url, directory=os.path.join(self.tmp.name, 'downloads'))
+            expected = process_large_file(file_path, **self.kwargs)
+
+            with open_download_stream(url) as source:
+                streamed = process_large_file(source, **self.kwargs)
+
+            # ストリームから直接キャッシュを作成することもできる
+            cache = DepthCache(os.path.join(self.tmp.name, 'cache'))
+            key = ('BTCUSDT', self.start_time.date(), 'S_DEPTH')
+            with open_download_stream(url) as source:
+                cached = process_large_file(source, cache=cache, cache_key=key, **self.kwargs)
+
+        self.assertEqual(os.path.basename(file_path), 'depth.tar.gz')
+        self.assertEqual(len(expected), 24)
+        pd.testing.assert_frame_equal(streamed, expected)
+        pd.testing.assert_frame_equal(cached, expected)
+        self.assertTrue(cache.exists(*key))
+
+    def test_stream_reports_progress(self):
+        archive = os.path.join(self.serve_dir, 'depth.tar.gz')
+        progress = []
+        with LocalArchiveServer(self.serve_dir) as server:
+            url = server.url('depth.tar.gz?signature=abc')
+            with open_download_stream(url, progress_callback=lambda done, total: progress.append((done, total))) as source:
+                streamed = process_large_file(source, **self.kwargs)
+
+        self.assertEqual(len(streamed), 24)
+        self.assertTrue(progress)
+        self.assertEqual(progress[-1], (os.path.getsize(archive), os.path.getsize(archive)))
+
+    def test_ranged_download_in_parallel_segments(self):
+        archive = os.path.join(self.serve_dir, 'depth.tar.gz')
+        with open(archive, 'rb') as f:
+            content = f.read()
+        progress = []
+        with LocalArchiveServer(self.serve_dir, handler=RangeHandler) as server:
+            file_path = download_file_ranged(
+                server.url('depth.tar.gz?signature=abc'),
+                directory=os.path.join(self.tmp.name, 'downloads'),
+                segments=3,
+                chunk_size=1024,
+                progress_callback=lambda done, total: progress.append((done, total)),
+                sha256=hashlib.sha256(content).hexdigest()
+            )
+
+        with open(file_path, 'rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(progress[-1], (len(content), len(content)))
+        self.assertEqual(os.listdir(os.path.dirname(file_path)), ['depth.tar.gz'])
+
+    def test_ranged_download_resumes_partial_segments(self):
+        with open(os.path.join(self.serve_dir, 'depth.tar.gz'), 'rb') as f:
+            content = f.read()
+        download_dir = os.path.join(self.tmp.name, 'downloads')
+        os.makedirs(download_dir)
+        # 前回の中断で、1つ目のセグメントの途中までが保存されている状態
+        already = len(content) // 4
+        with open(os.path.join(download_dir, 'depth.tar.gz.part0'), 'wb') as f:
+            f.write(content[:already])
+
+        RangeHandler.bytes_sent = 0
+        with LocalArchiveServer(self.serve_dir, handler=RangeHandler) as server:
+            file_path = download_file_ranged(server.url('depth.tar.gz'), directory=download_dir, segments=2)
+
+        with open(file_path, 'rb') as f:
+            self.assertEqual(f.read(), content)
+        # 1バイトの事前確認と残りの部分だけを取得している
+        self.assertEqual(RangeHandler.bytes_sent, 1 + len(content) - already)
+
+    def test_ranged_download_rejects_checksum_mismatch(self):
+        with LocalArchiveServer(self.serve_dir, handler=RangeHandler) as server:
+            with self.assertRaises(IOError):
+                download_file_ranged(
+                    server.url('depth.tar.gz'),
+                    directory=os.path.join(self.tmp.name, 'downloads'),
+                    sha256='0' * 64
+                )
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'downloads', 'depth.tar.gz')))
+
+    def test_existing_file_is_verified(self):
+        with open(os.path.join(self.serve_dir, 'depth.tar.gz'), 'rb') as f:
+            content = f.read()
+        download_dir = os.path.join(self.tmp.name, 'downloads')
+        os.makedirs(download_dir)
+        # サイズは一致するが中身が壊れているファイル
+        with open(os.path.join(download_dir, 'depth.tar.gz'), 'wb') as f:
+            f.write(b'x' * len(content))
+
+        with LocalArchiveServer(self.serve_dir, handler=RangeHandler) as server:
+            url = server.url('depth.tar.gz')
+            file_path = download_file_ranged(url, directory=download_dir, sha256=hashlib.sha256(content).hexdigest())
+            with open(file_path, 'rb') as f:
+                self.assertEqual(f.read(), content)
+            # 指定したsha256は既存のファイルにも適用される
+            with self.assertRaises(IOError):
+                download_file_ranged(url, directory=download_dir, sha256='0' * 64)
+
+if __name__ == '__main__':
+    unittest.main()
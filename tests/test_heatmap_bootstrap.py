@@ -0,0 +1,50 @@
+import unittest
+import time
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from heatmap_bootstrap import bootstrap_heatmap
+from calculate_heatmap import process_data
+
+
+def make_seasonal_closes(days=90, seed=0, effect=0.01):
+    # 月曜10時だけ+1%の収益率を持つ合成データ
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2024-01-01', periods=days * 24, freq='H', name='timestamp')
+    returns = rng.normal(0, 0.002, len(index))
+    returns[(index.weekday == 0) & (index.hour == 10)] += effect
+    return pd.DataFrame({'close': 30000 * np.cumprod(1 + returns)}, index=index)
+
+
+class TestBootstrapHeatmap(unittest.TestCase):
+    def test_detects_seasonal_cell(self):
+        data = make_seasonal_closes()
+        start = time.perf_counter()
+        result = bootstrap_heatmap(data, n_resamples=2000, seed=1)
+        self.assertLess(time.perf_counter() - start, 10)
+
+        _, _, heatmap_data = process_data(data.copy())
+        pd.testing.assert_frame_equal(result['mean'], heatmap_data)
+        self.assertLess(result['p_value'].loc[0, 10], 0.01)
+        self.assertGreater(result['ci_lower'].loc[0, 10], 0)
+        # 効果のないセルのp値はほぼ一様に分布する
+        others = result['p_value'].drop(index=0).values.ravel()
+        self.assertGreater(np.median(others), 0.2)
+        self.assertTrue((result['ci_lower'] <= result['mean']).values.all())
+        self.assertTrue((result['mean'] <= result['ci_upper']).values.all())
+
+    def test_same_seed_same_result_with_workers(self):
+        data = make_seasonal_closes(days=20)
+        single = bootstrap_heatmap(data, n_resamples=300, batch_size=100, seed=7)
+        pooled = bootstrap_heatmap(data, n_resamples=300, batch_size=100, seed=7, workers=2)
+        for name in single:
+            pd.testing.assert_frame_equal(single[name], pooled[name])
+
+    def test_empty_data(self):
+        data = pd.DataFrame({'close': [1.0]}, index=pd.DatetimeIndex(['2024-01-01']))
+        self.assertTrue(bootstrap_heatmap(data, n_resamples=10)['p_value'].isna().values.all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import pandas as pd
+import numpy as np
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from kline_decoder import decode_klines, klines_to_frame, klines_to_close_series
+
+
+class TestKlineDecoder(unittest.TestCase):
+    def setUp(self):
+        self.klines = [
+            [1625097600000, "35000", "36000", "34000", "35500", "100", 1625097899999, "3550000", 1000, "50", "1775000", "0"],
+            [1625097900000, "35500", "37000", "35000", "36500.5", "120", 1625098199999, "4380000", 1200, "60", "2190000", "0"]
+        ]
+
+    def test_decode_klines(self):
+        arrays = decode_klines(self.klines, columns=('timestamp', 'close', 'number_of_trades'))
+
+        self.assertEqual(set(arrays), {'timestamp', 'close', 'number_of_trades'})
+        self.assertEqual(arrays['timestamp'].dtype, np.int64)
+        self.assertEqual(arrays['close'].dtype, np.float64)
+        np.testing.assert_array_equal(arrays['close'], [35500.0, 36500.5])
+        np.testing.assert_array_equal(arrays['number_of_trades'], [1000, 1200])
+
+    def test_klines_to_frame(self):
+        frame = klines_to_frame(self.klines, columns=('open', 'close'))
+        self.assertEqual(list(frame.columns), ['open', 'close'])
+        self.assertEqual(frame.index.name, 'timestamp')
+        self.assertEqual(frame.index[0], pd.Timestamp('2021-07-01 00:00:00'))
+
+        flat = klines_to_frame(self.klines, columns=('close',), set_index=False)
+        self.assertEqual(list(flat.columns), ['timestamp', 'close'])
+
+        empty = klines_to_frame([], columns=('close',))
+        self.assertTrue(empty.empty)
+        self.assertEqual(empty['close'].dtype, np.float64)
+
+    def test_klines_to_close_series(self):
+        closes = klines_to_close_series(self.klines)
+        self.assertEqual(closes.get(pd.Timestamp('2021-07-01 00:05:00', tz='UTC')), 36500.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import threading
+import json
+import time
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from kline_fetcher import fetch_klines_concurrent, kline_windows, WeightThrottle
+
+MINUTE_MS = 60 * 1000
+
+
+class FakeKlineHandler(BaseHTTPRequestHandler):
+    # /api/v3/klines の代わりに合成データを返すローカルサーバー
+    lock = threading.Lock()
+    requests_seen = []
+    active = 0
+    max_active = 0
+    rate_limit_once = False
+
+    def do_GET(self):
+        cls = type(self)
+        query = parse_qs(urlparse(self.path).query)
+        with cls.lock:
+            cls.requests_seen.append(query)
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+            rate_limited = cls.rate_limit_once
+            cls.rate_limit_once = False
+        try:
+            time.sleep(0.05)
+            if rate_limited:
+                self.send_response(429)
+                self.send_header('Retry-After', '0')
+                self.end_headers()
+                return
+            start, end = int(query['startTime'][0]), int(query['endTime'][0])
+            limit = int(query['limit'][0])
+            first = -(-start // MINUTE_MS) * MINUTE_MS
+            klines = [[t, "1", "2", "0.5", str(t // MINUTE_MS), "10", t + MINUTE_MS - 1, "10", 5, "5", "5", "0"]
+                      for t in range(first, end + 1, MINUTE_MS)][:limit]
+            body = json.dumps(klines).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('X-MBX-USED-WEIGHT-1M', str(2 * len(cls.requests_seen)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestKlineFetcher(unittest.TestCase):
+    def setUp(self):
+        FakeKlineHandler.requests_seen = []
+        FakeKlineHandler.max_active = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeKlineHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_kline_windows(self):
+        windows = kline_windows(0, 2500 * MINUTE_MS - 1, MINUTE_MS, limit=1000)
+        self.assertEqual(windows, [
+            (0, 1000 * MINUTE_MS - 1),
+            (1000 * MINUTE_MS, 2000 * MINUTE_MS - 1),
+            (2000 * MINUTE_MS, 2500 * MINUTE_MS - 1),
+        ])
+
+    def test_fetch_klines_concurrent_reassembles_pages(self):
+        start = 1_700_000_000_000 // MINUTE_MS * MINUTE_MS
+        end = start + 5500 * MINUTE_MS
+        FakeKlineHandler.rate_limit_once = True
+        klines = fetch_klines_concurrent('BTCUSDT', '1m', start, end, base_url=self.base_url, max_workers=4)
+
+        open_times = [k[0] for k in klines]
+        self.assertEqual(open_times, list(range(start, end + 1, MINUTE_MS)))
+        self.assertEqual(len(FakeKlineHandler.requests_seen), 7)  # 6ページ + 429の再試行
+        self.assertGreater(FakeKlineHandler.max_active, 1)
+        self.assertLessEqual(FakeKlineHandler.max_active, 4)
+
+    def test_weight_throttle_waits_for_next_minute(self):
+        now = [120.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        throttle = WeightThrottle(weight_limit=10, clock=lambda: now[0], sleep=sleep)
+        for _ in range(5):
+            throttle.acquire(2)
+        self.assertEqual(sleeps, [])
+
+        throttle.acquire(2)
+        self.assertEqual(sleeps, [60.0])
+
+        # サーバーが報告した使用量を反映する
+        throttle.update(10)
+        throttle.acquire(2)
+        self.assertEqual(len(sleeps), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+from datetime import datetime, timedelta
+import tempfile
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from kline_resampler import KlineResampler
+from kline_store import KlineStore, to_milliseconds
+
+MINUTE_MS = 60 * 1000
+
+
+def make_minute_kline(open_ms):
+    # 分ごとに値の異なる1分足
+    i = open_ms // MINUTE_MS
+    price = 30000 + (i * 37) % 500
+    return [open_ms, str(price), str(price + (i % 7)), str(price - (i % 5)), str(price + (i % 3)), str(1 + i % 11),
+            open_ms + MINUTE_MS - 1, "0", 10, "0", "0", "0"]
+
+
+class FakeMinuteFetcher:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, symbol, start_ms, end_ms):
+        self.calls.append((start_ms, end_ms))
+        first = -(-start_ms // MINUTE_MS) * MINUTE_MS
+        return [make_minute_kline(t) for t in range(first, end_ms + 1, MINUTE_MS)]
+
+
+class FakeIntervalFetcher:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, symbol, interval, start_ms, end_ms):
+        # 1時間足の終値は、その時間の最後の1分足の終値
+        self.calls.append((symbol, interval, start_ms, end_ms))
+        hour_ms = 60 * MINUTE_MS
+        first = -(-start_ms // hour_ms) * hour_ms
+        return [[t, "0", "0", "0", make_minute_kline(t + hour_ms - MINUTE_MS)[4], "0", t + hour_ms - 1, "0", 0, "0", "0", "0"]
+                for t in range(first, end_ms + 1, hour_ms)]
+
+
+def direct_ohlcv(start_ms, end_ms, freq):
+    # pandasで直接集計した期待値
+    klines = FakeMinuteFetcher()('BTCUSDT', start_ms, end_ms)
+    frame = pd.DataFrame([k[:6] for k in klines], columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    frame = frame.astype({column: float for column in ['open', 'high', 'low', 'close', 'volume']})
+    frame.index = pd.to_datetime(frame.pop('timestamp'), unit='ms')
+    return frame.resample(freq).agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+
+
+class TestKlineResampler(unittest.TestCase):
+    def setUp(self):
+        self.fetch = FakeMinuteFetcher()
+        self.resampler = KlineResampler(fetch_func=self.fetch)
+        self.start = datetime(2024, 1, 1)
+
+    def test_resampled_intervals_match_direct_aggregation(self):
+        end = self.start + timedelta(days=2) - timedelta(minutes=1)
+        for interval, freq in [('5m', '5T'), ('1h', 'H'), ('4h', '4H'), ('1d', 'D')]:
+            result = self.resampler.get_ohlcv('BTCUSDT', interval, self.start, end)
+            expected = direct_ohlcv(to_milliseconds(self.start), to_milliseconds(end), freq)
+            np.testing.assert_allclose(result.values, expected.values)
+            self.assertTrue((result.index == expected.index).all())
+        self.assertEqual(len(self.fetch.calls), 1)  # 1分足の取得は1回だけ
+
+    def test_extends_head_and_tail_and_memoizes(self):
+        self.resampler.get_ohlcv('BTCUSDT', '1h', self.start, self.start + timedelta(hours=5))
+        first = self.resampler.get_ohlcv('BTCUSDT', '1h', self.start, self.start + timedelta(hours=5))
+        self.assertEqual(len(self.fetch.calls), 1)
+
+        extended = self.resampler.get_ohlcv('BTCUSDT', '1h', self.start - timedelta(hours=2),
+                                            self.start + timedelta(hours=8))
+        self.assertEqual(len(self.fetch.calls), 3)
+        head, tail = self.fetch.calls[1:]
+        self.assertLess(head[1], to_milliseconds(self.start))
+        self.assertGreater(tail[0], to_milliseconds(self.start + timedelta(hours=5)))
+        self.assertEqual(len(extended), 11)
+        self.assertFalse(extended.index.has_duplicates)
+        pd.testing.assert_frame_equal(extended.loc[first.index], first)
+
+    def test_partial_leading_bucket_is_excluded(self):
+        result = self.resampler.get_ohlcv('BTCUSDT', '1h', self.start + timedelta(minutes=30),
+                                          self.start + timedelta(hours=3))
+        self.assertEqual(list(result.index), [self.start + timedelta(hours=h) for h in (1, 2, 3)])
+
+    def test_forming_candle_is_refetched(self):
+        # 時計を進めると、形成中だった1時間足の1分足を取り直す
+        now = [to_milliseconds(self.start + timedelta(hours=10, minutes=5, seconds=30)) / 1000]
+        fetch = FakeMinuteFetcher()
+
+        def fetch_until_now(symbol, start_ms, end_ms):
+            return fetch(symbol, start_ms, min(end_ms, int(now[0] * 1000)))
+
+        resampler = KlineResampler(fetch_func=fetch_until_now, clock=lambda: now[0])
+        hour = self.start + timedelta(hours=10)
+        early = resampler.get_ohlcv('BTCUSDT', '1h', hour, hour)
+        now[0] += 35 * 60
+        later = resampler.get_ohlcv('BTCUSDT', '1h', hour, hour)
+        self.assertEqual(len(fetch.calls), 2)
+        expected = direct_ohlcv(to_milliseconds(hour), to_milliseconds(hour + timedelta(minutes=40)), 'H')
+        self.assertAlmostEqual(later['volume'].iloc[0], expected['volume'].iloc[0])
+        self.assertLess(early['volume'].iloc[0], later['volume'].iloc[0])
+
+    def test_close_prices_keyed_by_utc(self):
+        timestamps = pd.date_range(self.start, periods=6, freq='5T', tz='UTC')
+        closes = self.resampler.get_close_prices('BTCUSDT', timestamps)
+        self.assertEqual(list(closes.index), list(timestamps))
+        expected = direct_ohlcv(to_milliseconds(self.start), to_milliseconds(timestamps.max()) + 5 * MINUTE_MS - 1, '5T')
+        np.testing.assert_allclose(closes.values, expected['close'].values)
+
+    def test_close_matrix(self):
+        matrix = self.resampler.get_close_matrix(['BTCUSDT', 'ETHUSDT'], '1h', self.start, self.start + timedelta(hours=5))
+        self.assertEqual(list(matrix.columns), ['BTCUSDT', 'ETHUSDT'])
+        self.assertEqual(matrix.shape, (6, 2))
+
+    def test_long_close_matrix_skips_minute_base(self):
+        interval_fetch = FakeIntervalFetcher()
+        resampler = KlineResampler(fetch_func=self.fetch, interval_fetch_func=interval_fetch)
+        end = self.start + timedelta(days=30) - timedelta(hours=1)
+        matrix = resampler.get_close_matrix(['BTCUSDT', 'ETHUSDT'], '1h', self.start, end)
+
+        # 1分足は取得・保持せず、1時間足を直接取得する
+        self.assertEqual(self.fetch.calls, [])
+        self.assertEqual(resampler._base, {})
+        self.assertEqual([call[:2] for call in interval_fetch.calls], [('BTCUSDT', '1h'), ('ETHUSDT', '1h')])
+        expected = direct_ohlcv(to_milliseconds(self.start), to_milliseconds(end) + 60 * MINUTE_MS - 1, 'H')
+        self.assertEqual(matrix.shape, (30 * 24, 2))
+        self.assertTrue((matrix.index == expected.index).all())
+        np.testing.assert_allclose(matrix['BTCUSDT'].values, expected['close'].values)
+
+    def test_store_persists_base_series(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = KlineStore(os.path.join(tmp, 'klines.sqlite'))
+            KlineResampler(store=store, fetch_func=self.fetch).get_ohlcv('BTCUSDT', '1h', self.start,
+                                                                         self.start + timedelta(hours=3))
+            calls = len(self.fetch.calls)
+            # 新しいインスタンスでもストアから読み込み、APIは呼ばない
+            KlineResampler(store=store, fetch_func=self.fetch).get_ohlcv('BTCUSDT', '15m', self.start,
+                                                                         self.start + timedelta(hours=3))
+            self.assertEqual(len(self.fetch.calls), calls)
+            store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import MagicMock
+from datetime import datetime, timedelta
+import tempfile
+import time
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from kline_store import KlineStore, to_milliseconds
+from fetch_Kline_data import get_binance_data
+
+HOUR_MS = 3600 * 1000
+
+
+def make_kline(open_ms, interval_ms=HOUR_MS):
+    price = 30000 + (open_ms // interval_ms) % 1000
+    return [open_ms, str(price), str(price + 10), str(price - 10), str(price + 5), "100",
+            open_ms + interval_ms - 1, "3000000", 1000, "50", "1500000", "0"]
+
+
+def fake_historical_klines(symbol, interval, start_ms, end_ms):
+    # 形成中の足を含め、現在時刻までの1時間足を返す
+    now_ms = int(time.time() * 1000)
+    first = -(-start_ms // HOUR_MS) * HOUR_MS
+    return [make_kline(t) for t in range(first, min(end_ms, now_ms) + 1, HOUR_MS)]
+
+
+class TestKlineStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = KlineStore(os.path.join(self.tmp.name, 'klines.sqlite'))
+        self.client = MagicMock()
+        self.client.get_historical_klines.side_effect = fake_historical_klines
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_append_and_load(self):
+        start = to_milliseconds(datetime(2024, 1, 1))
+        klines = [make_kline(start + i * HOUR_MS) for i in range(5)]
+        self.store.append('BTCUSDT', '1h', klines)
+        self.store.append('BTCUSDT', '1h', klines[:2])  # 重複は無視される
+
+        self.assertEqual(self.store.time_range('BTCUSDT', '1h'), (start, start + 4 * HOUR_MS))
+        loaded = self.store.load('BTCUSDT', '1h', start + HOUR_MS, start + 3 * HOUR_MS)
+        self.assertEqual([k[0] for k in loaded], [start + i * HOUR_MS for i in (1, 2, 3)])
+        self.assertEqual(loaded[0][4], float(klines[1][4]))
+        self.assertIsNone(self.store.time_range('ETHUSDT', '1h'))
+
+    def test_iter_columns_in_chunks(self):
+        start = to_milliseconds(datetime(2024, 1, 1))
+        self.store.append('BTCUSDT', '1h', [make_kline(start + i * HOUR_MS) for i in range(10)])
+        chunks = list(self.store.iter_columns('BTCUSDT', '1h', start + HOUR_MS, None, ('close', 'number_of_trades'), 4))
+        self.assertEqual([len(c['open_time']) for c in chunks], [4, 4, 1])
+        self.assertEqual(chunks[0]['open_time'][0], start + HOUR_MS)
+        self.assertEqual(chunks[0]['number_of_trades'].dtype, 'int64')
+        self.assertEqual(chunks[-1]['close'][-1], float(make_kline(start + 9 * HOUR_MS)[4]))
+        with self.assertRaises(ValueError):
+            next(self.store.iter_columns('BTCUSDT', '1h', columns=('close; DROP TABLE klines',)))
+
+    def test_get_binance_data_fetches_only_missing_tail(self):
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(days=10)
+        first = get_binance_data(self.client, 'BTCUSDT', '1h', start_time, end_time, store=self.store)
+
+        # 1時間後の再取得では末尾の不足分だけをリクエストする
+        second = get_binance_data(self.client, 'BTCUSDT', '1h', start_time + timedelta(hours=1),
+                                  end_time + timedelta(hours=1), store=self.store)
+
+        self.assertEqual(self.client.get_historical_klines.call_count, 2)
+        _, _, tail_start, _ = self.client.get_historical_klines.call_args[0]
+        self.assertGreaterEqual(tail_start, to_milliseconds(end_time) - HOUR_MS)
+        self.assertEqual(first.index.name, 'timestamp')
+        self.assertEqual(first['close'].dtype, float)
+        self.assertEqual(len(first), 240)
+        self.assertEqual(first.index[-1], second.index[-1])  # 形成中の足も結果に含まれる
+        self.assertTrue(second.index.is_monotonic_increasing)
+        self.assertFalse(second.index.has_duplicates)
+
+if __name__ == '__main__':
+    unittest.main()
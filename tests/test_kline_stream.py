@@ -0,0 +1,170 @@
+import unittest
+import asyncio
+import threading
+import json
+import socket
+import numpy as np
+import pandas as pd
+from aiohttp import web
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from kline_stream import KlineBuffer, KlineStream, parse_kline_message
+
+HOUR_MS = 3600 * 1000
+START_MS = 1704067200000  # 2024-01-01 00:00 UTC
+
+
+def kline_event(open_ms, close, closed, symbol='BTCUSDT', interval='1h'):
+    return {"stream": f"{symbol.lower()}@kline_{interval}",
+            "data": {"e": "kline", "s": symbol,
+                     "k": {"t": open_ms, "T": open_ms + HOUR_MS - 1, "s": symbol, "i": interval,
+                           "o": "100", "h": str(close + 1), "l": "99", "c": str(close), "v": "5", "x": closed}}}
+
+
+def frame_of(hours, forming_value=None):
+    # REST APIから取得した1時間足の代わり（終値は時間の番号、形成中の足はforming_value）
+    hours = list(hours)
+    closes = [float(h) for h in hours]
+    if forming_value is not None:
+        closes[-1] = forming_value
+    index = pd.to_datetime([START_MS + h * HOUR_MS for h in hours], unit='ms')
+    return pd.DataFrame({'open': 1.0, 'high': 2.0, 'low': 0.0, 'close': closes, 'volume': 1.0}, index=index)
+
+
+class LocalKlineServer:
+    # Binanceのkline WebSocketの代わりに、接続ごとに決められたメッセージを送るサーバー
+    def __init__(self, messages):
+        self.messages = messages
+        self.paths = []
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.release = None
+
+    async def handler(self, request):
+        self.paths.append(request.path_qs)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        for message in self.messages:
+            await ws.send_str(json.dumps(message))
+        await self.release.wait()
+        await ws.close()
+        return ws
+
+    def __enter__(self):
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        async def serve():
+            self.release = asyncio.Event()
+            app = web.Application()
+            app.router.add_get('/stream', self.handler)
+            self.runner = web.AppRunner(app)
+            await self.runner.setup()
+            await web.SockSite(self.runner, self.sock).start()
+            started.set()
+
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(serve(), self.loop)
+        started.wait(5)
+        return self
+
+    def __exit__(self, *exc):
+        self.loop.call_soon_threadsafe(self.release.set)
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+
+class TestKlineBuffer(unittest.TestCase):
+    def test_rolls_and_overwrites_forming_candle(self):
+        buffer = KlineBuffer(3)
+        for i in range(5):
+            self.assertTrue(buffer.update(START_MS + i * HOUR_MS, (1, 2, 0, i, 1), True))
+        self.assertFalse(buffer.update(START_MS + 5 * HOUR_MS, (1, 2, 0, 5, 1), False))
+        self.assertFalse(buffer.update(START_MS + 5 * HOUR_MS, (1, 2, 0, 6, 1), False))
+        self.assertFalse(buffer.update(START_MS, (1, 2, 0, -1, 1), True))  # 古い足は無視
+
+        open_times, values, closed = buffer.snapshot()
+        self.assertEqual(list(open_times), [START_MS + i * HOUR_MS for i in (3, 4, 5)])
+        self.assertEqual(list(values[:, 3]), [3, 4, 6])
+        self.assertEqual(list(closed), [True, True, False])
+        self.assertEqual(buffer.closed_count, 5)
+
+    def test_seed_keeps_streamed_candles(self):
+        buffer = KlineBuffer(4)
+        buffer.update(START_MS + 5 * HOUR_MS, (1, 2, 0, 50, 1), False)
+        history = np.array([[1, 2, 0, i, 1] for i in range(6)], dtype=float)
+        buffer.extend(START_MS + np.arange(6) * HOUR_MS, history)
+
+        open_times, values, closed = buffer.snapshot()
+        self.assertEqual(list(open_times), [START_MS + i * HOUR_MS for i in (2, 3, 4, 5)])
+        self.assertEqual(list(values[:, 3]), [2, 3, 4, 50])
+        self.assertEqual(closed[-1], False)
+        self.assertEqual(buffer.closed_count, 0)
+
+    def test_catch_up_closes_candles_from_rest(self):
+        stream = KlineStream([('BTCUSDT', '1h')], capacity=4)
+        stream.catch_up('BTCUSDT', '1h', frame_of(range(3), forming_value=20), now_ms=START_MS + 2 * HOUR_MS + 60000)
+        self.assertEqual(stream.closed_count('BTCUSDT', '1h'), 2)
+        # 形成中だった足が確定し、次の足が追加される
+        count = stream.catch_up('BTCUSDT', '1h', frame_of(range(2, 4)), now_ms=START_MS + 3 * HOUR_MS + 60000)
+        self.assertEqual(count, 3)
+        snapshot = stream.snapshot('BTCUSDT', '1h')
+        self.assertEqual(list(snapshot['closed']), [True, True, True, False])
+        self.assertEqual(snapshot['close'].iloc[2], 2)
+
+    def test_parse_ignores_other_events(self):
+        self.assertIsNone(parse_kline_message({"e": "trade"}))
+        self.assertEqual(parse_kline_message(kline_event(START_MS, 5, True))[:3], ('BTCUSDT', '1h', START_MS))
+
+
+class TestKlineStream(unittest.TestCase):
+    def test_stream_updates_buffer_and_signals_close(self):
+        messages = [kline_event(START_MS + 2 * HOUR_MS, 10, False),
+                    {"result": None, "id": 1},
+                    kline_event(START_MS + 2 * HOUR_MS, 11, True),
+                    kline_event(START_MS + 3 * HOUR_MS, 12, False),
+                    kline_event(START_MS, 1, True, symbol='ETHUSDT')]
+        with LocalKlineServer(messages) as server:
+            stream = KlineStream([('BTCUSDT', '1h')], capacity=10, base_url=f"http://127.0.0.1:{server.port}")
+            history = pd.DataFrame({'open': [1.0, 2.0], 'high': 3.0, 'low': 0.5, 'close': [1.5, 2.5], 'volume': 1.0},
+                                   index=pd.to_datetime([START_MS, START_MS + HOUR_MS], unit='ms'))
+            stream.seed('BTCUSDT', '1h', history)
+            stream.start()
+            try:
+                self.assertEqual(stream.wait_for_close('BTCUSDT', '1h', 0, timeout=5), 1)
+                deadline = 50
+                while len(stream.snapshot('BTCUSDT', '1h')) < 4 and deadline:
+                    stream.wait_for_close('BTCUSDT', '1h', 1, timeout=0.1)
+                    deadline -= 1
+                snapshot = stream.snapshot('BTCUSDT', '1h')
+            finally:
+                stream.stop()
+
+        self.assertEqual(server.paths, ['/stream?streams=btcusdt@kline_1h'])
+        self.assertEqual(list(snapshot['close']), [1.5, 2.5, 11.0, 12.0])
+        self.assertEqual(list(snapshot['closed']), [True, True, True, False])
+        self.assertEqual(snapshot.index[0], pd.Timestamp('2024-01-01'))
+
+    def test_malformed_message_does_not_stop_stream(self):
+        malformed = kline_event(START_MS, 10, False)
+        del malformed['data']['k']['c']
+        messages = [malformed, kline_event(START_MS, 11, True)]
+        with LocalKlineServer(messages) as server:
+            stream = KlineStream([('BTCUSDT', '1h')], capacity=10, base_url=f"http://127.0.0.1:{server.port}")
+            with self.assertLogs(level='WARNING') as logs:
+                stream.start()
+                try:
+                    closed = stream.wait_for_close('BTCUSDT', '1h', 0, timeout=5)
+                finally:
+                    stream.stop()
+
+        self.assertEqual(closed, 1)
+        self.assertIn('malformed kline message', logs.output[0])
+        self.assertEqual(list(stream.snapshot('BTCUSDT', '1h')['close']), [11.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import MagicMock
+import tempfile
+import requests
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from metadata_cache import MetadataCache
+
+URL = "https://api.binance.com/api/v3/exchangeInfo"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_session(*responses):
+    session = MagicMock()
+    session.get.side_effect = list(responses)
+    return session
+
+
+def make_response(status, payload=None, etag=None):
+    response = MagicMock()
+    response.status_code = status
+    response.json.return_value = payload
+    response.headers = {'ETag': etag} if etag else {}
+    if status >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(f"{status}")
+    return response
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'metadata.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_ttl_and_conditional_refresh(self):
+        cache = MetadataCache(clock=self.clock)
+        session = make_session(make_response(200, {'symbols': [1]}, etag='"v1"'), make_response(304))
+        self.assertEqual(cache.get_json(URL, ttl=60, session=session), {'symbols': [1]})
+        self.clock.now += 30
+        self.assertEqual(cache.get_json(URL, ttl=60, session=session), {'symbols': [1]})
+        self.assertEqual(session.get.call_count, 1)
+
+        # 期限切れ後はETag付きで再検証し、304なら値を使い続ける
+        self.clock.now += 31
+        self.assertEqual(cache.get_json(URL, ttl=60, session=session), {'symbols': [1]})
+        self.assertEqual(session.get.call_args[1]['headers'], {'If-None-Match': '"v1"'})
+        self.clock.now += 59
+        cache.get_json(URL, ttl=60, session=session)
+        self.assertEqual(session.get.call_count, 2)
+
+    def test_stale_value_served_when_refresh_fails(self):
+        cache = MetadataCache(max_stale=100, clock=self.clock)
+        session = make_session(make_response(200, [1]), make_response(500), make_response(500))
+        cache.get_json(URL, ttl=10, session=session)
+        self.clock.now += 50
+        self.assertEqual(cache.get_json(URL, ttl=10, session=session), [1])
+        self.clock.now += 100
+        with self.assertRaises(requests.HTTPError):
+            cache.get_json(URL, ttl=10, session=session)
+
+    def test_persisted_entries_warm_start(self):
+        cache = MetadataCache(self.path, clock=self.clock)
+        cache.get_json(URL, ttl=60, persist=True, session=make_session(make_response(200, {'symbols': []})))
+        cache.get_json("https://api.binance.com/api/v3/ticker/price", session=make_session(make_response(200, [])))
+
+        warm = MetadataCache(self.path, clock=self.clock)
+        session = make_session()
+        self.assertEqual(warm.get_json(URL, ttl=60, session=session), {'symbols': []})
+        session.get.assert_not_called()
+        self.assertEqual(list(warm._entries), [URL])  # 価格は保存しない
+
+if __name__ == '__main__':
+    unittest.main()
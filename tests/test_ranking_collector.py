@@ -0,0 +1,98 @@
+import unittest
+import asyncio
+import time
+from aiohttp import web
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.insert(0, os.path.dirname(__file__))
+from ranking_collector import collect_rankings, ranking_endpoints
+from test_volume_ranking import BINANCE_PAYLOADS, fake_bybit_get
+from metadata_cache import MetadataCache
+import bybit_top10
+
+DELAY = 0.2
+
+
+class StandInExchange:
+    # Binance・Bybitの全エンドポイントを1つのローカルサーバーで代替
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.active = 0
+        self.max_active = 0
+        self.paths = []
+
+    async def handle(self, request):
+        self.paths.append(request.path_qs)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(DELAY)
+            if request.path in self.failing:
+                return web.Response(status=451)
+            if request.path == bybit_top10.TICKERS_ENDPOINT:
+                payload = fake_bybit_get(None, params={'category': request.query['category']}).json()
+            else:
+                payload = next(v for url, v in BINANCE_PAYLOADS.items() if url.endswith(request.path))
+            return web.json_response(payload)
+        finally:
+            self.active -= 1
+
+    async def collect(self, calls=1, **kwargs):
+        app = web.Application()
+        app.router.add_get('/{tail:.*}', self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        local = f"http://127.0.0.1:{port}"
+        hosts = {origin: local for origin in ('https://api.binance.com', 'https://fapi.binance.com',
+                                              'https://dapi.binance.com', 'https://api.bybit.com')}
+        kwargs.setdefault('cache', MetadataCache())
+        try:
+            for _ in range(calls):
+                rankings = await collect_rankings(hosts=hosts, **kwargs)
+            return rankings
+        finally:
+            await runner.cleanup()
+
+
+class TestRankingCollector(unittest.TestCase):
+    def test_collects_all_rankings_concurrently(self):
+        exchange = StandInExchange()
+        start = time.perf_counter()
+        rankings = asyncio.run(exchange.collect(top_n=3, per_host_limit=8))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(exchange.paths), len(ranking_endpoints()))
+        self.assertEqual(exchange.max_active, len(ranking_endpoints()))
+        self.assertLess(elapsed, DELAY * 3)
+        self.assertEqual([r.symbol for r in rankings['binance_spot']], ['ETHBTC', 'USDTTRY', 'BTCUSDT'])
+        self.assertEqual([r.symbol for r in rankings['binance_futures']], ['BTCUSD_PERP', 'BTCUSDT', 'ETHUSD_PERP'])
+        self.assertEqual([r.symbol for r in rankings['bybit_perp']], ['BTCUSDT', 'BTCUSD'])
+        self.assertEqual(len(rankings['bybit_spot']), 3)
+
+    def test_failing_exchange_does_not_drop_other_rankings(self):
+        # Bybitとコイン建て先物が取得できない場合
+        exchange = StandInExchange(failing=(bybit_top10.TICKERS_ENDPOINT, '/dapi/v1/ticker/24hr'))
+        with self.assertLogs(level='ERROR'):
+            rankings = asyncio.run(exchange.collect(top_n=3))
+        self.assertEqual([r.symbol for r in rankings['binance_spot']], ['ETHBTC', 'USDTTRY', 'BTCUSDT'])
+        self.assertEqual([r.symbol for r in rankings['binance_futures']], ['BTCUSDT'])
+        self.assertEqual(rankings['bybit_spot'], [])
+        self.assertEqual(rankings['bybit_perp'], [])
+
+    def test_cached_endpoints_are_not_refetched(self):
+        exchange = StandInExchange()
+        asyncio.run(exchange.collect(calls=2))
+        # 2回目はキャッシュされていない24hrティッカーのみを取得
+        self.assertEqual(len(exchange.paths), len(ranking_endpoints()) + 3)
+
+    def test_per_host_limit(self):
+        exchange = StandInExchange()
+        asyncio.run(exchange.collect(per_host_limit=2))
+        self.assertEqual(exchange.max_active, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from usd_conversion import UsdConverter, split_symbol
+import binance_top10
+import bybit_top10
+
+
+class TestUsdConverter(unittest.TestCase):
+    def test_multi_hop_rates(self):
+        converter = UsdConverter([('BTC', 'USDT', 50000.0), ('ETH', 'BTC', 0.06), ('BNB', 'ETH', 0.2),
+                                  ('XYZ', 'BNB', 0.5), ('USDT', 'TRY', 32.0), ('ORPHAN', 'NOWHERE', 1.0)])
+        self.assertEqual(converter.rate('USDT'), 1.0)
+        self.assertAlmostEqual(converter.rate('ETH'), 3000.0)
+        self.assertAlmostEqual(converter.rate('XYZ'), 0.5 * 0.2 * 3000.0)
+        self.assertAlmostEqual(converter.rate('TRY'), 1 / 32.0)
+        self.assertEqual(converter.hops['XYZ'], 4)
+        self.assertIsNone(converter.rate('ORPHAN'))
+
+    def test_shortest_path_wins(self):
+        # ETHはETHUSDTで直接つながっているのでBTC経由の価格は使わない
+        converter = UsdConverter([('ETH', 'BTC', 0.1), ('BTC', 'USDT', 50000.0), ('ETH', 'USDT', 3000.0)])
+        self.assertEqual(converter.rate('ETH'), 3000.0)
+        self.assertEqual(converter.hops['ETH'], 1)
+
+    def test_non_positive_prices_are_ignored(self):
+        converter = UsdConverter([('BTC', 'USDT', 0.0)])
+        self.assertIsNone(converter.rate('BTC'))
+
+    def test_new_prices_for_same_pairs(self):
+        # 同じ通貨ペアの組み合わせでは探索結果を再利用し、価格だけが変わる
+        first = UsdConverter([('BTC', 'USDT', 50000.0), ('ETH', 'BTC', 0.06)])
+        second = UsdConverter([('BTC', 'USDT', 60000.0), ('ETH', 'BTC', 0.05)])
+        self.assertAlmostEqual(first.rate('ETH'), 3000.0)
+        self.assertAlmostEqual(second.rate('ETH'), 3000.0 * 60000 / 50000 * 0.05 / 0.06)
+        # 価格のないペア（NaN）は経路に使わない
+        third = UsdConverter([('BTC', 'USDT', float('nan')), ('ETH', 'BTC', 0.06), ('ETH', 'USDT', 2000.0)])
+        self.assertEqual(third.rate('ETH'), 2000.0)
+        self.assertAlmostEqual(third.rate('BTC'), 2000.0 / 0.06)
+
+    def test_split_symbol(self):
+        quotes = ('USDT', 'USD', 'BTC')
+        self.assertEqual(split_symbol('BTCUSDT', quotes), ('BTC', 'USDT'))
+        self.assertEqual(split_symbol('BTCUSD', quotes), ('BTC', 'USD'))
+        self.assertIsNone(split_symbol('USDT', quotes))
+        self.assertIsNone(split_symbol('BTC-28JUN24', quotes))
+
+    def test_binance_spot_multi_hop(self):
+        exchange_info = {'symbols': [
+            {'symbol': 'BTCUSDT', 'baseAsset': 'BTC', 'quoteAsset': 'USDT'},
+            {'symbol': 'ETHBTC', 'baseAsset': 'ETH', 'quoteAsset': 'BTC'},
+            {'symbol': 'BNBETH', 'baseAsset': 'BNB', 'quoteAsset': 'ETH'},
+            {'symbol': 'XYZBNB', 'baseAsset': 'XYZ', 'quoteAsset': 'BNB'},
+            {'symbol': 'FOOBAR', 'baseAsset': 'FOO', 'quoteAsset': 'BAR'}]}
+        prices = [{'symbol': 'BTCUSDT', 'price': '50000'}, {'symbol': 'ETHBTC', 'price': '0.06'},
+                  {'symbol': 'BNBETH', 'price': '0.2'}, {'symbol': 'XYZBNB', 'price': '0.5'}]
+        tickers = [{'symbol': 'XYZBNB', 'volume': '1000', 'quoteVolume': '500'},
+                   {'symbol': 'FOOBAR', 'volume': '1e12', 'quoteVolume': '1e12'}]
+        converter = UsdConverter.from_binance(exchange_info, prices)
+        with self.assertLogs(level='WARNING') as logs:
+            rankings = binance_top10.rank_binance_spot(tickers, exchange_info, converter)
+        self.assertEqual(rankings[0].symbol, 'XYZBNB')
+        self.assertAlmostEqual(rankings[0].volume_usd, 500 * 0.2 * 3000)
+        self.assertEqual(rankings[1].volume_usd, 0.0)
+        self.assertIn('FOOBAR', logs.output[0])
+
+    def test_bybit_eth_quote(self):
+        tickers = [{'symbol': 'BTCUSDT', 'volume24h': '1', 'lastPrice': '50000'},
+                   {'symbol': 'ETHBTC', 'volume24h': '1', 'lastPrice': '0.06'},
+                   {'symbol': 'MNTETH', 'volume24h': '1000000', 'lastPrice': '0.0002'}]
+        rankings = bybit_top10.rank_bybit({'spot': tickers}, 'spot')
+        self.assertEqual(rankings[0].symbol, 'MNTETH')
+        self.assertAlmostEqual(rankings[0].volume_usd, 1000000 * 0.0002 * 3000)
+
+if __name__ == '__main__':
+    unittest.main()
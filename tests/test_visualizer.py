@@ -42,6 +42,13 @@ class TestVisualizer(unittest.TestCase):
         self.assertEqual(fig.data[0].type, 'heatmap')
         self.assertEqual(fig.data[0].z.shape, (7, 24))  # 7日 x 24時間のヒートマップ
 
+    def test_create_heatmap_for_statistic(self):
+        fig = create_heatmap(self.heatmap_data * 100 + 50, stat='win_rate')
+        self.assertEqual(fig.data[0].zmid, 50)
+        self.assertIn('勝率', fig.layout.title.text)
+        fig = create_heatmap(self.heatmap_data, stat='q90')
+        self.assertIn('90', fig.layout.title.text)
+
      # 新しいテスト関数: 板の厚み比率のグラフ作成
     def test_create_depth_ratio_plot(self):
         fig = create_depth_ratio_plot(self.depth_ratio_data)
@@ -0,0 +1,131 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import io
+import contextlib
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import numpy as np
+from volume_ranking import VolumeRanking, rank_by_volume, rank_volume_arrays, format_rankings, rankings_to_records
+import binance_top10
+import bybit_top10
+from metadata_cache import MetadataCache
+
+
+def fake_response(payload):
+    response = MagicMock()
+    response.json.return_value = payload
+    return response
+
+
+BINANCE_PAYLOADS = {
+    "https://api.binance.com/api/v3/ticker/price": [
+        {"symbol": "BTCUSDT", "price": "50000"}, {"symbol": "ETHUSDT", "price": "3000"}],
+    "https://api.binance.com/api/v3/exchangeInfo": {"symbols": [
+        {"symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT"},
+        {"symbol": "ETHBTC", "baseAsset": "ETH", "quoteAsset": "BTC"},
+        {"symbol": "USDTTRY", "baseAsset": "USDT", "quoteAsset": "TRY"}]},
+    "https://api.binance.com/api/v3/ticker/24hr": [
+        {"symbol": "BTCUSDT", "volume": "10", "quoteVolume": "500000"},
+        {"symbol": "ETHBTC", "volume": "100", "quoteVolume": "20"},
+        {"symbol": "USDTTRY", "volume": "700000", "quoteVolume": "1"},
+        {"symbol": "DELISTED", "volume": "1", "quoteVolume": "1"}],
+    "https://fapi.binance.com/fapi/v1/ticker/24hr": [
+        {"symbol": "BTCUSDT", "volume": "1", "quoteVolume": "900"},
+        {"symbol": "BTCUSDT_240628", "volume": "1", "quoteVolume": "5000"}],
+    "https://dapi.binance.com/dapi/v1/ticker/24hr": [
+        {"symbol": "BTCUSD_PERP", "volume": "20", "quoteVolume": "1"},
+        {"symbol": "ETHUSD_PERP", "volume": "30", "quoteVolume": "1"}],
+}
+
+
+def fake_binance_get(url, *args, **kwargs):
+    return fake_response(BINANCE_PAYLOADS[url])
+
+
+def fake_bybit_get(url, params=None, **kwargs):
+    tickers = {
+        'spot': [{"symbol": "BTCUSDT", "volume24h": "2", "lastPrice": "50000"},
+                 {"symbol": "ETHBTC", "volume24h": "10", "lastPrice": "0.06"},
+                 {"symbol": "10000SATSUSDT", "volume24h": "1000000", "lastPrice": "0.5"}],
+        'linear': [{"symbol": "BTCUSDT", "volume24h": "3", "lastPrice": "50000"},
+                   {"symbol": "BTC-28JUN24", "volume24h": "100", "lastPrice": "50000"}],
+        'inverse': [{"symbol": "BTCUSD", "volume24h": "120000", "lastPrice": "50000"}],
+    }[params['category']]
+    return fake_response({"retCode": 0, "retMsg": "OK", "result": {"list": tickers}})
+
+
+class TestVolumeRanking(unittest.TestCase):
+    def setUp(self):
+        # 共有キャッシュの代わりにメモリ上のキャッシュを使う
+        patcher = patch('metadata_cache.default_cache', MetadataCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rank_by_volume_matches_full_sort(self):
+        items = [(f"S{i}", 'spot', (i * 7919) % 13, {}) for i in range(50)]
+        expected = sorted(items, key=lambda x: x[2], reverse=True)[:5]
+        rankings = rank_by_volume(items, top_n=5)
+        self.assertEqual([r.symbol for r in rankings], [e[0] for e in expected])
+        self.assertEqual([r.rank for r in rankings], [1, 2, 3, 4, 5])
+        self.assertEqual(rankings_to_records(rankings[:1]), [{'Rank': 1, 'Symbol': rankings[0].symbol,
+                                                              'Volume': f"${rankings[0].volume_usd:,.2f}"}])
+
+    def test_rank_volume_arrays_matches_rank_by_volume(self):
+        # 同順位が多い場合も元の順序で並ぶことを確認
+        items = [(f"S{i}", 'spot', float((i * 7919) % 5), {'i': i}) for i in range(40)]
+        for top_n in (0, 1, 7, 40, 100):
+            expected = rank_by_volume(items, top_n)
+            rankings = rank_volume_arrays([i[0] for i in items], 'spot', np.array([i[2] for i in items]),
+                                          [i[3] for i in items], top_n)
+            self.assertEqual(rankings, expected)
+        self.assertEqual(rank_volume_arrays([], 'spot', np.zeros(0), [], 10), [])
+
+    def test_bybit_normalization(self):
+        tickers = [{"symbol": "10000SATSUSDT", "volume24h": "1000000", "lastPrice": "0.5"},
+                   {"symbol": "1000PEPEUSDT", "volume24h": "3000", "lastPrice": "0.01"},
+                   {"symbol": "BADUSDT", "volume24h": "", "lastPrice": ""}]
+        columns = bybit_top10.normalize_bybit_tickers({'spot': tickers}, 'spot')
+        np.testing.assert_allclose(columns['volume'], [100, 3, np.nan])
+        np.testing.assert_allclose(columns['price'], [5000, 10, np.nan])
+        np.testing.assert_allclose(columns['volume_usd'], [500000, 30, 0])
+        self.assertEqual(bybit_top10.rank_bybit({'spot': tickers}, 'spot', top_n=1)[0].raw, tickers[0])
+
+    def test_format_rankings(self):
+        rankings = [VolumeRanking('BTCUSDT', 'USDT-Margined', 1234.5, 1, {})]
+        self.assertEqual(format_rankings("title", rankings, symbol_width=15, show_market_type=True),
+                         "title\n1. BTCUSDT         - 取引量: $1,234.50 (USDT-Margined)")
+
+    @patch('binance_top10.requests.get', side_effect=fake_binance_get)
+    def test_binance_rankings(self, _):
+        spot = binance_top10.get_binance_volume_ranking('spot', top_n=3)
+        self.assertEqual([(r.symbol, r.volume_usd) for r in spot],
+                         [('ETHBTC', 1000000.0), ('USDTTRY', 700000.0), ('BTCUSDT', 500000.0)])
+        self.assertEqual(spot[1].raw['volume'], '700000')
+
+        futures = binance_top10.get_binance_volume_ranking('futures')
+        self.assertEqual([(r.symbol, r.market_type, r.volume_usd) for r in futures],
+                         [('BTCUSD_PERP', 'COIN-Margined', 2000.0), ('BTCUSDT', 'USDT-Margined', 900.0),
+                          ('ETHUSD_PERP', 'COIN-Margined', 300.0)])
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            returned = binance_top10.get_binance_volume_top10('futures')
+        self.assertEqual(returned, futures)
+        self.assertEqual(output.getvalue().splitlines()[1],
+                         "1. BTCUSD_PERP     - 取引量: $2,000.00 (COIN-Margined)")
+
+    @patch('bybit_top10.requests.get', side_effect=fake_bybit_get)
+    def test_bybit_rankings(self, _):
+        spot = bybit_top10.get_bybit_volume_ranking('spot')
+        self.assertEqual([r.symbol for r in spot], ['10000SATSUSDT', 'BTCUSDT', 'ETHBTC'])
+        self.assertAlmostEqual(spot[2].volume_usd, 10 * 0.06 * 50000)
+
+        perp = bybit_top10.get_bybit_volume_ranking('perp')
+        self.assertEqual([(r.symbol, r.market_type, r.volume_usd) for r in perp],
+                         [('BTCUSDT', 'linear', 150000.0), ('BTCUSD', 'inverse', 120000.0)])
+        with self.assertRaises(ValueError):
+            bybit_top10.get_bybit_volume_ranking('linear')
+
+if __name__ == '__main__':
+    unittest.main()